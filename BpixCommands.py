@@ -0,0 +1,399 @@
+import sys
+
+class BpixCommands:
+
+    # commands which can be executed without the menus, one per line in a command file
+    Usage = """usage: bpixm.py run FILE      execute commands from FILE, - for stdin
+       bpixm.py COMMAND ...  execute a single command
+       bpixm.py serve [ADDRESS]  hold the mount state for other stations, ADDRESS is HOST:PORT
+                             or the path of a unix socket (default 127.0.0.1:8765), stations
+                             connect to it with Server = ADDRESS in the [System] section of config.ini
+
+commands:
+  mount LAYER LADDER Z MODULE     mount a module on an empty position, e.g. mount LAYER2o 3 Z1- M2050
+  replace LAYER LADDER Z MODULE   replace a mounted module
+  clear LAYER HALFLADDER          clear a half ladder, e.g. clear LAYER2o 3-
+  search MODULE                   show storage, planned and mounted positions
+  spares LAYER LADDER Z [COUNT]   unused modules in storage to replace the module of a position, nearest
+                                  to the planned module first, ranked by grade from $data/module_grades.csv
+  storage CONTAINER [TRAY] [LAYER]  list modules in a storage container/tray, * for any container,
+                                  with LAYER only modules planned for it, e.g. storage Cabinet T057 LAYER3o
+  picklist LAYER [HALFLADDER ...] [FILE]
+                                  pick list of the planned, not yet mounted modules in storage order
+                                  (box, tray, slot), whole layer without half ladders
+  checkhubids [LAYER]             check hub IDs for duplicates within readout groups and TBM ID pairs
+  solvehubids LAYER [all]         assign conflict-free hub IDs and write the hub ID file,
+                                  keeps valid IDs unless 'all' is given
+  importplan GRADES LAYER [LAYER ...] [keep]
+                                  plan layers from a CSV of module ID, grade and storage location and save
+                                  them as new revision: best grades on the inner z-positions, storage boxes
+                                  kept together per half ladder, mounted modules stay. With 'keep' planned
+                                  modules which are still in the list stay too (re-planning after failures)
+  save                            save all loaded layers
+  step                            save configuration as new revision
+  report [FILE] [LAYER SECTOR]    write conformance report (FILE without extension), optionally of one sector only
+  sectors [LAYER]                 status counts per sector
+  sector LAYER SECTOR             planned and mounted modules of a sector, e.g. sector LAYER2o S3
+lines starting with # are ignored"""
+
+    def __init__(self, Tool):
+        self.Tool = Tool
+        self.Errors = []
+        self.LineNumber = None
+        # consecutive mounts on the same layer are validated one by one and committed together
+        self.PendingLayerName = None
+        self.PendingMounts = []
+
+    def Error(self, Message):
+        if self.LineNumber is not None:
+            Message = "line %d: %s"%(self.LineNumber, Message)
+        self.Errors.append(Message)
+        print "ERROR: " + Message
+        self.Tool.Log(Message, Category='ERROR')
+        return False
+
+    def GetPosition(self, LayerName, Ladder, ZPositionName):
+        if LayerName not in self.Tool.LayerNames:
+            raise ValueError("unknown layer '%s'"%LayerName)
+        MountingLayer = self.Tool.LayersMounted[LayerName]
+        if not Ladder.isdigit() or not 0 < int(Ladder) <= MountingLayer.Ladders:
+            raise ValueError("invalid ladder '%s'"%Ladder)
+        return int(Ladder) - 1, MountingLayer.GetZIndexFromName(ZPositionName)
+
+    def GetHalfLadderIndex(self, LayerName, HalfLadderName):
+        if LayerName not in self.Tool.LayerNames:
+            raise ValueError("unknown layer '%s'"%LayerName)
+        Name = HalfLadderName.strip().upper().lstrip('L')
+        if len(Name) < 2 or Name[-1] not in '+-' or not Name[:-1].isdigit() or not 0 < int(Name[:-1]) <= self.Tool.LayersMounted[LayerName].Ladders:
+            raise ValueError("invalid half ladder '%s'"%HalfLadderName)
+        return [int(Name[:-1]) - 1, 1 if Name[-1] == '+' else 0]
+
+    def Mount(self, LayerName, Ladder, ZPositionName, ModuleID, Replace = False, Commit = True):
+        try:
+            LadderIndex, ZPosition = self.GetPosition(LayerName, Ladder, ZPositionName)
+        except ValueError as e:
+            return self.Error(str(e))
+        MountingLayer = self.Tool.LayersMounted[LayerName]
+        ModuleID = ModuleID.strip()
+        if ModuleID.startswith('D'):
+            ModuleID = 'M' + ModuleID[1:]
+
+        if self.PendingLayerName != LayerName:
+            self.Commit()
+        pendingSlots = dict(((x[0], x[1]), x[2]) for x in self.PendingMounts)
+        currentModuleID = pendingSlots.get((LadderIndex, ZPosition), MountingLayer.Modules[LadderIndex][ZPosition]).strip()
+        position = "%s ladder %d %s"%(LayerName, LadderIndex+1, MountingLayer.GetZPositionNameRaw(ZPosition))
+        if Replace and len(currentModuleID) < 1:
+            return self.Error("%s: nothing mounted to replace, use mount"%position)
+        if not Replace and len(currentModuleID) > 0:
+            return self.Error("%s: %s is already mounted, use replace"%(position, currentModuleID))
+        if ModuleID in pendingSlots.values():
+            return self.Error("%s: module %s is used twice"%(position, ModuleID))
+
+        # a module can be moved within one batch, once its old slot has been given another module
+        Errors, Warnings = self.Tool.ValidateMounts(MountingLayer, [(LadderIndex, ZPosition, ModuleID)], self.Tool.Layers[LayerName], self.PendingMounts)
+        for Error in Errors:
+            self.Error(Error)
+        if len(Errors) > 0:
+            return False
+        for Warning in Warnings:
+            print "WARNING: " + Warning
+            self.Tool.Log("headless: " + Warning, Category='MOUNT-MODULE', Keys=self.Tool.GetLogKeys(LayerName, LadderIndex))
+
+        self.PendingLayerName = LayerName
+        self.PendingMounts.append((LadderIndex, ZPosition, ModuleID))
+        if Commit:
+            return self.Commit()
+        return True
+
+    def Replace(self, LayerName, Ladder, ZPositionName, ModuleID, Commit = True):
+        return self.Mount(LayerName, Ladder, ZPositionName, ModuleID, Replace=True, Commit=Commit)
+
+    def Commit(self):
+        if len(self.PendingMounts) < 1:
+            return True
+        LayerName = self.PendingLayerName
+        Mounts = self.PendingMounts
+        self.PendingLayerName = None
+        self.PendingMounts = []
+        if not self.Tool.MountModules(self.Tool.LayersMounted[LayerName], Mounts, self.Tool.Layers[LayerName]):
+            return self.Error("could not mount %d modules on %s"%(len(Mounts), LayerName))
+        print "mounted %d modules on %s"%(len(Mounts), LayerName)
+        self.Tool.FlagUnsaved()
+        return True
+
+    def Clear(self, LayerName, HalfLadderName):
+        self.Commit()
+        try:
+            HalfLadderIndex = self.GetHalfLadderIndex(LayerName, HalfLadderName)
+        except ValueError as e:
+            return self.Error(str(e))
+        if not self.Tool.ClearHalfLadderModules(LayerName, HalfLadderIndex):
+            return self.Error("could not clear %s on %s"%(HalfLadderName, LayerName))
+        return True
+
+    def Search(self, ModuleID):
+        self.Commit()
+        ModuleID = ModuleID.strip()
+        Result = {
+            'module': ModuleID,
+            'storage': self.Tool.GetStorageLocation(ModuleID),
+            'plan': [(x[0], x[1]+1, self.Tool.Layers[x[0]].GetZPositionNameRaw(x[2])) for x in self.Tool.FindModule(ModuleID, Kind='plan')],
+            'mounted': [(x[0], x[1]+1, self.Tool.LayersMounted[x[0]].GetZPositionNameRaw(x[2])) for x in self.Tool.FindModule(ModuleID, Kind='mounted')],
+        }
+        self.Tool.Log("Search for module: %s"%ModuleID, 'SEARCH')
+        print "%s storage: %s plan: %s mounted: %s"%(ModuleID, Result['storage'],
+                                                    ', '.join(["%s L%d %s"%x for x in Result['plan']]) or '-',
+                                                    ', '.join(["%s L%d %s"%x for x in Result['mounted']]) or '-')
+        return Result
+
+    def Spares(self, LayerName, Ladder, ZPositionName, Count = '5'):
+        self.Commit()
+        try:
+            LadderIndex, ZPosition = self.GetPosition(LayerName, Ladder, ZPositionName)
+        except ValueError as e:
+            return self.Error(str(e))
+        if not Count.isdigit():
+            return self.Error("spares: invalid count '%s'"%Count)
+        Spares = self.Tool.RecommendSpares(LayerName, LadderIndex, ZPosition, int(Count))
+        self.Tool.PrintSpares(Spares)
+        return Spares
+
+    def ListStorage(self, Container, *Arguments):
+        self.Commit()
+        Tray = None
+        LayerName = None
+        for Argument in Arguments:
+            if Argument in self.Tool.LayerNames:
+                LayerName = Argument
+            elif Tray is None:
+                Tray = Argument
+            else:
+                return self.Error("storage: unexpected argument '%s'"%Argument)
+        StoredModules = self.Tool.FindStoredModules(None if Container == '*' else Container, Tray, LayerName)
+        for ModuleID, Location in StoredModules:
+            print "%-8s %s"%(ModuleID, Location)
+        print "%d modules"%len(StoredModules)
+        return StoredModules
+
+    def PickList(self, LayerName, *Arguments):
+        self.Commit()
+        if LayerName not in self.Tool.LayerNames:
+            return self.Error("unknown layer '%s'"%LayerName)
+        HalfLadderIndices = []
+        FileName = None
+        try:
+            for Argument in Arguments:
+                if Argument[-1] in '+-':
+                    HalfLadderIndices.append(self.GetHalfLadderIndex(LayerName, Argument))
+                elif FileName is None:
+                    FileName = Argument
+                else:
+                    raise ValueError("picklist: unexpected argument '%s'"%Argument)
+        except ValueError as e:
+            return self.Error(str(e))
+        Text, PickListFileName = self.Tool.CreatePickList(LayerName, HalfLadderIndices if len(HalfLadderIndices) > 0 else None, FileName)
+        print Text
+        if PickListFileName is None:
+            return self.Error("could not write pick list")
+        print "written to %s"%PickListFileName
+        return Text, PickListFileName
+
+    def CheckHubIDs(self, LayerName = None):
+        self.Commit()
+        if LayerName is not None and LayerName not in self.Tool.LayerNames:
+            return self.Error("unknown layer '%s'"%LayerName)
+        Issues = self.Tool.CheckHubIDs([LayerName] if LayerName else None)
+        self.Tool.PrintHubIDIssues(Issues)
+        print "%d hub ID problems"%len(Issues)
+        return Issues
+
+    def SolveHubIDs(self, LayerName, Mode = None):
+        self.Commit()
+        if LayerName not in self.Tool.LayerNames:
+            return self.Error("unknown layer '%s'"%LayerName)
+        if Mode not in [None, 'all']:
+            return self.Error("solvehubids: unexpected argument '%s'"%Mode)
+        Changed, Issues = self.Tool.SolveHubIDs(LayerName, KeepValid=(Mode is None))
+        self.Tool.PrintHubIDIssues(Issues)
+        print "%s: %d hub IDs assigned"%(LayerName, len(Changed))
+        if len(Issues) > 0:
+            return self.Error("%s: %d slots without conflict-free hub ID"%(LayerName, len(Issues)))
+        return Changed
+
+    def ImportPlan(self, GradesFileName, *Arguments):
+        self.Commit()
+        KeepPlan = len(Arguments) > 0 and Arguments[-1] == 'keep'
+        LayerNames = list(Arguments[:-1] if KeepPlan else Arguments)
+        for LayerName in LayerNames:
+            if LayerName not in self.Tool.LayerNames:
+                return self.Error("unknown layer '%s'"%LayerName)
+        Results = self.Tool.ImportPlan(GradesFileName, LayerNames, KeepPlan)
+        if Results is None:
+            return self.Error("could not import plan from %s"%GradesFileName)
+        for LayerName in LayerNames:
+            Assigned, Unfilled = Results[LayerName]
+            print "%s: %d modules assigned, %d slots left empty"%(LayerName, len(Assigned), len(Unfilled))
+            for LadderIndex, ZIndex in Unfilled:
+                print "  no module for ladder %d %s"%(LadderIndex+1, self.Tool.Layers[LayerName].GetZPositionNameRaw(ZIndex))
+        print "plan saved as REV %s"%self.Tool.globalConfig.get('System', 'DataRevision')
+        return Results
+
+    def Save(self):
+        self.Commit()
+        if not self.Tool.SaveConfiguration():
+            return self.Error("could not save configuration")
+        return True
+
+    def StepRevision(self):
+        self.Commit()
+        if not self.Tool.CreateNewRevision():
+            return self.Error("could not create new revision")
+        print "new revision created: REV %s"%self.Tool.globalConfig.get('System', 'DataRevision')
+        return True
+
+    def GetSectorID(self, LayerName, SectorName):
+        # 'S3' or '3', '-' for the ladders without sector
+        if LayerName not in self.Tool.LayerNames:
+            raise ValueError("unknown layer '%s'"%LayerName)
+        SectorIndex = self.Tool.GetSectorIndex(LayerName)
+        Name = SectorName.strip().upper().lstrip('S')
+        SectorID = None if Name == '-' else (int(Name) if Name.isdigit() else 'invalid')
+        if SectorID not in SectorIndex.GetSectorIDs():
+            raise ValueError("%s has no sector '%s'"%(LayerName, SectorName))
+        return SectorID
+
+    def ShowSectors(self, LayerName = None):
+        self.Commit()
+        for Name in ([LayerName] if LayerName else self.Tool.LayerNames):
+            if Name not in self.Tool.LayerNames:
+                return self.Error("unknown layer '%s'"%Name)
+            print Name
+            self.Tool.PrintSectorSummary(Name)
+        return True
+
+    def ShowSector(self, LayerName, SectorName):
+        self.Commit()
+        try:
+            SectorID = self.GetSectorID(LayerName, SectorName)
+        except ValueError as e:
+            return self.Error(str(e))
+        self.Tool.PrintSectorSlots(LayerName, SectorID)
+        return SectorID
+
+    def Report(self, *Arguments):
+        self.Commit()
+        SectorFilter = None
+        if len(Arguments) > 1 and Arguments[-2] in self.Tool.LayerNames:
+            try:
+                SectorFilter = (Arguments[-2], self.GetSectorID(Arguments[-2], Arguments[-1]))
+            except ValueError as e:
+                return self.Error(str(e))
+            Arguments = Arguments[:-2]
+        if len(Arguments) > 1:
+            return self.Error("report: unexpected argument '%s'"%Arguments[1])
+        Issues, Summary, ReportFileName = self.Tool.CreateConformanceReport(Arguments[0] if len(Arguments) > 0 else None, SectorFilter)
+        self.Tool.PrintConformanceSummary(Summary)
+        if ReportFileName is None:
+            return self.Error("could not write conformance report")
+        print "%d issues, written to %s.csv and %s.json"%(len(Issues), ReportFileName, ReportFileName)
+        return Issues, Summary, ReportFileName
+
+    def Execute(self, Arguments, Commit = True):
+        # Arguments: command and its arguments as list of strings
+        Commands = {
+            'mount': (self.Mount, 4),
+            'replace': (self.Replace, 4),
+            'clear': (self.Clear, 2),
+            'search': (self.Search, 1),
+            'spares': (self.Spares, None),
+            'storage': (self.ListStorage, None),
+            'picklist': (self.PickList, None),
+            'checkhubids': (self.CheckHubIDs, None),
+            'solvehubids': (self.SolveHubIDs, None),
+            'importplan': (self.ImportPlan, None),
+            'save': (self.Save, 0),
+            'step': (self.StepRevision, 0),
+            'report': (self.Report, None),
+            'sectors': (self.ShowSectors, None),
+            'sector': (self.ShowSector, 2),
+        }
+        if len(Arguments) < 1:
+            return True
+        Command = Arguments[0].lower()
+        if Command not in Commands:
+            return self.Error("unknown command '%s'"%Arguments[0])
+        Function, ArgumentCount = Commands[Command]
+        if ArgumentCount is not None and len(Arguments) - 1 != ArgumentCount:
+            return self.Error("%s needs %d arguments"%(Command, ArgumentCount))
+        if Command == 'storage' and not 1 < len(Arguments) < 5:
+            return self.Error("storage needs 1 to 3 arguments")
+        if Command == 'spares' and not 3 < len(Arguments) < 6:
+            return self.Error("spares needs 3 or 4 arguments")
+        if Command == 'picklist' and len(Arguments) < 2:
+            return self.Error("picklist needs a layer")
+        if Command == 'sectors' and len(Arguments) > 2:
+            return self.Error("sectors needs 0 or 1 arguments")
+        if Command == 'checkhubids' and len(Arguments) > 2:
+            return self.Error("checkhubids needs 0 or 1 arguments")
+        if Command == 'solvehubids' and not 1 < len(Arguments) < 4:
+            return self.Error("solvehubids needs 1 or 2 arguments")
+        if Command == 'importplan' and (len(Arguments) < 3 or Arguments[2:] == ['keep']):
+            return self.Error("importplan needs a grade file and at least one layer")
+        if Command in ['mount', 'replace']:
+            return Function(*Arguments[1:], Commit=Commit) is not False
+        return Function(*Arguments[1:]) is not False
+
+    def Run(self, Lines):
+        # returns the number of errors
+        ErrorsBefore = len(self.Errors)
+        for LineNumber, Line in enumerate(Lines, start=1):
+            self.LineNumber = LineNumber
+            Line = Line.strip()
+            if len(Line) < 1 or Line.startswith('#'):
+                continue
+            self.Execute(Line.split(), Commit=False)
+        self.LineNumber = None
+        self.Commit()
+        self.Tool.FlushLog()
+        if self.Tool.UnsavedChanges:
+            print "WARNING: there are unsaved changes, add 'save' to the commands or turn on autosave"
+        return len(self.Errors) - ErrorsBefore
+
+    def Main(self, Arguments):
+        # returns the exit code
+        if Arguments[0] in ['-h', '--help', 'help']:
+            print self.Usage
+            return 0
+        if Arguments[0] == 'serve':
+            if len(Arguments) > 2:
+                print self.Usage
+                return 2
+            from BpixStateServer import BpixStateServer
+            from BpixStateClient import ParseAddress
+            Server = BpixStateServer(self.Tool, ParseAddress(Arguments[1] if len(Arguments) > 1 else '127.0.0.1:8765'))
+            try:
+                Server.Run()
+            except KeyboardInterrupt:
+                pass
+            return 0
+        if Arguments[0] == 'run':
+            if len(Arguments) != 2:
+                print self.Usage
+                return 2
+            if Arguments[1] == '-':
+                Errors = self.Run(sys.stdin)
+            else:
+                try:
+                    with open(Arguments[1], 'r') as commandFile:
+                        Lines = commandFile.readlines()
+                except IOError:
+                    print "ERROR: can't read command file %s"%Arguments[1]
+                    return 2
+                Errors = self.Run(Lines)
+        else:
+            Errors = self.Run([' '.join(Arguments)])
+        if Errors > 0:
+            print "%d commands failed"%Errors
+            return 1
+        return 0
@@ -0,0 +1,127 @@
+import csv
+import json
+from itertools import izip
+
+from BpixLayer import ModuleIDs
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class BpixConformance:
+
+    def __init__(self, Layers, LayersMounted):
+        # Layers/LayersMounted: LayerName -> BpixLayer for plan and mounted modules
+        self.Layers = Layers
+        self.LayersMounted = LayersMounted
+        self.IssueTypes = ['MISMATCH', 'EMPTY', 'UNPLANNED', 'DUPLICATE']
+
+    def GetSlotIssues(self, PlannedCodes, MountedCodes):
+        # returns slot lists for (mismatch, empty, unplanned, conform)
+        if numpy is not None:
+            dataType = numpy.dtype('i%d'%PlannedCodes.itemsize)
+            P = numpy.frombuffer(PlannedCodes, dtype=dataType)
+            M = numpy.frombuffer(MountedCodes, dtype=dataType)
+            Planned = P != 0
+            Mounted = M != 0
+            return (numpy.flatnonzero(Planned & Mounted & (P != M)).tolist(),
+                    numpy.flatnonzero(Planned & ~Mounted).tolist(),
+                    numpy.flatnonzero(~Planned & Mounted).tolist(),
+                    numpy.flatnonzero(Planned & (P == M)).tolist())
+        Mismatch, Empty, Unplanned, Conform = [], [], [], []
+        for Slot, (p, m) in enumerate(izip(PlannedCodes, MountedCodes)):
+            if p and m:
+                (Conform if p == m else Mismatch).append(Slot)
+            elif p:
+                Empty.append(Slot)
+            elif m:
+                Unplanned.append(Slot)
+        return Mismatch, Empty, Unplanned, Conform
+
+    def GetDuplicates(self, Layers):
+        # module code -> list of (LayerName, Slot) for codes used in more than one slot
+        Slots = {}
+        for LayerName, Layer in Layers.items():
+            if numpy is not None:
+                Codes = numpy.frombuffer(Layer.ModuleCodes, dtype=numpy.dtype('i%d'%Layer.ModuleCodes.itemsize))
+                Occupied = numpy.flatnonzero(Codes)
+                Pairs = izip(Codes[Occupied].tolist(), Occupied.tolist())
+            else:
+                Pairs = ((Code, Slot) for Slot, Code in enumerate(Layer.ModuleCodes) if Code)
+            for Code, Slot in Pairs:
+                Slots.setdefault(Code, []).append((LayerName, Slot))
+        return dict((Code, Positions) for Code, Positions in Slots.items() if len(Positions) > 1)
+
+    def Compute(self):
+        # returns (issues, summary)
+        # issues: list of dicts with type, layer, ladder (from 1), z, planned, mounted, detail
+        # summary: LayerName -> counts per category
+        Issues = []
+        Summary = {}
+        for LayerName in sorted(self.LayersMounted.keys()):
+            Layer = self.Layers[LayerName]
+            LayerMounted = self.LayersMounted[LayerName]
+            SlotsPerLadder = Layer.ZPositions*2
+
+            def AddIssue(IssueType, Slot, Detail = ''):
+                Issues.append({
+                    'type': IssueType,
+                    'layer': LayerName,
+                    'ladder': Slot // SlotsPerLadder + 1,
+                    'z': Layer.GetZPositionNameRaw(Slot % SlotsPerLadder),
+                    'planned': ModuleIDs.IDs[Layer.ModuleCodes[Slot]],
+                    'mounted': ModuleIDs.IDs[LayerMounted.ModuleCodes[Slot]],
+                    'detail': Detail,
+                })
+
+            Mismatch, Empty, Unplanned, Conform = self.GetSlotIssues(Layer.ModuleCodes, LayerMounted.ModuleCodes)
+            for Slot in Mismatch:
+                AddIssue('MISMATCH', Slot)
+            for Slot in Empty:
+                AddIssue('EMPTY', Slot)
+            for Slot in Unplanned:
+                AddIssue('UNPLANNED', Slot)
+
+            Summary[LayerName] = {
+                'slots': len(Layer.ModuleCodes),
+                'planned': len(Mismatch) + len(Empty) + len(Conform),
+                'mounted': len(Mismatch) + len(Unplanned) + len(Conform),
+                'conform': len(Conform),
+                'MISMATCH': len(Mismatch),
+                'EMPTY': len(Empty),
+                'UNPLANNED': len(Unplanned),
+                'DUPLICATE': 0,
+            }
+
+        # the same module in more than one slot, over all layers
+        for Kind, Layers in [('mounted', self.LayersMounted), ('planned', self.Layers)]:
+            for Code, Positions in sorted(self.GetDuplicates(Layers).items()):
+                for LayerName, Slot in Positions:
+                    Layer = Layers[LayerName]
+                    SlotsPerLadder = Layer.ZPositions*2
+                    Issues.append({
+                        'type': 'DUPLICATE',
+                        'layer': LayerName,
+                        'ladder': Slot // SlotsPerLadder + 1,
+                        'z': Layer.GetZPositionNameRaw(Slot % SlotsPerLadder),
+                        'planned': ModuleIDs.IDs[self.Layers[LayerName].ModuleCodes[Slot]],
+                        'mounted': ModuleIDs.IDs[self.LayersMounted[LayerName].ModuleCodes[Slot]],
+                        'detail': '%s %s used %d times'%(Kind, ModuleIDs.IDs[Code], len(Positions)),
+                    })
+                    if LayerName in Summary:
+                        Summary[LayerName]['DUPLICATE'] += 1
+
+        return Issues, Summary
+
+    def WriteCSV(self, FileName, Issues):
+        Columns = ['type', 'layer', 'ladder', 'z', 'planned', 'mounted', 'detail']
+        with open(FileName, 'wb') as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(Columns)
+            for Issue in Issues:
+                writer.writerow([Issue[x] for x in Columns])
+
+    def WriteJSON(self, FileName, Issues, Summary):
+        with open(FileName, 'w') as jsonFile:
+            json.dump({'summary': Summary, 'issues': Issues}, jsonFile, indent=1, sort_keys=True)
@@ -0,0 +1,74 @@
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+class BpixFileLock:
+
+    # advisory lock shared by all processes working on the same data directory
+    # the lock is reentrant within one process, nested Acquire/Release only lock once
+    def __init__(self, FileName, Timeout = 30):
+        self.FileName = FileName
+        self.Timeout = Timeout
+        self.LockFile = None
+        self.Depth = 0
+
+    def TryLock(self):
+        try:
+            if fcntl:
+                fcntl.flock(self.LockFile.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt:
+                self.LockFile.seek(0)
+                msvcrt.locking(self.LockFile.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except IOError:
+            return False
+
+    def Acquire(self):
+        if self.Depth < 1:
+            directory = os.path.dirname(self.FileName)
+            if len(directory) > 0 and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.LockFile = open(self.FileName, 'a')
+            startTime = time.time()
+            waitMessageShown = False
+            while not self.TryLock():
+                if time.time() - startTime > self.Timeout:
+                    self.LockFile.close()
+                    self.LockFile = None
+                    raise IOError("%s is locked by another process"%self.FileName)
+                if not waitMessageShown and self.Timeout > 0:
+                    print "waiting for other station to finish writing..."
+                    waitMessageShown = True
+                time.sleep(0.05)
+        self.Depth += 1
+
+    def Release(self):
+        self.Depth -= 1
+        if self.Depth < 1:
+            self.Depth = 0
+            try:
+                if fcntl:
+                    fcntl.flock(self.LockFile.fileno(), fcntl.LOCK_UN)
+                elif msvcrt:
+                    self.LockFile.seek(0)
+                    msvcrt.locking(self.LockFile.fileno(), msvcrt.LK_UNLCK, 1)
+            except IOError:
+                pass
+            self.LockFile.close()
+            self.LockFile = None
+
+    def __enter__(self):
+        self.Acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Release()
+        return False
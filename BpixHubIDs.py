@@ -0,0 +1,138 @@
+import os
+
+class BpixHubIDs:
+
+    # checks and assigns hub IDs (TBM jumper settings) of a layer
+    # hub IDs have to be unique within a readout group: the half ladders of one sector on the same side,
+    # or the half ladder itself for ladders without sector. Layers with more than one TBM per module are read out
+    # module by module, there only the ID pairs are checked: first TBM odd, second TBM = first with lowest jumper open
+    IssueTypes = ['MISSING', 'INVALID', 'TBM-PAIR', 'DUPLICATE', 'UNSOLVABLE']
+
+    def __init__(self, EncodingFileName = None):
+        # hub ID -> number of jumpers to close, from hub_ids.txt (ID, jumper bits, jumpers to close)
+        self.Jumpers = {}
+        if EncodingFileName and os.path.isfile(EncodingFileName):
+            with open(EncodingFileName, 'r') as encodingFile:
+                for line in encodingFile:
+                    lineParts = line.split()
+                    if len(lineParts) == 3 and lineParts[0].isdigit() and lineParts[2].isdigit():
+                        self.Jumpers[int(lineParts[0])] = int(lineParts[2])
+        if len(self.Jumpers) < 1:
+            self.Jumpers = dict((HubID, 5 - bin(HubID).count('1')) for HubID in range(32))
+
+        # IDs in the order they are handed out, the ones with fewest jumpers to close first
+        self.Preference = sorted(self.Jumpers.keys(), key=lambda HubID: (self.Jumpers[HubID], -HubID))
+        self.ValidMask = 0
+        for HubID in self.Jumpers:
+            self.ValidMask |= 1 << HubID
+
+    def GetReadoutGroups(self, Layer, Sectors = None):
+        # list of readout groups, each a list of (LadderIndex, ZIndex)
+        if Layer.Tbms > 1:
+            return [[(LadderIndex, ZIndex)] for LadderIndex in range(Layer.Ladders) for ZIndex in range(2*Layer.ZPositions)]
+        GroupLadders = []
+        assignedLadders = set()
+        for SectorID in sorted((Sectors or {}).keys()):
+            Ladders = [x - 1 for x in Sectors[SectorID] if 0 < x <= Layer.Ladders and x - 1 not in assignedLadders]
+            assignedLadders.update(Ladders)
+            if len(Ladders) > 0:
+                GroupLadders.append(Ladders)
+        GroupLadders += [[LadderIndex] for LadderIndex in range(Layer.Ladders) if LadderIndex not in assignedLadders]
+
+        Groups = []
+        for Ladders in GroupLadders:
+            for Side in [0, 1]:
+                Groups.append([(LadderIndex, ZIndex) for LadderIndex in Ladders for ZIndex in range(Side*Layer.ZPositions, (Side+1)*Layer.ZPositions)])
+        return Groups
+
+    def CheckTuple(self, Layer, HubIDTuple):
+        # returns the issue type of a single slot or None
+        if -1 in HubIDTuple:
+            return 'MISSING'
+        TupleMask = 0
+        for HubID in HubIDTuple:
+            TupleMask |= 1 << HubID
+        if TupleMask & ~self.ValidMask:
+            return 'INVALID'
+        if Layer.Tbms == 2 and (HubIDTuple[0] % 2 != 1 or HubIDTuple[1] != HubIDTuple[0] - 1):
+            return 'TBM-PAIR'
+        return None
+
+    def GetIssue(self, IssueType, LayerName, Layer, LadderIndex, ZIndex, Detail = ''):
+        return {
+            'type': IssueType,
+            'layer': LayerName,
+            'ladder': LadderIndex + 1,
+            'z': Layer.GetZPositionNameRaw(ZIndex),
+            'hubids': Layer.FormatHubIDTuple(Layer.GetHubIDTuple(LadderIndex, ZIndex)),
+            'detail': Detail,
+        }
+
+    def Validate(self, LayerName, Layer, Sectors = None):
+        # returns a list of issues (dicts with type, layer, ladder (from 1), z, hubids, detail)
+        Issues = []
+        for Group in self.GetReadoutGroups(Layer, Sectors):
+            UsedMask = 0
+            UsedBy = {}
+            for LadderIndex, ZIndex in Group:
+                HubIDTuple = Layer.GetHubIDTuple(LadderIndex, ZIndex)
+                IssueType = self.CheckTuple(Layer, HubIDTuple)
+                if IssueType:
+                    Issues.append(self.GetIssue(IssueType, LayerName, Layer, LadderIndex, ZIndex))
+                    continue
+                for HubID in HubIDTuple:
+                    if UsedMask & (1 << HubID):
+                        OtherLadderIndex, OtherZIndex = UsedBy[HubID]
+                        Issues.append(self.GetIssue('DUPLICATE', LayerName, Layer, LadderIndex, ZIndex, "hub ID %d also used at ladder %d %s"%(HubID, OtherLadderIndex + 1, Layer.GetZPositionNameRaw(OtherZIndex))))
+                    else:
+                        UsedMask |= 1 << HubID
+                        UsedBy[HubID] = (LadderIndex, ZIndex)
+        return Issues
+
+    def GetCandidates(self, Layer):
+        # hub ID tuples which can be assigned to one slot, with the bitmask of the IDs they use
+        if Layer.Tbms == 2:
+            return [((HubID, HubID - 1), (1 << HubID) | (1 << (HubID - 1))) for HubID in self.Preference if HubID % 2 == 1 and HubID - 1 in self.Jumpers]
+        return [((HubID,) * Layer.Tbms, 1 << HubID) for HubID in self.Preference]
+
+    def Solve(self, LayerName, Layer, Sectors = None, KeepValid = True):
+        # assigns conflict-free hub IDs to all slots of the layer, valid and unique IDs are kept if KeepValid
+        # returns (list of changed (LadderIndex, ZIndex), issues for readout groups which can't be solved)
+        Changed = []
+        Issues = []
+        Candidates = self.GetCandidates(Layer)
+        for Group in self.GetReadoutGroups(Layer, Sectors):
+            # all different constraint with the same domain for every slot: keeping the valid slots first and
+            # filling the others with the free IDs in order of preference always finds a solution if one exists
+            UsedMask = 0
+            Open = []
+            for LadderIndex, ZIndex in Group:
+                HubIDTuple = Layer.GetHubIDTuple(LadderIndex, ZIndex)
+                TupleMask = 0
+                for HubID in HubIDTuple:
+                    TupleMask |= (1 << HubID) if HubID >= 0 else 0
+                if KeepValid and self.CheckTuple(Layer, HubIDTuple) is None and not UsedMask & TupleMask:
+                    UsedMask |= TupleMask
+                else:
+                    Open.append((LadderIndex, ZIndex))
+
+            for LadderIndex, ZIndex in Open:
+                for HubIDTuple, TupleMask in Candidates:
+                    if not UsedMask & TupleMask:
+                        UsedMask |= TupleMask
+                        Layer.SetHubIDTuple(LadderIndex, ZIndex, list(HubIDTuple))
+                        Changed.append((LadderIndex, ZIndex))
+                        break
+                else:
+                    Issues.append(self.GetIssue('UNSOLVABLE', LayerName, Layer, LadderIndex, ZIndex, "no free hub ID left in readout group of %d slots"%len(Group)))
+        return Changed, Issues
+
+    def Write(self, Layer, FileName):
+        # same format as the hubids_{Layer}.txt files, TBMs separated by /
+        with open(FileName + '.tmp', 'w') as hubIDsFile:
+            hubIDsFile.write(''.join([';'.join([Layer.FormatHubIDTuple(Layer.GetHubIDTuple(LadderIndex, ZIndex)) for ZIndex in range(2*Layer.ZPositions)]) + '\n' for LadderIndex in range(Layer.Ladders)]))
+            hubIDsFile.flush()
+            os.fsync(hubIDsFile.fileno())
+        if os.name == 'nt' and os.path.isfile(FileName):
+            os.remove(FileName)
+        os.rename(FileName + '.tmp', FileName)
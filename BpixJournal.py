@@ -0,0 +1,146 @@
+import os
+import glob
+import time
+import socket
+import datetime
+
+from BpixFileLock import BpixFileLock
+
+class BpixJournal:
+
+    # mount changes of one station which are not yet compacted into the mount files
+    # every station writes its own journal (journals/HOST_PID_TIME.txt) and holds the lock HOST_PID_TIME.lock while it runs,
+    # journals whose lock is free belong to stations which have crashed and are taken over by the next station opening them
+    def __init__(self, RevisionDirectory, StationID = None):
+        self.RevisionDirectory = RevisionDirectory
+        self.Directory = RevisionDirectory + 'journals/'
+        self.StationID = StationID or '%s_%d_%d'%(socket.gethostname().split('.')[0], os.getpid(), int(time.time()*1000000))
+        self.FileName = self.Directory + '%s.txt'%self.StationID
+        # single journal of all stations written before there was one per station
+        self.LegacyFileName = RevisionDirectory + 'mount_journal.txt'
+        self.Separator = ';'
+        self.LineEndCharacter = '\n'
+
+        # number of changes appended since the last compaction
+        self.Entries = 0
+        self.StationLock = None
+        # journals of crashed stations taken over by this station: file name -> lock (None for the legacy journal)
+        self.Adopted = {}
+
+    def GetLockFileName(self, FileName):
+        return FileName[:-len('.txt')] + '.lock'
+
+    def GetFileNames(self):
+        # journals of all stations
+        return sorted(glob.glob(self.Directory + '*.txt')) + ([self.LegacyFileName] if os.path.isfile(self.LegacyFileName) else [])
+
+    def Open(self):
+        # locks the journal of this station and takes over the journals of crashed stations, has to be called
+        # while holding the data lock, so two stations starting at the same time don't take over the same journal
+        if self.StationLock is None:
+            self.StationLock = BpixFileLock(self.GetLockFileName(self.FileName), Timeout=0)
+            self.StationLock.Acquire()
+        for FileName in self.GetFileNames():
+            if FileName == self.FileName or FileName in self.Adopted:
+                continue
+            if FileName == self.LegacyFileName:
+                self.Adopted[FileName] = None
+                continue
+            StationLock = BpixFileLock(self.GetLockFileName(FileName), Timeout=0)
+            try:
+                StationLock.Acquire()
+                self.Adopted[FileName] = StationLock
+            except IOError:
+                # station is still running
+                pass
+        return sorted(self.Adopted.keys())
+
+    def Close(self):
+        # the lock file is only kept if there are changes left in the journal, they are taken over by the next station
+        for StationLock in [self.StationLock] + self.Adopted.values():
+            if StationLock:
+                StationLock.Release()
+        if self.StationLock and not os.path.isfile(self.FileName):
+            try:
+                os.remove(self.StationLock.FileName)
+            except OSError:
+                pass
+        self.StationLock = None
+        self.Adopted = {}
+
+    def Append(self, Records):
+        # Records: list of (Operation, LayerName, LadderIndex, ZIndex, OldModuleID, NewModuleID)
+        # all records of one change are written and synced to disk together
+        Date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        Lines = ''
+        for Operation, LayerName, LadderIndex, ZIndex, OldModuleID, NewModuleID in Records:
+            Lines += self.Separator.join([Date, Operation, LayerName, '%d'%LadderIndex, '%d'%ZIndex, OldModuleID.strip(), NewModuleID.strip()]) + self.LineEndCharacter
+
+        Success = False
+        try:
+            if not os.path.isdir(self.Directory):
+                os.makedirs(self.Directory)
+            with open(self.FileName, 'a') as journalFile:
+                journalFile.write(Lines)
+                journalFile.flush()
+                os.fsync(journalFile.fileno())
+            self.Entries += 1
+            Success = True
+        except:
+            pass
+
+        return Success
+
+    def ReadRecords(self, FileName = None):
+        Records = []
+        FileName = FileName or self.FileName
+        if os.path.isfile(FileName):
+            with open(FileName, 'r') as journalFile:
+                for line in journalFile:
+                    # an incomplete last line (crash while writing) is ignored
+                    if not line.endswith(self.LineEndCharacter):
+                        break
+                    lineParts = line.rstrip('\r\n').split(self.Separator)
+                    if len(lineParts) != 7:
+                        break
+                    try:
+                        Records.append((lineParts[1], lineParts[2], int(lineParts[3]), int(lineParts[4]), lineParts[5], lineParts[6]))
+                    except:
+                        break
+        return Records
+
+    def Replay(self, Layers, FileNames = None):
+        # re-applies journaled slot changes on top of the layers loaded from the mount files
+        # by default the journals of this station and the ones taken over, FileNames = GetFileNames() for all stations
+        Replayed = 0
+        for FileName in (FileNames if FileNames is not None else [self.FileName] + sorted(self.Adopted.keys())):
+            for Operation, LayerName, LadderIndex, ZIndex, OldModuleID, NewModuleID in self.ReadRecords(FileName):
+                if LayerName in Layers:
+                    try:
+                        Layers[LayerName].SetModule(LadderIndex, ZIndex, NewModuleID)
+                        Replayed += 1
+                    except:
+                        print "journal: can't replay", Operation, LayerName, LadderIndex, ZIndex, NewModuleID
+        return Replayed
+
+    def Truncate(self):
+        # after compaction: removes the journal of this station and the ones taken over, journals of other running stations stay
+        Success = False
+        try:
+            if os.path.isfile(self.FileName):
+                os.remove(self.FileName)
+            for FileName, StationLock in self.Adopted.items():
+                if os.path.isfile(FileName):
+                    os.remove(FileName)
+                if StationLock:
+                    StationLock.Release()
+                    try:
+                        os.remove(StationLock.FileName)
+                    except OSError:
+                        pass
+            self.Adopted = {}
+            self.Entries = 0
+            Success = True
+        except:
+            pass
+        return Success
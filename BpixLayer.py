@@ -1,4 +1,80 @@
-class BpixLayer:
+import os
+from array import array
+
+from BpixLayerFileParser import BpixLayerFileParser
+
+class BpixModuleIDTable(object):
+
+    # interns module IDs to integer codes shared by all layers, code 0 is the empty slot
+    __slots__ = ['IDs', 'Codes']
+
+    def __init__(self):
+        self.IDs = ['']
+        self.Codes = {'': 0}
+
+    def GetCode(self, ModuleID):
+        Code = self.Codes.get(ModuleID)
+        if Code is None:
+            Code = len(self.IDs)
+            self.IDs.append(ModuleID)
+            self.Codes[ModuleID] = Code
+        return Code
+
+ModuleIDs = BpixModuleIDTable()
+
+
+class BpixSlotsView(object):
+
+    # nested-list style access to the slots of a layer, e.g. Layer.Modules[LadderIndex][ZIndex]
+    __slots__ = ['Getter', 'Setter', 'Ladders', 'Slots', 'LadderIndex']
+
+    def __init__(self, Getter, Setter, Ladders, Slots, LadderIndex = None):
+        self.Getter = Getter
+        self.Setter = Setter
+        self.Ladders = Ladders
+        self.Slots = Slots
+        self.LadderIndex = LadderIndex
+
+    def __len__(self):
+        return self.Ladders if self.LadderIndex is None else self.Slots
+
+    def __getitem__(self, Index):
+        if isinstance(Index, slice):
+            return [self[i] for i in range(*Index.indices(len(self)))]
+        if Index < 0:
+            Index += len(self)
+        if Index < 0 or Index >= len(self):
+            raise IndexError(Index)
+        if self.LadderIndex is None:
+            return BpixSlotsView(self.Getter, self.Setter, self.Ladders, self.Slots, Index)
+        return self.Getter(self.LadderIndex, Index)
+
+    def __setitem__(self, Index, Value):
+        if self.LadderIndex is None or not self.Setter:
+            raise TypeError("slots can only be changed one at a time")
+        if Index < 0:
+            Index += len(self)
+        if Index < 0 or Index >= len(self):
+            raise IndexError(Index)
+        self.Setter(self.LadderIndex, Index, Value)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class BpixLayer(object):
+
+    __slots__ = ['Name', 'Ladders', 'ZPositions', 'Tbms', 'ModuleCodes', 'HubIDArray', 'ZPositionNameLength', 'LineEndCharacter', 'Index', 'IndexLayerName', 'IndexKind', 'DirtyLadders', 'LadderLines']
 
     def __init__(self, Name, Ladders, ZPositions, Tbms = 1):
         self.Name = Name
@@ -7,55 +83,180 @@ class BpixLayer:
         self.Tbms = Tbms
 
         # initialize empty detector
-        self.Modules = []
-        for i in range(Ladders):
-            self.Modules.append(['']*(ZPositions*2))
+        # module IDs: interned codes, one per slot, slot = LadderIndex * 2*ZPositions + ZIndex
+        # hub IDs: Tbms entries per slot, -1 = not set
+        self.ModuleCodes = array('i', [0]) * (Ladders*ZPositions*2)
+        self.HubIDArray = array('b', [-1]) * (Ladders*ZPositions*2*Tbms)
 
         self.ZPositionNameLength = 6
         self.LineEndCharacter = '\n'
 
-        self.HubIDs = []
-        for i in range(Ladders):
-            self.HubIDs.append([[-1]*Tbms]*(ZPositions*2))
+        # optional global module ID index, kept up to date on load and on every slot change
+        self.Index = None
+        self.IndexLayerName = Name
+        self.IndexKind = ''
 
-    def LoadFromFile(self, layerPlanFileName):
-        try:
-            with open(layerPlanFileName, 'r') as layerPlanFile:
-                LadderIndex = 0
-                for line in layerPlanFile:
-                    modules = [x.split(' ')[0].replace(' ','').replace('\n','').replace('\r','') for x in line.replace('\t',';').split(';')]
-                    if len(modules) == self.ZPositions*2:
-                        self.Modules[LadderIndex] = modules
-                    else:
-                        print "-"*78
-                        print "bad format: '%r'"%line
-                        print "length: ", len(modules)
-                        print "expected: ", self.ZPositions*2
-                        print "data: ", modules
-                        print "-"*78
-                    LadderIndex += 1
-        except:
-            pass
+        # ladders changed since the layer was loaded or saved, and the formatted lines of the mount file
+        self.DirtyLadders = set()
+        self.LadderLines = None
 
-    def LoadHubIDsFromFile(self, hubIDsFileName):
-        try:
-            with open(hubIDsFileName, 'r') as hubIDsFile:
-                LadderIndex = 0
-                for line in hubIDsFile:
-                    hubIDs = [x.split(' ')[0].replace(' ','').replace('\n','').replace('\r','') for x in line.replace('\t',';').split(';')]
-                    if len(hubIDs) == self.ZPositions*2:
-                        # split hubID strings for more than one TBMs
-                        self.HubIDs[LadderIndex] = [[int(y) for y in x.split('/')] for x in hubIDs]
-                    else:
-                        print "-"*78
-                        print "bad format: '%r'"%line
-                        print "length: ", len(hubIDs)
-                        print "expected: ", self.ZPositions*2
-                        print "data: ", hubIDs
-                        print "-"*78
-                    LadderIndex += 1
-        except:
-            print "ERROR: can't load HUB IDs from file:", hubIDsFileName
+    @property
+    def Modules(self):
+        return BpixSlotsView(self.GetModule, self.SetModule, self.Ladders, self.ZPositions*2)
+
+    @property
+    def HubIDs(self):
+        return BpixSlotsView(self.GetHubIDTuple, self.SetHubIDTuple, self.Ladders, self.ZPositions*2)
+
+    def GetSlot(self, LadderIndex, ZIndex):
+        if LadderIndex < 0 or LadderIndex >= self.Ladders or ZIndex < 0 or ZIndex >= self.ZPositions*2:
+            raise IndexError((LadderIndex, ZIndex))
+        return LadderIndex*self.ZPositions*2 + ZIndex
+
+    def GetModule(self, LadderIndex, ZIndex):
+        return ModuleIDs.IDs[self.ModuleCodes[self.GetSlot(LadderIndex, ZIndex)]]
+
+    def GetHubIDTuple(self, LadderIndex, ZIndex):
+        Slot = self.GetSlot(LadderIndex, ZIndex)
+        return self.HubIDArray[Slot*self.Tbms:(Slot+1)*self.Tbms].tolist()
+
+    def SetHubIDTuple(self, LadderIndex, ZIndex, hubIDTuple):
+        Slot = self.GetSlot(LadderIndex, ZIndex)
+        for i in range(self.Tbms):
+            self.HubIDArray[Slot*self.Tbms + i] = hubIDTuple[i] if i < len(hubIDTuple) else -1
+
+    def IterateModules(self):
+        # yields (LadderIndex, ZIndex, ModuleID) of all occupied slots
+        SlotsPerLadder = self.ZPositions*2
+        for Slot, Code in enumerate(self.ModuleCodes):
+            if Code:
+                yield Slot // SlotsPerLadder, Slot % SlotsPerLadder, ModuleIDs.IDs[Code]
+
+    def Copy(self):
+        # copies only the module/hub ID arrays, the index is not attached to the copy
+        layerCopy = BpixLayer(self.Name, self.Ladders, self.ZPositions, self.Tbms)
+        layerCopy.ModuleCodes = array('i', self.ModuleCodes)
+        layerCopy.HubIDArray = array('b', self.HubIDArray)
+        return layerCopy
+
+    def MergeChanges(self, BaseCodes, Other):
+        # takes over slots which were changed in Other relative to BaseCodes, but not in this layer
+        # returns (merged, conflicting) lists of (LadderIndex, ZIndex), conflicting slots keep their value
+        Merged = []
+        Conflicts = []
+        SlotsPerLadder = self.ZPositions*2
+        for Slot in range(len(self.ModuleCodes)):
+            Theirs = Other.ModuleCodes[Slot]
+            if Theirs != BaseCodes[Slot] and Theirs != self.ModuleCodes[Slot]:
+                if self.ModuleCodes[Slot] == BaseCodes[Slot]:
+                    self.SetModule(Slot // SlotsPerLadder, Slot % SlotsPerLadder, ModuleIDs.IDs[Theirs])
+                    Merged.append((Slot // SlotsPerLadder, Slot % SlotsPerLadder))
+                else:
+                    Conflicts.append((Slot // SlotsPerLadder, Slot % SlotsPerLadder))
+        return Merged, Conflicts
+
+    def AttachIndex(self, Index, LayerName, Kind):
+        if self.Index:
+            self.Index.RemoveLayer(self, self.IndexLayerName, self.IndexKind)
+        self.Index = Index
+        self.IndexLayerName = LayerName
+        self.IndexKind = Kind
+        if self.Index:
+            self.Index.AddLayer(self, self.IndexLayerName, self.IndexKind)
+
+    def SetModule(self, LadderIndex, ZIndex, ModuleID):
+        Slot = self.GetSlot(LadderIndex, ZIndex)
+        if self.Index:
+            self.Index.Remove(ModuleIDs.IDs[self.ModuleCodes[Slot]], self.IndexLayerName, LadderIndex, ZIndex, self.IndexKind)
+        self.ModuleCodes[Slot] = ModuleIDs.GetCode(ModuleID)
+        self.DirtyLadders.add(LadderIndex)
+        if self.Index:
+            self.Index.Add(ModuleID, self.IndexLayerName, LadderIndex, ZIndex, self.IndexKind)
+
+    def SetLadderModules(self, LadderIndex, Modules):
+        Slot = self.GetSlot(LadderIndex, 0)
+        self.ModuleCodes[Slot:Slot + self.ZPositions*2] = array('i', [ModuleIDs.GetCode(ModuleID) for ModuleID in Modules])
+        self.DirtyLadders.add(LadderIndex)
+
+    def IsDirty(self):
+        return len(self.DirtyLadders) > 0
+
+    def MarkClean(self):
+        # layer is identical to its file, lines are formatted again on the next save
+        self.DirtyLadders = set()
+        self.LadderLines = None
+
+    def GetLadderModules(self, LadderIndex):
+        Slot = self.GetSlot(LadderIndex, 0)
+        return [ModuleIDs.IDs[Code] for Code in self.ModuleCodes[Slot:Slot + self.ZPositions*2]]
+
+    def GetState(self):
+        # compact representation for the layer cache: module IDs as one string, hub IDs as packed byte array
+        return {
+            'Modules': '\n'.join([';'.join(self.GetLadderModules(LadderIndex)) for LadderIndex in range(self.Ladders)]),
+            'HubIDs': self.HubIDArray.tostring(),
+        }
+
+    def SetState(self, State):
+        hubIDArray = array('b')
+        hubIDArray.fromstring(State['HubIDs'])
+        moduleCodes = array('i', [ModuleIDs.GetCode(ModuleID) for Ladder in State['Modules'].split('\n') for ModuleID in Ladder.split(';')]) if self.Ladders > 0 else array('i')
+        if len(hubIDArray) != len(self.HubIDArray) or len(moduleCodes) != len(self.ModuleCodes):
+            raise ValueError("layer state does not match layer dimensions")
+
+        if self.Index:
+            self.Index.RemoveLayer(self, self.IndexLayerName, self.IndexKind)
+        self.ModuleCodes = moduleCodes
+        self.HubIDArray = hubIDArray
+        self.MarkClean()
+        if self.Index:
+            self.Index.AddLayer(self, self.IndexLayerName, self.IndexKind)
+
+    def LoadFromFile(self, layerPlanFileName, Diagnostics = None):
+        # returns the list of diagnostics, malformed lines leave their ladder empty
+        if self.Index:
+            self.Index.RemoveLayer(self, self.IndexLayerName, self.IndexKind)
+        Parser = BpixLayerFileParser(layerPlanFileName, self.Ladders, self.ZPositions*2, Diagnostics)
+        for LadderIndex, modules, line in Parser.ReadLadders():
+            for CellIndex, ModuleID in enumerate(modules):
+                if len(ModuleID) > 0 and not (ModuleID[0] == 'M' and ModuleID[1:].isdigit()) and not self.CheckModuleName(ModuleID):
+                    Parser.AddDiagnostic(LadderIndex + 1, Parser.GetColumn(line, CellIndex), "module ID M<number>", repr(ModuleID))
+            self.SetLadderModules(LadderIndex, modules)
+        self.MarkClean()
+        if self.Index:
+            self.Index.AddLayer(self, self.IndexLayerName, self.IndexKind)
+        return Parser.Diagnostics
+
+    def LoadHubIDsFromFile(self, hubIDsFileName, Diagnostics = None):
+        # returns the list of diagnostics, hub IDs which can't be read are set to -1 (same as empty cells)
+        # one ID per TBM separated by /, missing TBMs are filled up with -1
+        Parser = BpixLayerFileParser(hubIDsFileName, self.Ladders, self.ZPositions*2, Diagnostics)
+        for LadderIndex, hubIDs, line in Parser.ReadLadders():
+            Slot = self.GetSlot(LadderIndex, 0)
+            # fast path for well formed lines, cell by cell with diagnostics otherwise
+            try:
+                TbmHubIDs = [Cell.split('/') for Cell in hubIDs]
+                if min([len(x) for x in TbmHubIDs]) == max([len(x) for x in TbmHubIDs]) == self.Tbms:
+                    ladderHubIDs = array('b', [int(HubID) for x in TbmHubIDs for HubID in x])
+                    if min(ladderHubIDs) >= -1:
+                        self.HubIDArray[Slot*self.Tbms:(Slot + self.ZPositions*2)*self.Tbms] = ladderHubIDs
+                        continue
+            except (ValueError, OverflowError):
+                pass
+            ladderHubIDs = array('b', [-1]) * (self.ZPositions*2*self.Tbms)
+            for CellIndex, Cell in enumerate(hubIDs):
+                if Cell in ('', '-1'):
+                    continue
+                TbmHubIDs = Cell.split('/') if '/' in Cell else [Cell]
+                if len(TbmHubIDs) != self.Tbms:
+                    Parser.AddDiagnostic(LadderIndex + 1, Parser.GetColumn(line, CellIndex), "%d hub IDs separated by /"%self.Tbms, repr(Cell))
+                for Tbm, HubID in enumerate(TbmHubIDs[:self.Tbms]):
+                    if HubID.isdigit() and int(HubID) < 128:
+                        ladderHubIDs[CellIndex*self.Tbms + Tbm] = int(HubID)
+                    elif HubID != '-1' and len(TbmHubIDs) == self.Tbms:
+                        Parser.AddDiagnostic(LadderIndex + 1, Parser.GetColumn(line, CellIndex), "hub ID 0-127", repr(HubID))
+            self.HubIDArray[Slot*self.Tbms:(Slot + self.ZPositions*2)*self.Tbms] = ladderHubIDs
+        return Parser.Diagnostics
 
     def GetZPositionName(self, ZPosition):
         if ZPosition < self.ZPositions:
@@ -69,6 +270,16 @@ class BpixLayer:
         else:
             return ("Z%d+" % (ZPosition-self.ZPositions+1))
 
+    def GetZIndexFromName(self, ZPositionName):
+        # inverse of GetZPositionNameRaw, accepts 'Z2-' as well as '2-', raises ValueError
+        Name = ZPositionName.strip().upper().lstrip('Z')
+        if len(Name) < 2 or Name[-1] not in '+-' or not Name[:-1].isdigit() or not 0 < int(Name[:-1]) <= self.ZPositions:
+            raise ValueError("invalid Z position '%s'"%ZPositionName)
+        if Name[-1] == '-':
+            return self.ZPositions - int(Name[:-1])
+        else:
+            return self.ZPositions + int(Name[:-1]) - 1
+
     def GetLadderName(self, LadderIndex):
         return "%d"%(LadderIndex+1)
 
@@ -95,7 +306,7 @@ class BpixLayer:
         PhiIndex = selectedHalfLadderIndex[0]
         ZIndexFrom = selectedHalfLadderIndex[1] * self.ZPositions
         ZIndexTo = (selectedHalfLadderIndex[1] + 1) * self.ZPositions
-        return self.Modules[PhiIndex][ZIndexFrom:ZIndexTo]
+        return self.GetLadderModules(PhiIndex)[ZIndexFrom:ZIndexTo]
 
     def FormatHubIDTuple(self, hubIDTuple):
         return '/'.join(['%d'%x for x in hubIDTuple])
@@ -108,7 +319,7 @@ class BpixLayer:
         PhiIndex = selectedHalfLadderIndex[0]
         ZIndexFrom = selectedHalfLadderIndex[1] * self.ZPositions
         ZIndexTo = (selectedHalfLadderIndex[1] + 1) * self.ZPositions
-        hubIDTuplesList = self.HubIDs[PhiIndex][ZIndexFrom:ZIndexTo]
+        hubIDTuplesList = [self.GetHubIDTuple(PhiIndex, ZIndex) for ZIndex in range(ZIndexFrom, ZIndexTo)]
         return hubIDTuplesList
 
     def GetHalfLadderName(self, HalfLadderIndex):
@@ -120,15 +331,29 @@ class BpixLayer:
         return Name
 
     def SaveAs(self, FileName):
+        # only dirty ladders are formatted again, the file is written at once to a temporary file and renamed,
+        # so it is never left truncated and a file shared with other revisions is not modified
         Success = False
         try:
-            with open(FileName, 'w') as layerFile:
-                LadderIndex = 0
-                for i in range(self.Ladders):
-                    layerFile.write(';'.join(self.Modules[i]) + self.LineEndCharacter)
+            if self.LadderLines is None:
+                self.LadderLines = [None] * self.Ladders
+                DirtyLadders = range(self.Ladders)
+            else:
+                DirtyLadders = self.DirtyLadders
+            for LadderIndex in DirtyLadders:
+                self.LadderLines[LadderIndex] = ';'.join(self.GetLadderModules(LadderIndex)) + self.LineEndCharacter
 
+            with open(FileName + '.tmp', 'w') as layerFile:
+                layerFile.write(''.join(self.LadderLines))
+                # on disk before the rename, otherwise a crash can leave an empty file under the old name
+                layerFile.flush()
+                os.fsync(layerFile.fileno())
+            if os.name == 'nt' and os.path.isfile(FileName):
+                os.remove(FileName)
+            os.rename(FileName + '.tmp', FileName)
+            self.DirtyLadders = set()
             Success = True
         except:
-            pass
+            self.LadderLines = None
 
         return Success
\ No newline at end of file
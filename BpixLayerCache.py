@@ -0,0 +1,53 @@
+import os
+import cPickle as pickle
+
+class BpixLayerCache:
+
+    def __init__(self, Directory):
+        self.Directory = Directory
+        # has to be increased whenever the layer state format changes
+        self.Version = 3
+
+    def GetCacheFileName(self, LayerName):
+        return self.Directory + '%s.pkl'%LayerName
+
+    def GetSignature(self, SourceFileNames, Dimensions = None):
+        # a cached layer is valid as long as all of its source files have the same mtime and size
+        # and the layer has the same Dimensions (ladders, z-positions, TBMs) in config.ini
+        Signature = [('dimensions', Dimensions)] if Dimensions else []
+        for FileName in SourceFileNames:
+            if os.path.isfile(FileName):
+                fileStat = os.stat(FileName)
+                Signature.append((FileName, fileStat.st_mtime, fileStat.st_size))
+            else:
+                Signature.append((FileName, None, None))
+        return Signature
+
+    def Load(self, LayerName, SourceFileNames, Dimensions = None):
+        State = None
+        try:
+            with open(self.GetCacheFileName(LayerName), 'rb') as cacheFile:
+                Version, Signature, CachedState = pickle.load(cacheFile)
+            if Version == self.Version and Signature == self.GetSignature(SourceFileNames, Dimensions):
+                State = CachedState
+        except:
+            pass
+        return State
+
+    def Save(self, LayerName, SourceFileNames, State, Dimensions = None):
+        Success = False
+        try:
+            if not os.path.isdir(self.Directory):
+                os.makedirs(self.Directory)
+            cacheFileName = self.GetCacheFileName(LayerName)
+            with open(cacheFileName + '.tmp', 'wb') as cacheFile:
+                pickle.dump((self.Version, self.GetSignature(SourceFileNames, Dimensions), State), cacheFile, pickle.HIGHEST_PROTOCOL)
+                cacheFile.flush()
+                os.fsync(cacheFile.fileno())
+            if os.name == 'nt' and os.path.isfile(cacheFileName):
+                os.remove(cacheFileName)
+            os.rename(cacheFileName + '.tmp', cacheFileName)
+            Success = True
+        except:
+            pass
+        return Success
@@ -0,0 +1,48 @@
+def FormatDiagnostic(Diagnostic):
+    return "{file}:{line}:{column}: expected {expected}, got {got}".format(**Diagnostic)
+
+class BpixLayerFileParser:
+
+    # single pass over a layer file (plan, mount or hub IDs): one line per ladder, cells separated by ; or tab,
+    # everything after the first blank in a cell is ignored
+    # problems are collected as diagnostics (dicts with file, line, column, expected, got) instead of stopping at the first one
+    def __init__(self, FileName, Ladders, Cells, Diagnostics = None):
+        self.FileName = FileName
+        self.Ladders = Ladders
+        self.Cells = Cells
+        self.Diagnostics = Diagnostics if Diagnostics is not None else []
+
+    def AddDiagnostic(self, LineNumber, Column, Expected, Got):
+        self.Diagnostics.append({'file': self.FileName, 'line': LineNumber, 'column': Column, 'expected': Expected, 'got': Got})
+
+    def GetColumn(self, Line, CellIndex):
+        # 1 based column of a cell, only needed for diagnostics
+        Column = 1
+        for i in range(CellIndex):
+            Column += len(Line[Column - 1:].replace('\t', ';').split(';', 1)[0]) + 1
+        return Column
+
+    def ReadLadders(self):
+        # yields (LadderIndex, cells, line) for every well formed line, the line is only kept for GetColumn
+        LineNumber = 0
+        try:
+            with open(self.FileName, 'r') as layerFile:
+                for Line in layerFile:
+                    LineNumber += 1
+                    Line = Line.rstrip('\r\n')
+                    if LineNumber > self.Ladders:
+                        if len(Line.strip()) > 0:
+                            self.AddDiagnostic(LineNumber, 1, "%d lines (one per ladder)"%self.Ladders, "line %d"%LineNumber)
+                        continue
+                    Cells = (Line.replace('\t', ';') if '\t' in Line else Line).split(';')
+                    if len(Cells) != self.Cells:
+                        self.AddDiagnostic(LineNumber, self.GetColumn(Line, self.Cells) if len(Cells) > self.Cells else len(Line) + 1, "%d cells"%self.Cells, "%d cells"%len(Cells))
+                        continue
+                    if ' ' in Line:
+                        Cells = [(Cell.split() or [''])[0] if ' ' in Cell else Cell for Cell in Cells]
+                    yield LineNumber - 1, Cells, Line
+        except IOError as e:
+            self.AddDiagnostic(LineNumber, 1, "readable file", str(e))
+            return
+        if LineNumber < self.Ladders:
+            self.AddDiagnostic(LineNumber + 1, 1, "%d lines (one per ladder)"%self.Ladders, "%d lines"%LineNumber)
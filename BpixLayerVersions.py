@@ -0,0 +1,27 @@
+import os
+
+class BpixLayerVersions:
+
+    # version stamp per layer of one revision directory, increased by every save which changed the mount file
+    def __init__(self, Directory):
+        self.FileName = Directory + 'layer_versions.txt'
+
+    def Read(self):
+        Versions = {}
+        if os.path.isfile(self.FileName):
+            with open(self.FileName, 'r') as versionsFile:
+                for line in versionsFile:
+                    lineParts = line.strip().split(';')
+                    if len(lineParts) == 2 and lineParts[1].isdigit():
+                        Versions[lineParts[0]] = int(lineParts[1])
+        return Versions
+
+    def Write(self, Versions):
+        # written to a new file and renamed, so a file shared with other revisions is never modified
+        with open(self.FileName + '.tmp', 'w') as versionsFile:
+            versionsFile.write(''.join(["%s;%d\n"%(LayerName, Versions[LayerName]) for LayerName in sorted(Versions.keys())]))
+            versionsFile.flush()
+            os.fsync(versionsFile.fileno())
+        if os.name == 'nt' and os.path.isfile(self.FileName):
+            os.remove(self.FileName)
+        os.rename(self.FileName + '.tmp', self.FileName)
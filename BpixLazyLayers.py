@@ -0,0 +1,42 @@
+class BpixLazyLayers(dict):
+
+    # dictionary of layers, a layer is only loaded from disk the first time it is accessed
+    def __init__(self, LayerNames, Loader):
+        dict.__init__(self)
+        self.LayerNames = LayerNames
+        self.Loader = Loader
+
+    def __getitem__(self, LayerName):
+        if not dict.__contains__(self, LayerName) and LayerName in self.LayerNames:
+            self.Loader(LayerName)
+        return dict.__getitem__(self, LayerName)
+
+    def __contains__(self, LayerName):
+        return LayerName in self.LayerNames
+
+    def __iter__(self):
+        return iter(self.LayerNames)
+
+    def __len__(self):
+        return len(self.LayerNames)
+
+    def get(self, LayerName, default = None):
+        if LayerName in self.LayerNames:
+            return self[LayerName]
+        return default
+
+    def keys(self):
+        return list(self.LayerNames)
+
+    def values(self):
+        return [self[LayerName] for LayerName in self.LayerNames]
+
+    def items(self):
+        return [(LayerName, self[LayerName]) for LayerName in self.LayerNames]
+
+    def IsLoaded(self, LayerName):
+        return dict.__contains__(self, LayerName)
+
+    def GetLoaded(self):
+        # already loaded layers only, does not trigger loading
+        return dict((LayerName, dict.__getitem__(self, LayerName)) for LayerName in self.LayerNames if dict.__contains__(self, LayerName))
@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import datetime
+
+class BpixLog:
+
+    def __init__(self, Directory, FileName = 'bpixm.log', MaxSize = 10*1024*1024, FlushInterval = 20, Lock = None):
+        self.Directory = Directory
+        self.FileName = FileName
+        self.IndexFileName = FileName + '.idx'
+        self.KeysFileName = FileName + '.keys'
+        self.MaxSize = MaxSize
+        self.FlushInterval = FlushInterval
+        self.LineEndCharacter = '\n'
+        self.LinePattern = re.compile(r'^(\S+ \S+) \[([^\]]*)\] ?(.*)$')
+
+        # keys for the inverted index (module IDs, layers and ladders) found in the message text,
+        # the layer/ladder patterns match the messages written by the mount and comment menus
+        self.ModulePattern = re.compile(r'\b(M\d+)\b')
+        self.LadderPatterns = [re.compile(r'Layer: (\w+), Ladder: L(\d+)'), re.compile(r'^(\w+)/(\d+)/')]
+
+        # lock shared with the other stations writing to the same log, e.g. the data lock
+        self.Lock = Lock
+        self.Part = 1
+        # (Date, Category, Message, Keys) not yet written
+        self.PendingEntries = []
+
+    # rotated log files are named bpixm.log.1, bpixm.log.2, ..., the active file is always bpixm.log
+    def GetPartFileName(self, Part):
+        if Part == self.GetActivePart():
+            return self.Directory + self.FileName
+        return self.Directory + self.FileName + '.%d'%Part
+
+    def GetActivePart(self):
+        Part = 1
+        while os.path.isfile(self.Directory + self.FileName + '.%d'%Part):
+            Part += 1
+        return Part
+
+    def ParseLine(self, line):
+        match = self.LinePattern.match(line.rstrip('\r\n'))
+        if match:
+            return match.group(1), match.group(2), match.group(3)
+        return '', '', line.rstrip('\r\n')
+
+    def ReadLastEntry(self):
+        indexFileName = self.Directory + self.IndexFileName
+        if not os.path.isfile(indexFileName):
+            return None
+        with open(indexFileName, 'rb') as indexFile:
+            indexFile.seek(0, 2)
+            size = indexFile.tell()
+            indexFile.seek(max(0, size - 4096))
+            lines = indexFile.read().split(self.LineEndCharacter)
+        for line in reversed(lines):
+            try:
+                return json.loads(line)
+            except:
+                pass
+        return None
+
+    def GetKeys(self, Message, Keys = None):
+        AllKeys = list(Keys) if Keys else []
+        AllKeys += self.ModulePattern.findall(Message)
+        for pattern in self.LadderPatterns:
+            for Layer, Ladder in pattern.findall(Message):
+                AllKeys += [Layer, '%s/%s'%(Layer, Ladder)]
+        return sorted(set(AllKeys))
+
+    def IndexPart(self, Part, Offset, indexFile, keysFile):
+        Indexed = 0
+        with open(self.GetPartFileName(Part), 'rb') as logFile:
+            logFile.seek(Offset)
+            for line in logFile:
+                if not line.endswith(self.LineEndCharacter):
+                    break
+                Date, Category, Message = self.ParseLine(line)
+                indexFile.write(self.FormatIndexEntry(Date, Category, Part, Offset, len(line)))
+                keysFile.write(self.FormatKeyEntries(self.GetKeys(Message), Part, Offset, len(line)))
+                Offset += len(line)
+                Indexed += 1
+        return Indexed
+
+    def UpdateIndex(self):
+        # index lines which were written without index (older versions of the tool or crash before flush)
+        # other stations may index the same log, so this is done while holding the lock
+        if self.Lock:
+            self.Lock.Acquire()
+        try:
+            return self.UpdateIndexLocked()
+        finally:
+            if self.Lock:
+                self.Lock.Release()
+
+    def UpdateIndexLocked(self):
+        self.Part = self.GetActivePart()
+        Indexed = 0
+
+        # no inverted index yet: index all parts from scratch into new files, the keys file is renamed last
+        # and only exists when the index is complete
+        if not os.path.isfile(self.Directory + self.KeysFileName):
+            with open(self.Directory + self.IndexFileName + '.tmp', 'wb') as indexFile:
+                with open(self.Directory + self.KeysFileName + '.tmp', 'wb') as keysFile:
+                    for Part in range(1, self.Part + 1):
+                        if os.path.isfile(self.GetPartFileName(Part)):
+                            Indexed += self.IndexPart(Part, 0, indexFile, keysFile)
+            for fileName in [self.IndexFileName, self.KeysFileName]:
+                if os.name == 'nt' and os.path.isfile(self.Directory + fileName):
+                    os.remove(self.Directory + fileName)
+                os.rename(self.Directory + fileName + '.tmp', self.Directory + fileName)
+            return Indexed
+
+        lastEntry = self.ReadLastEntry()
+        indexedSize = 0
+        if lastEntry and lastEntry['part'] == self.Part:
+            indexedSize = lastEntry['offset'] + lastEntry['length']
+
+        logFileName = self.Directory + self.FileName
+        if os.path.isfile(logFileName) and os.path.getsize(logFileName) > indexedSize:
+            with open(self.Directory + self.IndexFileName, 'ab') as indexFile:
+                with open(self.Directory + self.KeysFileName, 'ab') as keysFile:
+                    Indexed += self.IndexPart(self.Part, indexedSize, indexFile, keysFile)
+        return Indexed
+
+    def FormatKeyEntries(self, Keys, Part, Offset, Length):
+        return ''.join(["%s;%d;%d;%d%s"%(Key, Part, Offset, Length, self.LineEndCharacter) for Key in Keys])
+
+    def FormatIndexEntry(self, Date, Category, Part, Offset, Length):
+        return json.dumps({'date': Date, 'category': Category, 'part': Part, 'offset': Offset, 'length': Length}, sort_keys=True) + self.LineEndCharacter
+
+    def Rotate(self):
+        os.rename(self.Directory + self.FileName, self.Directory + self.FileName + '.%d'%self.Part)
+        self.Part = self.GetActivePart()
+
+    def AppendLines(self, LogLines, IndexLines, KeyLines):
+        # log first, so the index never points behind the end of the log
+        for fileName, lines in [(self.FileName, LogLines), (self.IndexFileName, IndexLines), (self.KeysFileName, KeyLines)]:
+            with open(self.Directory + fileName, 'ab') as appendFile:
+                appendFile.write(''.join(lines))
+
+    def Write(self, Message, Category = 'LOG', Keys = None):
+        Date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        self.PendingEntries.append((Date, Category, Message, Keys))
+        if len(self.PendingEntries) >= self.FlushInterval:
+            self.Flush()
+
+    def Flush(self):
+        # other stations append to the same files, so the offsets are taken from the real end of the log while holding the lock
+        if len(self.PendingEntries) < 1:
+            return
+        try:
+            if self.Lock:
+                self.Lock.Acquire()
+        except IOError:
+            # written with the next flush
+            return
+        try:
+            self.UpdateIndex()
+            logFileName = self.Directory + self.FileName
+            Offset = os.path.getsize(logFileName) if os.path.isfile(logFileName) else 0
+            LogLines, IndexLines, KeyLines = [], [], []
+            for Date, Category, Message, Keys in self.PendingEntries:
+                logString = "{Date} [{Category}] {Message}\n".format(Date=Date, Category=Category, Message=Message)
+                if Offset > 0 and Offset + len(logString) > self.MaxSize:
+                    self.AppendLines(LogLines, IndexLines, KeyLines)
+                    LogLines, IndexLines, KeyLines = [], [], []
+                    self.Rotate()
+                    Offset = 0
+                LogLines.append(logString)
+                IndexLines.append(self.FormatIndexEntry(Date, Category, self.Part, Offset, len(logString)))
+                KeyLines.append(self.FormatKeyEntries(self.GetKeys(Message, Keys), self.Part, Offset, len(logString)))
+                Offset += len(logString)
+            self.AppendLines(LogLines, IndexLines, KeyLines)
+            self.PendingEntries = []
+        finally:
+            if self.Lock:
+                self.Lock.Release()
+
+    def Close(self):
+        self.Flush()
+
+    def GetLastDate(self):
+        lastEntry = self.ReadLastEntry()
+        if not lastEntry:
+            self.UpdateIndex()
+            lastEntry = self.ReadLastEntry()
+        return lastEntry['date'] if lastEntry else '?'
+
+    def ReadLines(self, Postings):
+        # Postings: list of (Part, Offset, Length), yields (Date, Category, Message)
+        partFiles = {}
+        try:
+            for Part, Offset, Length in Postings:
+                if Part not in partFiles:
+                    partFiles[Part] = open(self.GetPartFileName(Part), 'rb')
+                partFiles[Part].seek(Offset)
+                yield self.ParseLine(partFiles[Part].read(Length))
+        finally:
+            for partFile in partFiles.values():
+                partFile.close()
+
+    def GetPostings(self, Key):
+        # (Part, Offset, Length) of all lines tagged with Key, using the inverted index
+        self.Flush()
+        keysFileName = self.Directory + self.KeysFileName
+        if not os.path.isfile(keysFileName):
+            self.UpdateIndex()
+        Postings = []
+        keyPrefix = Key + ';'
+        with open(keysFileName, 'rb') as keysFile:
+            for line in keysFile:
+                if line.startswith(keyPrefix):
+                    try:
+                        Postings.append(tuple([int(x) for x in line.rstrip('\r\n').split(';')[1:4]]))
+                    except:
+                        pass
+        return Postings
+
+    def Query(self, Key):
+        # yields (Date, Category, Message) for all lines tagged with Key
+        for entry in self.ReadLines(self.GetPostings(Key)):
+            yield entry
+
+    def FindFirst(self, Category, MessagePrefix):
+        # (Part, Offset) of the first line of Category whose message starts with MessagePrefix, None if there is none
+        self.Flush()
+        indexFileName = self.Directory + self.IndexFileName
+        if not os.path.isfile(indexFileName):
+            return None
+        Postings = []
+        with open(indexFileName, 'rb') as indexFile:
+            for line in indexFile:
+                try:
+                    entry = json.loads(line)
+                except:
+                    continue
+                if entry['category'] == Category:
+                    Postings.append((entry['part'], entry['offset'], entry['length']))
+        for (Part, Offset, Length), (Date, EntryCategory, Message) in zip(Postings, self.ReadLines(Postings)):
+            if Message.startswith(MessagePrefix):
+                return Part, Offset
+        return None
+
+    def ReadEntries(self, Categories = None):
+        # yields (Date, Category, Message) in the order they were logged
+        self.Flush()
+        indexFileName = self.Directory + self.IndexFileName
+        if not os.path.isfile(indexFileName):
+            return
+        Postings = []
+        with open(indexFileName, 'rb') as indexFile:
+            for line in indexFile:
+                try:
+                    entry = json.loads(line)
+                except:
+                    continue
+                if Categories and entry['category'] not in Categories:
+                    continue
+                Postings.append((entry['part'], entry['offset'], entry['length']))
+        for entry in self.ReadLines(Postings):
+            yield entry
@@ -0,0 +1,59 @@
+class BpixModuleIndex:
+
+    def __init__(self):
+        # module ID -> set of (LayerName, LadderIndex, ZIndex, Kind), Kind = 'plan' or 'mounted'
+        self.Positions = {}
+
+    def Clear(self):
+        self.Positions = {}
+
+    def Add(self, ModuleID, LayerName, LadderIndex, ZIndex, Kind):
+        ModuleID = ModuleID.strip()
+        if len(ModuleID) > 0:
+            if ModuleID not in self.Positions:
+                self.Positions[ModuleID] = set()
+            self.Positions[ModuleID].add((LayerName, LadderIndex, ZIndex, Kind))
+
+    def Remove(self, ModuleID, LayerName, LadderIndex, ZIndex, Kind):
+        ModuleID = ModuleID.strip()
+        if ModuleID in self.Positions:
+            self.Positions[ModuleID].discard((LayerName, LadderIndex, ZIndex, Kind))
+            if len(self.Positions[ModuleID]) < 1:
+                del self.Positions[ModuleID]
+
+    def AddLayer(self, Layer, LayerName, Kind):
+        for LadderIndex, ZIndex, ModuleID in Layer.IterateModules():
+            self.Add(ModuleID, LayerName, LadderIndex, ZIndex, Kind)
+
+    def RemoveLayer(self, Layer, LayerName, Kind):
+        for LadderIndex, ZIndex, ModuleID in Layer.IterateModules():
+            self.Remove(ModuleID, LayerName, LadderIndex, ZIndex, Kind)
+
+    def Find(self, ModuleID, Kind = None, LayerName = None):
+        ModuleID = ModuleID.strip()
+        if ModuleID not in self.Positions:
+            return []
+        return sorted([x for x in self.Positions[ModuleID] if (Kind is None or x[3] == Kind) and (LayerName is None or x[0] == LayerName)])
+
+    def GetModuleIDs(self, Kind = None, LayerNames = None):
+        # set of modules with at least one position of the given kind in one of the given layers
+        return set([ModuleID for ModuleID, Positions in self.Positions.items() if any([(Kind is None or x[3] == Kind) and (LayerNames is None or x[0] in LayerNames) for x in Positions])])
+
+    def CheckConsistency(self, Layers, Kind):
+        # compares index entries of one kind with the raw Modules lists of the given layers
+        # returns a list of human readable problems, empty if consistent
+        Problems = []
+        Expected = set()
+        for LayerName, Layer in Layers.items():
+            for LadderIndex, ZIndex, ModuleID in Layer.IterateModules():
+                if len(ModuleID.strip()) > 0:
+                    Expected.add((ModuleID.strip(), LayerName, LadderIndex, ZIndex))
+                    if (LayerName, LadderIndex, ZIndex, Kind) not in self.Positions.get(ModuleID.strip(), set()):
+                        Problems.append("{Kind}: {ModuleID} at {Layer} ladder {Ladder} Z {Z} missing in index".format(Kind=Kind, ModuleID=ModuleID, Layer=LayerName, Ladder=LadderIndex+1, Z=ZIndex))
+
+        for ModuleID, Positions in self.Positions.items():
+            for Position in Positions:
+                if Position[3] == Kind and Position[0] in Layers and (ModuleID, Position[0], Position[1], Position[2]) not in Expected:
+                    Problems.append("{Kind}: stale index entry {ModuleID} at {Layer} ladder {Ladder} Z {Z}".format(Kind=Kind, ModuleID=ModuleID, Layer=Position[0], Ladder=Position[1]+1, Z=Position[2]))
+
+        return Problems
@@ -0,0 +1,40 @@
+class BpixPickList:
+
+    # retrieval order for the modules of a mounting session: grouped by container, then tray, then slot,
+    # so every storage box is opened only once
+    def __init__(self, Storage):
+        self.Storage = Storage
+
+    def Plan(self, Items):
+        # Items: list of (LayerName, LadderIndex, ZIndex, ModuleID)
+        # returns [(Container, [(Tray, [(Slot, Location, Item), ...]), ...]), ...], modules with unknown location in container None at the end
+        Locations = self.Storage.GetLocations([Item[3] for Item in Items])
+        Containers = {}
+        for Item in Items:
+            if Item[3] in Locations:
+                Location, Container, Tray, Slot = Locations[Item[3]]
+            else:
+                Location, Container, Tray, Slot = None, None, '', ''
+            Containers.setdefault(Container, {}).setdefault(Tray, []).append((Slot, Location, Item))
+
+        GetNumber = self.Storage.GetNumber
+        Groups = []
+        for Container in sorted([x for x in Containers.keys() if x is not None], key=lambda x: (x.lower(), x)) + ([None] if None in Containers else []):
+            Trays = []
+            for Tray in sorted(Containers[Container].keys(), key=lambda x: (GetNumber(x), x.lower())):
+                Trays.append((Tray, sorted(Containers[Container][Tray], key=lambda x: (GetNumber(x[0]), x[0], x[2]))))
+            Groups.append((Container, Trays))
+        return Groups
+
+    def Format(self, Groups, Title, GetPositionName):
+        # printable pick list, GetPositionName(Item) returns the mounting position of an item
+        lines = [Title, '=' * len(Title)]
+        Modules = sum([len(Slots) for Container, Trays in Groups for Tray, Slots in Trays])
+        lines.append("%d modules from %d containers"%(Modules, len([x for x in Groups if x[0] is not None])))
+        for Container, Trays in Groups:
+            lines.append('')
+            lines.append("%s"%(Container if Container is not None else 'UNKNOWN LOCATION'))
+            for Tray, Slots in Trays:
+                for Slot, Location, Item in Slots:
+                    lines.append("  [ ] %-8s %-12s %-8s -> %s"%(Tray, ("slot %s"%Slot) if len(Slot) > 0 else (Location if Location else '-'), Item[3], GetPositionName(Item)))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,120 @@
+import csv
+import collections
+import itertools
+
+class BpixPlanner:
+
+    # fills the empty slots of a layer plan with graded modules:
+    #  - the best grades go to the innermost z-positions (Z1-/Z1+), then Z2-/Z2+ and so on
+    #  - the modules of one half ladder are taken from as few storage containers as possible
+    #  - excluded modules (e.g. mounted or planned somewhere else) are never used
+    def __init__(self, Storage = None):
+        self.Storage = Storage
+
+    def GetGradeKey(self, Grade):
+        # lower is better: numbers before letters, A before B, modules without grade last
+        try:
+            return (0, float(Grade), '')
+        except ValueError:
+            return (1 if len(Grade) > 0 else 2, 0, Grade.upper())
+
+    def ReadGrades(self, FileName, Diagnostics = None):
+        # CSV with module ID, grade and storage location (optional), separated by , ; or tab, a header line is skipped
+        # returns [(ModuleID, Grade, Location)], locations missing in the file are taken from storage
+        # lines which can't be read are added to Diagnostics, see BpixLayerFileParser
+        Modules = []
+        with open(FileName, 'r') as gradesFile:
+            lines = gradesFile.read().splitlines()
+        Delimiter = ','
+        for Separator in [';', '\t']:
+            if len(lines) > 0 and Separator in lines[0]:
+                Delimiter = Separator
+                break
+        for LineNumber, row in enumerate(csv.reader(lines, delimiter=Delimiter), start=1):
+            row = [x.strip() for x in row]
+            if len(row) < 1 or len(''.join(row)) < 1:
+                continue
+            ModuleID = 'M' + row[0][1:] if row[0].startswith('D') else row[0]
+            if ModuleID[:1] != 'M' or not ModuleID[1:].isdigit():
+                if LineNumber > 1 and Diagnostics is not None:
+                    Diagnostics.append({'file': FileName, 'line': LineNumber, 'column': 1, 'expected': "module ID M<number>", 'got': repr(row[0])})
+                continue
+            Modules.append((ModuleID, row[1] if len(row) > 1 else '', row[2] if len(row) > 2 else ''))
+
+        if self.Storage:
+            Locations = self.Storage.GetLocations([x[0] for x in Modules if len(x[2]) < 1])
+            Modules = [(ModuleID, Grade, Location if len(Location) > 0 else Locations.get(ModuleID, ('',))[0]) for ModuleID, Grade, Location in Modules]
+        return Modules
+
+    def ParseLocation(self, Location):
+        if self.Storage:
+            return self.Storage.ParseLocation(Location)
+        return Location, '', ''
+
+    def GetNumber(self, Text):
+        return self.Storage.GetNumber(Text) if self.Storage else 0
+
+    def GetRing(self, Layer, ZIndex):
+        # 0 for Z1- and Z1+, 1 for Z2- and Z2+, ...
+        return Layer.ZPositions - 1 - ZIndex if ZIndex < Layer.ZPositions else ZIndex - Layer.ZPositions
+
+    def Plan(self, Layer, Modules, Excluded = None):
+        # fills the empty slots of Layer, Modules: [(ModuleID, Grade, Location)]
+        # returns (assigned [(LadderIndex, ZIndex, ModuleID)], slots left empty because there are not enough modules)
+        Used = set([ModuleID for LadderIndex, ZIndex, ModuleID in Layer.IterateModules()]) | (Excluded or set())
+        Available = []
+        for ModuleID, Grade, Location in Modules:
+            if ModuleID not in Used:
+                Used.add(ModuleID)
+                Container, Tray, Slot = self.ParseLocation(Location) if len(Location) > 0 else (None, '', '')
+                Available.append((self.GetGradeKey(Grade), Container is None, Container, self.GetNumber(Tray), Tray, self.GetNumber(Slot), Slot, ModuleID))
+        # modules of the same grade are taken in storage order, so whole trays end up on the same ring
+        Available.sort()
+
+        RingSlots = [0] * Layer.ZPositions
+        for LadderIndex in range(Layer.Ladders):
+            for ZIndex in range(2*Layer.ZPositions):
+                if len(Layer.GetModule(LadderIndex, ZIndex)) < 1:
+                    RingSlots[self.GetRing(Layer, ZIndex)] += 1
+
+        # the best remaining modules go to the inner rings. Modules of the same grade which are needed on several rings
+        # are spread over these rings evenly in storage order, so every ring gets modules of the same containers
+        Pools = [collections.OrderedDict() for Ring in range(Layer.ZPositions)]
+        Ring = 0
+        for GradeKey, GradeModules in itertools.groupby(Available, key=lambda x: x[0]):
+            GradeModules = list(GradeModules)
+            Quota = {}
+            while Ring < Layer.ZPositions and sum(Quota.values()) < len(GradeModules):
+                Quota[Ring] = min(RingSlots[Ring], len(GradeModules) - sum(Quota.values()))
+                RingSlots[Ring] -= Quota[Ring]
+                if RingSlots[Ring] < 1:
+                    Ring += 1
+            Given = dict((x, 0) for x in Quota)
+            for Module in GradeModules[:sum(Quota.values())]:
+                ModuleRing = min([x for x in Quota if Given[x] < Quota[x]], key=lambda x: (Given[x] + 1.0) / Quota[x])
+                Given[ModuleRing] += 1
+                Pools[ModuleRing].setdefault(Module[2], collections.deque()).append(Module[-1])
+
+        Assigned = []
+        Unfilled = []
+        for LadderIndex in range(Layer.Ladders):
+            for Side in [0, 1]:
+                OpenSlots = dict((self.GetRing(Layer, ZIndex), ZIndex) for ZIndex in range(Side*Layer.ZPositions, (Side+1)*Layer.ZPositions) if len(Layer.GetModule(LadderIndex, ZIndex)) < 1)
+                while len(OpenSlots) > 0:
+                    # container which can fill most of the open slots, then the one with most modules left
+                    Candidates = collections.OrderedDict()
+                    for Ring in OpenSlots:
+                        for Container, Queue in Pools[Ring].items():
+                            Candidates.setdefault(Container, []).append(Ring)
+                    if len(Candidates) < 1:
+                        Unfilled += [(LadderIndex, ZIndex) for ZIndex in sorted(OpenSlots.values())]
+                        break
+                    Container = max(Candidates.keys(), key=lambda x: (len(Candidates[x]), x is not None, sum([len(Pools[Ring][x]) for Ring in Candidates[x]])))
+                    for Ring in Candidates[Container]:
+                        ModuleID = Pools[Ring][Container].popleft()
+                        if len(Pools[Ring][Container]) < 1:
+                            del Pools[Ring][Container]
+                        Layer.SetModule(LadderIndex, OpenSlots[Ring], ModuleID)
+                        Assigned.append((LadderIndex, OpenSlots[Ring], ModuleID))
+                        del OpenSlots[Ring]
+        return Assigned, Unfilled
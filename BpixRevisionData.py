@@ -0,0 +1,121 @@
+import os
+import ConfigParser
+from array import array
+
+from BpixLayer import BpixLayer
+from BpixLayerCache import BpixLayerCache
+from BpixJournal import BpixJournal
+
+class BpixRevisionData:
+
+    # planned/mounted layers of one revision directory, loaded independently of the active revision
+    def __init__(self, Directory, Config = None):
+        self.Directory = Directory
+        if Config:
+            self.config = Config
+        else:
+            self.config = ConfigParser.ConfigParser()
+            self.config.read(self.Directory + 'config.ini')
+
+        self.LayerNames = [x.strip() for x in self.config.get('Layers', 'LayerNames').split(',')]
+        self.LayerPlanFileName = self.config.get('Layers', 'LayerPlanFileName')
+        self.LayerMountFileName = self.config.get('Layers', 'LayerMountFileName')
+        self.SectorsFileName = self.config.get('Layers', 'SectorsFileName')
+        self.HubIDsFileName = self.config.get('Layers', 'HubIDsFileName')
+        self.LayerCache = BpixLayerCache(self.Directory + '.cache/')
+
+        self.Layers = {}
+        self.LayersMounted = {}
+        self.Sectors = {}
+        # problems found in the layer files, see BpixLayerFileParser
+        self.Diagnostics = {}
+        # layers which were parsed from their files and not taken from the cache
+        self.Parsed = set()
+
+    def LoadLayer(self, LayerName):
+        # returns (planned layer, mounted layer, sectors dict or None)
+        layerLadders = int(self.config.get('Layer_%s'%LayerName, 'Ladders'))
+        layerZpositions = int(self.config.get('Layer_%s'%LayerName, 'ZPositions'))
+        layerTbms = int(self.config.get('Layer_%s'%LayerName, 'Tbms'))
+        Layer = BpixLayer(LayerName, Ladders=layerLadders, ZPositions=layerZpositions, Tbms=layerTbms)
+        LayerMounted = BpixLayer(LayerName+'(mounted)', Ladders=layerLadders, ZPositions=layerZpositions, Tbms=layerTbms)
+        Sectors = None
+
+        layerPlanFileName =  self.Directory + self.LayerPlanFileName.format(Layer=LayerName)
+        layerMountFileName =  self.Directory + self.LayerMountFileName.format(Layer=LayerName)
+        hubIDsFileName =  self.Directory + self.HubIDsFileName.format(Layer=LayerName)
+        sectorsFileName =  self.Directory + self.SectorsFileName.format(Layer=LayerName)
+        sourceFileNames = [layerPlanFileName, layerMountFileName, hubIDsFileName, sectorsFileName]
+        Dimensions = (layerLadders, layerZpositions, layerTbms)
+        Diagnostics = []
+
+        # use parsed layer from cache if none of the files and dimensions has changed since
+        cachedState = self.LayerCache.Load(LayerName, sourceFileNames, Dimensions)
+        if cachedState:
+            try:
+                Layer.SetState(cachedState['plan'])
+                LayerMounted.SetState(cachedState['mounted'])
+                print "initialize %s from cache"%LayerName
+                self.Diagnostics[LayerName] = cachedState['diagnostics']
+                self.Parsed.discard(LayerName)
+                return Layer, LayerMounted, cachedState['sectors']
+            except ValueError:
+                # cache doesn't fit the layer, parsed again below
+                Layer = BpixLayer(LayerName, Ladders=layerLadders, ZPositions=layerZpositions, Tbms=layerTbms)
+                LayerMounted = BpixLayer(LayerName+'(mounted)', Ladders=layerLadders, ZPositions=layerZpositions, Tbms=layerTbms)
+
+        # initialize planned module positions
+        if os.path.isfile(layerPlanFileName):
+            print "initialize ",LayerName
+            Layer.LoadFromFile(layerPlanFileName, Diagnostics)
+        else:
+            print "config file for",LayerName," does not exist!!"
+
+        # initialize already mounted module positions
+        if os.path.isfile(layerMountFileName):
+            print "initialize mounted modules for ", LayerName
+            LayerMounted.LoadFromFile(layerMountFileName, Diagnostics)
+        else:
+            print "mount file for", LayerName, " does not exist!!"
+
+        # initialize HUB IDs
+        if os.path.isfile(hubIDsFileName):
+            print "initialize HUB IDs for ", LayerName
+            Layer.LoadHubIDsFromFile(hubIDsFileName, Diagnostics)
+            LayerMounted.HubIDArray = array('b', Layer.HubIDArray)
+        else:
+            print "HUB IDs file for", LayerName, " does not exist!!"
+
+        # initialize sectors <-> ladders configuration
+        Sectors = self.ReadSectors(LayerName)
+
+        self.Diagnostics[LayerName] = Diagnostics
+        self.Parsed.add(LayerName)
+        self.LayerCache.Save(LayerName, sourceFileNames, {'plan': Layer.GetState(), 'mounted': LayerMounted.GetState(), 'sectors': Sectors, 'diagnostics': Diagnostics}, Dimensions)
+        return Layer, LayerMounted, Sectors
+
+    def ReadSectors(self, LayerName):
+        # {SectorID: [Ladder, ...]} with ladders starting at 1, None if there is no sectors file
+        sectorsFileName =  self.Directory + self.SectorsFileName.format(Layer=LayerName)
+        if not os.path.isfile(sectorsFileName):
+            return None
+        Sectors = {}
+        with open(sectorsFileName, 'r') as sectorsFile:
+            try:
+                for sectorLine in sectorsFile:
+                    sectorID = int(sectorLine.split(':')[0].strip(' '))
+                    ladders = [int(x) for x in sectorLine.split(':')[1].strip(' ').split(',')]
+                    Sectors[sectorID] = ladders
+            except:
+                print sectorsFileName,": bad formatted line:", sectorLine
+        return Sectors
+
+    def LoadAll(self):
+        # all layers including not yet compacted changes from the mount journal, without writing anything back
+        for LayerName in self.LayerNames:
+            self.Layers[LayerName], self.LayersMounted[LayerName], Sectors = self.LoadLayer(LayerName)
+            if Sectors is not None:
+                self.Sectors[LayerName] = Sectors
+        Journal = BpixJournal(self.Directory)
+        Journal.Replay(self.LayersMounted, Journal.GetFileNames())
+        return self
@@ -0,0 +1,111 @@
+from itertools import izip
+
+from BpixLayer import ModuleIDs
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class BpixRevisionDiff:
+
+    def __init__(self, RevisionA, RevisionB):
+        # RevisionA/B: loaded BpixRevisionData, A is the baseline
+        self.RevisionA = RevisionA
+        self.RevisionB = RevisionB
+
+    def GetChangedSlots(self, ArrayA, ArrayB, Width = 1):
+        # indices of slots where any of the Width entries differ, arrays of equal length
+        if ArrayA == ArrayB:
+            return []
+        if numpy is not None:
+            dataType = numpy.dtype('i%d'%ArrayA.itemsize)
+            Different = numpy.frombuffer(ArrayA, dtype=dataType) != numpy.frombuffer(ArrayB, dtype=dataType)
+            if Width > 1:
+                Different = Different.reshape(-1, Width).any(axis=1)
+            return numpy.flatnonzero(Different).tolist()
+        return sorted(set([i // Width for i, (a, b) in enumerate(izip(ArrayA, ArrayB)) if a != b]))
+
+    def GetPositions(self, Layers, ModuleCodes):
+        # ModuleID -> list of (LayerName, LadderIndex, ZIndex) for the given module codes only
+        Positions = {}
+        for LayerName, Layer in Layers.items():
+            SlotsPerLadder = Layer.ZPositions*2
+            if numpy is not None:
+                Codes = numpy.frombuffer(Layer.ModuleCodes, dtype=numpy.dtype('i%d'%Layer.ModuleCodes.itemsize))
+                Slots = numpy.flatnonzero(numpy.in1d(Codes, list(ModuleCodes))).tolist()
+            else:
+                Slots = [Slot for Slot, Code in enumerate(Layer.ModuleCodes) if Code in ModuleCodes]
+            for Slot in Slots:
+                Positions.setdefault(ModuleIDs.IDs[Layer.ModuleCodes[Slot]], []).append((LayerName, Slot // SlotsPerLadder, Slot % SlotsPerLadder))
+        return Positions
+
+    def CompareKind(self, LayersA, LayersB, Kind, Report):
+        ChangedCodes = set()
+        for LayerName in sorted(set(LayersA.keys()) | set(LayersB.keys())):
+            if LayerName not in LayersA or LayerName not in LayersB:
+                Report['layers'].append((Kind, LayerName, 'only in REV A' if LayerName in LayersA else 'only in REV B'))
+                for Layer in [LayersA.get(LayerName), LayersB.get(LayerName)]:
+                    if Layer:
+                        ChangedCodes.update([Code for Code in Layer.ModuleCodes if Code])
+                continue
+            LayerA = LayersA[LayerName]
+            LayerB = LayersB[LayerName]
+            if (LayerA.Ladders, LayerA.ZPositions, LayerA.Tbms) != (LayerB.Ladders, LayerB.ZPositions, LayerB.Tbms):
+                Report['layers'].append((Kind, LayerName, 'dimensions changed'))
+                ChangedCodes.update([Code for Code in LayerA.ModuleCodes if Code])
+                ChangedCodes.update([Code for Code in LayerB.ModuleCodes if Code])
+                continue
+
+            for Slot in self.GetChangedSlots(LayerA.ModuleCodes, LayerB.ModuleCodes):
+                ChangedCodes.add(LayerA.ModuleCodes[Slot])
+                ChangedCodes.add(LayerB.ModuleCodes[Slot])
+
+            if Kind == 'plan':
+                SlotsPerLadder = LayerA.ZPositions*2
+                for Slot in self.GetChangedSlots(LayerA.HubIDArray, LayerB.HubIDArray, LayerA.Tbms):
+                    LadderIndex = Slot // SlotsPerLadder
+                    ZIndex = Slot % SlotsPerLadder
+                    Report['hubids'].append((LayerName, LadderIndex, ZIndex, LayerA.GetHubIDTuple(LadderIndex, ZIndex), LayerB.GetHubIDTuple(LadderIndex, ZIndex)))
+
+        ChangedCodes.discard(0)
+        if len(ChangedCodes) < 1:
+            return
+
+        # only modules in changed slots have to be located
+        PositionsA = self.GetPositions(LayersA, ChangedCodes)
+        PositionsB = self.GetPositions(LayersB, ChangedCodes)
+        for ModuleID in sorted(set(PositionsA.keys()) | set(PositionsB.keys())):
+            if ModuleID not in PositionsA:
+                Report['added'].append((Kind, ModuleID, PositionsB[ModuleID]))
+            elif ModuleID not in PositionsB:
+                Report['removed'].append((Kind, ModuleID, PositionsA[ModuleID]))
+            elif sorted(PositionsA[ModuleID]) != sorted(PositionsB[ModuleID]):
+                Report['moved'].append((Kind, ModuleID, PositionsA[ModuleID], PositionsB[ModuleID]))
+
+    def Compute(self):
+        Report = {'layers': [], 'added': [], 'removed': [], 'moved': [], 'hubids': []}
+        self.CompareKind(self.RevisionA.Layers, self.RevisionB.Layers, 'plan', Report)
+        self.CompareKind(self.RevisionA.LayersMounted, self.RevisionB.LayersMounted, 'mounted', Report)
+        return Report
+
+    def GetLayers(self, Revision, Kind):
+        return Revision.Layers if Kind == 'plan' else Revision.LayersMounted
+
+    def FormatPositions(self, Positions, Layers):
+        # Layers: the layers of the revision the positions belong to, z-positions are named as in the menus (Z2-)
+        return ', '.join(["%s L%d %s"%(LayerName, LadderIndex+1, Layers[LayerName].GetZPositionNameRaw(ZIndex)) for LayerName, LadderIndex, ZIndex in Positions])
+
+    def FormatReport(self, Report):
+        Lines = []
+        for Kind, LayerName, Change in Report['layers']:
+            Lines.append("LAYER    %-7s %s: %s"%(Kind, LayerName, Change))
+        for Kind, ModuleID, Positions in Report['added']:
+            Lines.append("ADDED    %-7s %s at %s"%(Kind, ModuleID, self.FormatPositions(Positions, self.GetLayers(self.RevisionB, Kind))))
+        for Kind, ModuleID, Positions in Report['removed']:
+            Lines.append("REMOVED  %-7s %s from %s"%(Kind, ModuleID, self.FormatPositions(Positions, self.GetLayers(self.RevisionA, Kind))))
+        for Kind, ModuleID, PositionsA, PositionsB in Report['moved']:
+            Lines.append("MOVED    %-7s %s %s -> %s"%(Kind, ModuleID, self.FormatPositions(PositionsA, self.GetLayers(self.RevisionA, Kind)), self.FormatPositions(PositionsB, self.GetLayers(self.RevisionB, Kind))))
+        for LayerName, LadderIndex, ZIndex, HubIDsA, HubIDsB in Report['hubids']:
+            Lines.append("HUB-ID   %s L%d %s: %s -> %s"%(LayerName, LadderIndex+1, self.RevisionB.Layers[LayerName].GetZPositionNameRaw(ZIndex), '/'.join(['%d'%x for x in HubIDsA]), '/'.join(['%d'%x for x in HubIDsB])))
+        return Lines
@@ -0,0 +1,105 @@
+import os
+import shutil
+import hashlib
+
+class BpixRevisionStore:
+
+    def __init__(self, DataDirectoryBase):
+        # dot directory, so it is not picked up as a revision by glob(data/*/)
+        self.ObjectDirectory = DataDirectoryBase + '.objects/'
+        self.ManifestFileName = 'manifest.txt'
+
+        # files which are never shared between revisions
+        self.PrivateFiles = ['mount_journal.txt']
+        # files which are not carried over to a new revision at all (logs incl. index and rotated parts)
+        self.SkippedFiles = [self.ManifestFileName]
+        self.SkippedPrefixes = ['bpixm.log']
+
+    def HashFile(self, FileName):
+        fileHash = hashlib.sha1()
+        with open(FileName, 'rb') as dataFile:
+            while True:
+                chunk = dataFile.read(65536)
+                if not chunk:
+                    break
+                fileHash.update(chunk)
+        return fileHash.hexdigest()
+
+    def GetObjectFileName(self, Hash):
+        return self.ObjectDirectory + Hash
+
+    def ReadManifest(self, RevisionDirectory):
+        Manifest = {}
+        manifestFileName = RevisionDirectory + self.ManifestFileName
+        if os.path.isfile(manifestFileName):
+            with open(manifestFileName, 'r') as manifestFile:
+                for line in manifestFile:
+                    lineParts = line.strip().split(';')
+                    if len(lineParts) == 2:
+                        Manifest[lineParts[0]] = lineParts[1]
+        return Manifest
+
+    def WriteManifest(self, RevisionDirectory, Manifest):
+        with open(RevisionDirectory + self.ManifestFileName, 'w') as manifestFile:
+            for FileName in sorted(Manifest.keys()):
+                manifestFile.write("%s;%s\n"%(FileName, Manifest[FileName]))
+
+    def StoreFile(self, FileName, KnownHash = None):
+        # files still linked to their object from the last revision don't need to be hashed again
+        if KnownHash and os.path.isfile(self.GetObjectFileName(KnownHash)):
+            try:
+                if os.path.samefile(FileName, self.GetObjectFileName(KnownHash)):
+                    return KnownHash
+            except:
+                pass
+
+        Hash = self.HashFile(FileName)
+        objectFileName = self.GetObjectFileName(Hash)
+        if not os.path.isfile(objectFileName):
+            if not os.path.isdir(self.ObjectDirectory):
+                os.makedirs(self.ObjectDirectory)
+            shutil.copyfile(FileName, objectFileName + '.tmp')
+            with open(objectFileName + '.tmp', 'r+b') as objectFile:
+                os.fsync(objectFile.fileno())
+            os.rename(objectFileName + '.tmp', objectFileName)
+        return Hash
+
+    def LinkObject(self, Hash, FileName):
+        try:
+            os.link(self.GetObjectFileName(Hash), FileName)
+        except:
+            # no hard links on this platform/filesystem, fall back to a private copy
+            shutil.copyfile(self.GetObjectFileName(Hash), FileName)
+
+    def CreateRevision(self, SourceDirectory, TargetDirectory):
+        os.makedirs(TargetDirectory)
+        SourceManifest = self.ReadManifest(SourceDirectory)
+        Manifest = {}
+        for FileName in sorted(os.listdir(SourceDirectory)):
+            sourceFileName = SourceDirectory + FileName
+            if not os.path.isfile(sourceFileName) or FileName in self.SkippedFiles or any([FileName.startswith(x) for x in self.SkippedPrefixes]):
+                continue
+            if FileName in self.PrivateFiles:
+                shutil.copyfile(sourceFileName, TargetDirectory + FileName)
+            else:
+                Hash = self.StoreFile(sourceFileName, SourceManifest.get(FileName, None))
+                self.LinkObject(Hash, TargetDirectory + FileName)
+                Manifest[FileName] = Hash
+        self.WriteManifest(TargetDirectory, Manifest)
+
+        # the source files are the same content as the stored objects now, share them as well
+        for FileName, Hash in Manifest.items():
+            self.ShareFile(SourceDirectory + FileName, Hash)
+        self.WriteManifest(SourceDirectory, Manifest)
+
+        return True
+
+    def ShareFile(self, FileName, Hash):
+        try:
+            if not os.path.samefile(FileName, self.GetObjectFileName(Hash)):
+                os.link(self.GetObjectFileName(Hash), FileName + '.tmp')
+                if os.name == 'nt':
+                    os.remove(FileName)
+                os.rename(FileName + '.tmp', FileName)
+        except:
+            pass
@@ -0,0 +1,85 @@
+from array import array
+
+class BpixSectorIndex:
+
+    # ladder -> sector and sector -> slots of one layer, with status counts per sector
+    # the counts are updated slot by slot when modules are mounted or cleared, see UpdateSlots
+    # ladders which are not in any sector are counted in sector None
+    Categories = ['planned', 'mounted', 'conform', 'MISMATCH', 'EMPTY', 'UNPLANNED']
+
+    def __init__(self, Layer, LayerMounted, Sectors):
+        self.Layer = Layer
+        self.LayerMounted = LayerMounted
+        self.SlotsPerLadder = Layer.ZPositions*2
+
+        self.LadderSectors = [None] * Layer.Ladders
+        for SectorID in sorted((Sectors or {}).keys()):
+            for Ladder in Sectors[SectorID]:
+                if 0 < Ladder <= Layer.Ladders and self.LadderSectors[Ladder - 1] is None:
+                    self.LadderSectors[Ladder - 1] = SectorID
+        self.SectorLadders = {}
+        for LadderIndex, SectorID in enumerate(self.LadderSectors):
+            self.SectorLadders.setdefault(SectorID, []).append(LadderIndex)
+
+        # bitmask of categories per slot, as counted in the sector totals
+        self.SlotStates = array('b', [0]) * len(Layer.ModuleCodes)
+        self.Counts = {}
+        self.Build()
+
+    def GetSector(self, LadderIndex):
+        return self.LadderSectors[LadderIndex]
+
+    def GetSectorIDs(self):
+        return sorted([x for x in self.SectorLadders.keys() if x is not None]) + ([None] if None in self.SectorLadders else [])
+
+    def GetSectorLadders(self, SectorID):
+        return self.SectorLadders.get(SectorID, [])
+
+    def GetSectorSlots(self, SectorID):
+        return [(LadderIndex, ZIndex) for LadderIndex in self.GetSectorLadders(SectorID) for ZIndex in range(self.SlotsPerLadder)]
+
+    def GetSlotState(self, Slot):
+        Planned = self.Layer.ModuleCodes[Slot]
+        Mounted = self.LayerMounted.ModuleCodes[Slot]
+        State = 0
+        if Planned:
+            State |= 1
+        if Mounted:
+            State |= 2
+        if Planned and Mounted:
+            State |= 4 if Planned == Mounted else 8
+        elif Planned:
+            State |= 16
+        elif Mounted:
+            State |= 32
+        return State
+
+    def Build(self):
+        self.Counts = dict((SectorID, dict([('slots', len(Ladders)*self.SlotsPerLadder), ('HUB-ID', 0)] + [(x, 0) for x in self.Categories])) for SectorID, Ladders in self.SectorLadders.items())
+        for Slot in range(len(self.SlotStates)):
+            self.SlotStates[Slot] = 0
+            self.UpdateSlot(Slot)
+
+    def UpdateSlot(self, Slot):
+        OldState = self.SlotStates[Slot]
+        NewState = self.GetSlotState(Slot)
+        if OldState != NewState:
+            Counts = self.Counts[self.LadderSectors[Slot // self.SlotsPerLadder]]
+            for Bit, Category in enumerate(self.Categories):
+                Counts[Category] += ((NewState >> Bit) & 1) - ((OldState >> Bit) & 1)
+            self.SlotStates[Slot] = NewState
+
+    def UpdateSlots(self, Slots):
+        # Slots: list of (LadderIndex, ZIndex) which have been changed
+        for LadderIndex, ZIndex in Slots:
+            self.UpdateSlot(LadderIndex*self.SlotsPerLadder + ZIndex)
+
+    def SetHubIDIssues(self, Issues):
+        # hub ID problems from BpixHubIDs.Validate, ladder numbers start at 1
+        for Counts in self.Counts.values():
+            Counts['HUB-ID'] = 0
+        for Issue in Issues:
+            self.Counts[self.LadderSectors[Issue['ladder'] - 1]]['HUB-ID'] += 1
+
+    def GetCounts(self, SectorID):
+        return self.Counts.get(SectorID)
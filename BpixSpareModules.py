@@ -0,0 +1,54 @@
+from BpixPlanner import BpixPlanner
+
+class BpixSpareModules:
+
+    # replacement candidates for a failed module: modules in storage which are neither planned nor mounted anywhere,
+    # the ones stored closest to the planned/replaced module first (same tray, same container), then by grade
+    ProximityNames = ['same tray', 'same container', 'other container', 'location unknown']
+
+    def __init__(self, Storage, Grades = None):
+        self.Storage = Storage
+        # {ModuleID: Grade}, optional
+        self.Grades = Grades or {}
+        self.GetGradeKey = BpixPlanner().GetGradeKey
+        self.Locations = None
+        self.LocationsSignature = None
+
+    def GetLocations(self):
+        # all storage locations, read again only when the storage list changed
+        Signature = self.Storage.GetSignature()
+        if self.Locations is None or Signature != self.LocationsSignature:
+            self.Locations = self.Storage.GetAllLocations()
+            self.LocationsSignature = Signature
+        return self.Locations
+
+    def GetSpares(self, UsedModules):
+        # {ModuleID: (Location, Container, Tray, Slot)} of the stored modules which are not in UsedModules
+        Locations = self.GetLocations()
+        return dict((ModuleID, Locations[ModuleID]) for ModuleID in set(Locations.keys()) - set(UsedModules))
+
+    def GetProximity(self, Reference, Location):
+        # index into ProximityNames
+        if not Location or len(Location[0]) < 1:
+            return 3
+        if Reference and Reference[1].lower() == Location[1].lower():
+            return 0 if len(Location[2]) > 0 and Reference[2].lower() == Location[2].lower() else 1
+        return 2
+
+    def Recommend(self, UsedModules, ReferenceModuleIDs, Count = 5):
+        # ReferenceModuleIDs: modules whose storage location is searched near, the first one with known location is used
+        # returns [(ModuleID, Location, Grade, Proximity)], best first
+        Locations = self.GetLocations()
+        Reference = None
+        for ModuleID in ReferenceModuleIDs:
+            if ModuleID in Locations and len(Locations[ModuleID][0]) > 0:
+                Reference = Locations[ModuleID]
+                break
+        GetNumber = self.Storage.GetNumber
+        Candidates = []
+        for ModuleID, Location in self.GetSpares(UsedModules).items():
+            Proximity = self.GetProximity(Reference, Location)
+            Distance = (abs(GetNumber(Location[2]) - GetNumber(Reference[2])), abs(GetNumber(Location[3]) - GetNumber(Reference[3]))) if Reference and Proximity < 2 else (0, 0)
+            Candidates.append(((Proximity, self.GetGradeKey(self.Grades.get(ModuleID, ''))) + Distance + (ModuleID,), ModuleID, Location[0], self.Grades.get(ModuleID, ''), Proximity))
+        Candidates.sort()
+        return [x[1:] for x in Candidates[:Count]]
@@ -0,0 +1,76 @@
+import json
+import select
+import socket
+import time
+
+def ParseAddress(Address):
+    # 'host:port' for TCP, everything else is the path of a unix socket
+    if ':' in Address:
+        host, port = Address.rsplit(':', 1)
+        return (host, int(port))
+    return Address
+
+def CreateSocket(Address):
+    if isinstance(Address, tuple):
+        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+class BpixStateClient:
+
+    # connection to a BpixStateServer, messages are JSON objects, one per line
+    # responses carry the id of their request, pushed slot updates have an 'event' field instead
+    def __init__(self, Address, Timeout = 5.0):
+        self.Socket = CreateSocket(Address)
+        self.Socket.settimeout(Timeout)
+        self.Socket.connect(Address)
+        self.Buffer = ''
+        self.NextID = 1
+        self.Events = []
+
+    def Send(self, Message):
+        self.Socket.sendall(json.dumps(Message) + '\n')
+
+    def ReadMessages(self, Timeout = None):
+        # returns all complete messages received within Timeout, raises IOError if the server is gone
+        Messages = []
+        if len(select.select([self.Socket], [], [], Timeout)[0]) > 0:
+            data = self.Socket.recv(65536)
+            if len(data) < 1:
+                raise IOError("connection closed by server")
+            self.Buffer += data
+        while '\n' in self.Buffer:
+            line, self.Buffer = self.Buffer.split('\n', 1)
+            Messages.append(json.loads(line))
+        return Messages
+
+    def Request(self, Operation, **Arguments):
+        RequestID = self.NextID
+        self.NextID += 1
+        Arguments['op'] = Operation
+        Arguments['id'] = RequestID
+        self.Send(Arguments)
+        deadline = time.time() + self.Socket.gettimeout()
+        Response = None
+        while Response is None:
+            if time.time() > deadline:
+                raise IOError("no response from server")
+            # the whole batch is processed, events received together with the response must not be lost
+            for Message in self.ReadMessages(max(0, deadline - time.time())):
+                if Message.get('id') == RequestID:
+                    Response = Message
+                else:
+                    self.Events.append(Message)
+        return Response
+
+    def Poll(self):
+        # pushed updates received so far, does not block
+        self.Events += self.ReadMessages(0)
+        Events = self.Events
+        self.Events = []
+        return Events
+
+    def Close(self):
+        try:
+            self.Socket.close()
+        except:
+            pass
@@ -0,0 +1,149 @@
+import os
+import json
+import select
+import socket
+
+from BpixStateClient import CreateSocket
+
+class BpixStateServer:
+
+    # holds the authoritative mount state of one BpixMountTool and serializes all changes from the stations
+    # every change is pushed to all connected clients as {'event': 'slots', 'layer': ..., 'slots': [[ladder, z, module], ...]}
+    def __init__(self, Tool, Address):
+        self.Tool = Tool
+        self.Address = Address
+        self.Socket = None
+        self.Clients = {}
+        self.Running = False
+
+    def Listen(self):
+        self.Socket = CreateSocket(self.Address)
+        if isinstance(self.Address, tuple):
+            self.Socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        elif os.path.exists(self.Address):
+            os.remove(self.Address)
+        self.Socket.bind(self.Address)
+        self.Socket.listen(16)
+
+    def Run(self):
+        self.Listen()
+        # all layers are held in memory, stations get them from the server instead of the files
+        self.Tool.LayersMounted.values()
+        print "serving mount state of REV %s on %r"%(self.Tool.globalConfig.get('System', 'DataRevision'), self.Address)
+        self.Running = True
+        try:
+            while self.Running:
+                self.Step(1.0)
+        finally:
+            self.Close()
+
+    def Step(self, Timeout = None):
+        readable = select.select([self.Socket] + self.Clients.keys(), [], [], Timeout)[0]
+        for Client in readable:
+            if Client is self.Socket:
+                Connection = self.Socket.accept()[0]
+                self.Clients[Connection] = ''
+                continue
+            try:
+                data = Client.recv(65536)
+            except socket.error:
+                data = ''
+            if len(data) < 1:
+                self.Disconnect(Client)
+                continue
+            self.Clients[Client] += data
+            while Client in self.Clients and '\n' in self.Clients[Client]:
+                line, self.Clients[Client] = self.Clients[Client].split('\n', 1)
+                self.HandleLine(Client, line)
+        self.Tool.FlushLog()
+
+    def Disconnect(self, Client):
+        if Client in self.Clients:
+            del self.Clients[Client]
+        try:
+            Client.close()
+        except:
+            pass
+
+    def Close(self):
+        for Client in self.Clients.keys():
+            self.Disconnect(Client)
+        if self.Socket:
+            self.Socket.close()
+            if not isinstance(self.Address, tuple) and os.path.exists(self.Address):
+                os.remove(self.Address)
+        self.Tool.CloseLog()
+
+    def Send(self, Client, Message):
+        try:
+            Client.sendall(json.dumps(Message) + '\n')
+        except socket.error:
+            self.Disconnect(Client)
+
+    def Broadcast(self, Message):
+        for Client in self.Clients.keys():
+            self.Send(Client, Message)
+
+    def HandleLine(self, Client, Line):
+        try:
+            Request = json.loads(Line)
+            Handler = {
+                'hello': self.HandleHello,
+                'mount': self.HandleMount,
+                'clear': self.HandleClear,
+                'save': self.HandleSave,
+            }[Request['op']]
+            Response = Handler(Request)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            Request = Request if isinstance(locals().get('Request'), dict) else {}
+            Response = {'ok': False, 'errors': ['bad request: %s'%e]}
+        Response['id'] = Request.get('id')
+        self.Send(Client, Response)
+
+    def GetLayer(self, LayerName):
+        if LayerName not in self.Tool.LayerNames:
+            raise ValueError("unknown layer %s"%LayerName)
+        return self.Tool.LayersMounted[LayerName]
+
+    def HandleHello(self, Request):
+        State = {}
+        for LayerName, Layer in self.Tool.LayersMounted.items():
+            State[LayerName] = {
+                'ladders': Layer.Ladders,
+                'zpositions': Layer.ZPositions,
+                'modules': [Module for LadderIndex in range(Layer.Ladders) for Module in Layer.GetLadderModules(LadderIndex)],
+            }
+        return {'ok': True, 'revision': self.Tool.globalConfig.get('System', 'DataRevision'), 'state': State}
+
+    def HandleMount(self, Request):
+        LayerName = Request['layer']
+        MountingLayer = self.GetLayer(LayerName)
+        Mounts = []
+        for LadderIndex, ZIndex, ModuleID in Request['mounts']:
+            MountingLayer.GetSlot(int(LadderIndex), int(ZIndex))
+            Mounts.append((int(LadderIndex), int(ZIndex), str(ModuleID).strip()))
+
+        Errors, Warnings = self.Tool.ValidateMounts(MountingLayer, Mounts, self.Tool.Layers[LayerName])
+        if len(Errors) > 0:
+            return {'ok': False, 'errors': Errors, 'warnings': Warnings}
+        if not self.Tool.MountModules(MountingLayer, Mounts, self.Tool.Layers[LayerName]):
+            return {'ok': False, 'errors': ['could not mount modules'], 'warnings': Warnings}
+        self.Tool.FlagUnsaved()
+        self.Broadcast({'event': 'slots', 'layer': LayerName, 'slots': [list(x) for x in Mounts]})
+        return {'ok': True, 'warnings': Warnings}
+
+    def HandleClear(self, Request):
+        LayerName = Request['layer']
+        MountingLayer = self.GetLayer(LayerName)
+        HalfLadderIndex = [int(Request['ladder']), 1 if int(Request['side']) else 0]
+        MountingLayer.GetSlot(HalfLadderIndex[0], 0)
+        if not self.Tool.ClearHalfLadderModules(LayerName, HalfLadderIndex):
+            return {'ok': False, 'errors': ['could not clear half ladder']}
+        ZPositions = range(HalfLadderIndex[1]*MountingLayer.ZPositions, (HalfLadderIndex[1]+1)*MountingLayer.ZPositions)
+        self.Broadcast({'event': 'slots', 'layer': LayerName, 'slots': [[HalfLadderIndex[0], ZIndex, ''] for ZIndex in ZPositions]})
+        return {'ok': True}
+
+    def HandleSave(self, Request):
+        if not self.Tool.SaveConfiguration(False):
+            return {'ok': False, 'errors': ['could not save configuration']}
+        return {'ok': True}
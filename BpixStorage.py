@@ -0,0 +1,127 @@
+import os
+import re
+import sqlite3
+
+class BpixStorage:
+
+    # storage locations of all modules, imported from the text file (MODULE;LOCATION per line) into a SQLite database
+    # the database is only rebuilt when the text file changed, and only opened when the first location is needed
+    LocationPattern = re.compile(r'^(.*?)\s*(\S+)\s*/\s*(\S+)$')
+
+    def __init__(self, FileName, DatabaseFileName):
+        self.FileName = FileName
+        self.DatabaseFileName = DatabaseFileName
+        self.Connection = None
+        # has to be increased whenever the database schema changes
+        self.Version = 1
+
+    def ParseLocation(self, Location):
+        # 'BOX-3 T012 / 3' -> ('BOX-3', 'T012', '3'), locations without tray/slot only have a container
+        match = self.LocationPattern.match(Location)
+        if match and len(match.group(1)) > 0:
+            return match.group(1), match.group(2), match.group(3)
+        return Location, '', ''
+
+    def GetNumber(self, Text):
+        # number contained in a tray or slot name, so T5 is sorted before T12
+        digits = re.search(r'\d+', Text)
+        return int(digits.group(0)) if digits else -1
+
+    def GetSignature(self):
+        if os.path.isfile(self.FileName):
+            fileStat = os.stat(self.FileName)
+            return "%r;%d"%(fileStat.st_mtime, fileStat.st_size)
+        return ''
+
+    def Open(self):
+        if self.Connection:
+            return self.Connection
+        directory = os.path.dirname(self.DatabaseFileName)
+        if len(directory) > 0 and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.Connection = sqlite3.connect(self.DatabaseFileName)
+        self.Connection.text_factory = str
+        self.Connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (Key TEXT PRIMARY KEY, Value TEXT);
+            CREATE TABLE IF NOT EXISTS locations (
+                ModuleID TEXT PRIMARY KEY,
+                Location TEXT,
+                Container TEXT COLLATE NOCASE,
+                Tray TEXT COLLATE NOCASE,
+                TrayNumber INTEGER,
+                Slot TEXT,
+                SlotNumber INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS locations_container ON locations (Container, TrayNumber, Tray, SlotNumber);
+            CREATE INDEX IF NOT EXISTS locations_tray ON locations (Tray);
+        """)
+        meta = dict(self.Connection.execute("SELECT Key, Value FROM meta").fetchall())
+        if meta.get('version') != str(self.Version) or meta.get('source') != self.GetSignature():
+            self.Import()
+        return self.Connection
+
+    def Close(self):
+        if self.Connection:
+            self.Connection.close()
+            self.Connection = None
+
+    def ReadLocations(self, FileName):
+        # yields (ModuleID, Location) from the text format, separators ; , or tab
+        with open(FileName, 'r') as storageLocationFile:
+            for line in storageLocationFile:
+                lineParts = line.strip().replace(',',';').replace('\t',';').split(';')
+                if len(lineParts) > 1:
+                    yield lineParts[0], lineParts[1].strip()
+
+    def Import(self):
+        # bulk import: replaces the database content with the locations from the text file, returns the number of modules
+        Locations = self.ReadLocations(self.FileName) if os.path.isfile(self.FileName) else []
+        Rows = []
+        for ModuleID, Location in Locations:
+            Container, Tray, Slot = self.ParseLocation(Location)
+            Rows.append((ModuleID, Location, Container, Tray, self.GetNumber(Tray), Slot, self.GetNumber(Slot)))
+
+        with self.Connection:
+            self.Connection.execute("DELETE FROM locations")
+            self.Connection.executemany("INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?, ?, ?, ?)", Rows)
+            self.Connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(self.Version),))
+            self.Connection.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (self.GetSignature(),))
+        return len(Rows)
+
+    def GetLocation(self, ModuleID):
+        # None if the module is not in the storage list
+        row = self.Open().execute("SELECT Location FROM locations WHERE ModuleID = ?", (ModuleID,)).fetchone()
+        return row[0] if row else None
+
+    def GetLocations(self, ModuleIDs):
+        # {ModuleID: (Location, Container, Tray, Slot)} for all given modules which are in the storage list
+        Connection = self.Open()
+        ModuleIDs = list(set(ModuleIDs))
+        Locations = {}
+        # SQLite allows at most 999 parameters per statement
+        for i in range(0, len(ModuleIDs), 900):
+            chunk = ModuleIDs[i:i+900]
+            query = "SELECT ModuleID, Location, Container, Tray, Slot FROM locations WHERE ModuleID IN (%s)"%(','.join(['?']*len(chunk)))
+            for row in Connection.execute(query, chunk):
+                Locations[row[0]] = row[1:]
+        return Locations
+
+    def GetAllLocations(self):
+        # {ModuleID: (Location, Container, Tray, Slot)} of all modules in the storage list
+        return dict((row[0], row[1:]) for row in self.Open().execute("SELECT ModuleID, Location, Container, Tray, Slot FROM locations"))
+
+    def FindModules(self, Container = None, Tray = None):
+        # [(ModuleID, Location)] of all modules in a container and/or tray, in tray order, names are case insensitive
+        conditions = []
+        parameters = []
+        if Container:
+            conditions.append("Container = ?")
+            parameters.append(Container)
+        if Tray:
+            conditions.append("Tray = ?")
+            parameters.append(Tray)
+        query = "SELECT ModuleID, Location FROM locations"
+        if len(conditions) > 0:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY Container, TrayNumber, Tray, SlotNumber, Slot, ModuleID"
+        return self.Open().execute(query, parameters).fetchall()
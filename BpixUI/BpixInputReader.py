@@ -0,0 +1,130 @@
+import sys
+import os
+import select
+import atexit
+from collections import deque
+
+try:
+    import termios
+except:
+    termios = None
+
+class BpixInputReader:
+
+    def __init__(self):
+        # bytes read from the terminal but not yet consumed, scanner bursts end up here while a menu is redrawn
+        self.Buffer = deque()
+        self.FileDescriptor = None
+        self.OldAttributes = None
+        # time to wait for the rest of an escape sequence after ESC
+        self.EscapeTimeout = 0.05
+        self.EscapeSequences = {
+            '[A': '^', 'OA': '^',
+            '[B': 'V', 'OB': 'V',
+            '[C': '>', 'OC': '>',
+            '[D': '<', 'OD': '<',
+        }
+
+    def IsInteractive(self):
+        try:
+            return termios is not None and sys.stdin.isatty()
+        except:
+            return False
+
+    def Start(self):
+        # terminal stays in non-canonical mode without echo until the program exits
+        # output processing and signals (ctrl+c) are kept, so print still works as usual
+        if self.OldAttributes is not None:
+            return
+        self.FileDescriptor = sys.stdin.fileno()
+        self.OldAttributes = termios.tcgetattr(self.FileDescriptor)
+        newAttributes = termios.tcgetattr(self.FileDescriptor)
+        newAttributes[0] &= ~(termios.ICRNL | termios.IXON)
+        newAttributes[3] &= ~(termios.ICANON | termios.ECHO)
+        newAttributes[6][termios.VMIN] = 1
+        newAttributes[6][termios.VTIME] = 0
+        termios.tcsetattr(self.FileDescriptor, termios.TCSADRAIN, newAttributes)
+        atexit.register(self.Stop)
+
+    def Stop(self):
+        if self.OldAttributes is not None:
+            try:
+                termios.tcsetattr(self.FileDescriptor, termios.TCSADRAIN, self.OldAttributes)
+            except:
+                pass
+            self.OldAttributes = None
+
+    def Fill(self, Timeout = None):
+        # reads everything available at once, returns False on timeout
+        ready = select.select([self.FileDescriptor], [], [], Timeout)[0]
+        if len(ready) < 1:
+            return False
+        data = os.read(self.FileDescriptor, 4096)
+        if len(data) < 1:
+            raise EOFError
+        self.Buffer.extend(data)
+        return True
+
+    def ReadByte(self, Timeout = None):
+        while len(self.Buffer) < 1:
+            if not self.Fill(Timeout):
+                return None
+        return self.Buffer.popleft()
+
+    def ReadToken(self):
+        # returns (key, isSpecial), arrow keys are returned as ^ V < > with isSpecial set
+        # return and newline (also as pair) are both returned as '\r'
+        k1 = self.ReadByte()
+        if k1 == '\x1b':
+            k2 = self.ReadByte(self.EscapeTimeout)
+            if k2 is None:
+                return k1, True
+            if k2 not in '[O':
+                self.Buffer.appendleft(k2)
+                return k1, True
+            sequence = k2
+            while True:
+                k3 = self.ReadByte(self.EscapeTimeout)
+                if k3 is None:
+                    break
+                sequence += k3
+                if '@' <= k3 <= '~':
+                    break
+            return self.EscapeSequences.get(sequence, k1), True
+        elif k1 in '\r\n':
+            if k1 == '\r' and len(self.Buffer) > 0 and self.Buffer[0] == '\n':
+                self.Buffer.popleft()
+            return '\r', False
+        return k1, False
+
+    def ReadKey(self):
+        if not self.IsInteractive():
+            k1 = sys.stdin.read(1)
+            if len(k1) < 1:
+                raise EOFError
+            return '\r' if k1 == '\n' else k1
+        self.Start()
+        return self.ReadToken()[0]
+
+    def ReadLine(self):
+        # line input with echo, replaces raw_input() while the terminal is in non-canonical mode
+        if not self.IsInteractive():
+            return raw_input()
+        self.Start()
+        line = []
+        while True:
+            key, isSpecial = self.ReadToken()
+            if isSpecial:
+                continue
+            if key == '\r':
+                sys.stdout.write('\n')
+                sys.stdout.flush()
+                return ''.join(line)
+            elif key in '\x7f\x08':
+                if len(line) > 0:
+                    line.pop()
+                    sys.stdout.write('\b \b')
+            elif ord(key) >= 32:
+                line.append(key)
+                sys.stdout.write(key)
+            sys.stdout.flush()
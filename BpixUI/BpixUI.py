@@ -1,11 +1,11 @@
 import sys
 import os
+import re
 
-try:
-    import termios
-    import tty
-except:
-    pass
+from BpixInputReader import BpixInputReader
+
+# one reader for the whole session, keys typed while the screen is redrawn stay buffered
+InputReader = BpixInputReader()
 
 try:
     from msvcrt import getch as getch_windows
@@ -24,27 +24,17 @@ try:
             return k1
         else:
             return char
+
+    def readline():
+        return raw_input()
 except ImportError:
     def getch():
-        fd = sys.stdin.fileno()
-        old = termios.tcgetattr(fd)
-        try:
-            tty.setraw(fd)
-            k1 = sys.stdin.read(1)
-            if ord(k1) == 27:
-                k1 = sys.stdin.read(1)
-                k1 = sys.stdin.read(1)
-                if k1 == 'A':
-                    k1 = '^'
-                elif k1 == 'B':
-                    k1 = 'V'
-                elif k1 == 'C':
-                    k1 = '>'
-                elif k1 == 'D':
-                    k1 = '<'
-            return k1
-        finally:
-            termios.tcsetattr(fd, termios.TCSADRAIN, old)
+        return InputReader.ReadKey()
+
+    def readline():
+        return InputReader.ReadLine()
+
+EscapeSequencePattern = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
 
 class BPixUi:
 
@@ -54,6 +44,9 @@ class BPixUi:
     def UseColors(self, useColors = True):
         self.UseColors = useColors
 
+    def ReadLine(self):
+        return readline()
+
     def Clear(self):
         try:
             if os.name == 'nt':
@@ -134,54 +127,58 @@ class BPixUi:
                         if ans == answer[1][p1+1].lower():
                             return answer[0]
 
-    def AskUser2D(self, question, answers, DisplayWidth=80, HeaderColumn = []):
-        Selection=[0,0]
-        First = True
-        if len(question) > 0:
-            print "+%s+"%('-'*(DisplayWidth-2))
-            print "|  %s|"%question.ljust((DisplayWidth-4))
-            print "+%s+"%('-'*(DisplayWidth-2))
-        while True:
-            #os.system('clear')
-            AnswerIndex = 0
-
-            if not First:
-                for answer in answers:
-                    sys.stdout.write("\033[F")
-                if len(question) > 0:
-                    sys.stdout.write("\033[F")
-
-            First = False
-
-            AnswerIndexRow = 0
-            for answerLine in answers:
-                answerLineString = ''
-                AnswerIndexColumn = 0
-                for answer in answerLine:
-
-                    AnswerFormatted = answer.replace('\n','')
-
-                    if Selection == [AnswerIndexRow, AnswerIndexColumn]:
-                        if self.UseColors:
-                            AnswerFormatted = "  \x1b[42m{answer}\x1b[47m\x1b[0m ".format(answer=AnswerFormatted)
-                        else:
-                            AnswerFormatted = " [{answer}]".format(answer=AnswerFormatted)
-                    else:
-                        AnswerFormatted = "  {answer} ".format(answer=AnswerFormatted)
-
-                    answerLineString += AnswerFormatted + ' '
+    def GetVisibleLength(self, text):
+        return len(EscapeSequencePattern.sub('', text))
 
-                    AnswerIndexColumn += 1
-                if AnswerIndexRow < len(HeaderColumn):
-                    answerLineString = HeaderColumn[AnswerIndexRow] + ' ' + answerLineString
+    def FormatCell2D(self, answer, selected):
+        AnswerFormatted = answer.replace('\n','')
+        if selected:
+            if self.UseColors:
+                return "  \x1b[42m{answer}\x1b[47m\x1b[0m  ".format(answer=AnswerFormatted)
+            else:
+                return " [{answer}] ".format(answer=AnswerFormatted)
+        else:
+            return "  {answer}  ".format(answer=AnswerFormatted)
 
-                print answerLineString
-                AnswerIndexRow += 1
+    def AskUser2D(self, question, answers, DisplayWidth=80, HeaderColumn = []):
+        Selection=[0,0]
 
-            if len(question) > 0:
-                print "+%s+" % ('-' * (DisplayWidth-2))
+        # full frame is written once, afterwards only the cells of the old and new selection are rewritten
+        # cells have the same visible width whether selected or not, so their columns never move
+        CellColumns = []
+        frameLines = []
+        if len(question) > 0:
+            frameLines.append("+%s+"%('-'*(DisplayWidth-2)))
+            frameLines.append("|  %s|"%question.ljust((DisplayWidth-4)))
+            frameLines.append("+%s+"%('-'*(DisplayWidth-2)))
+        AnswerIndexRow = 0
+        for answerLine in answers:
+            answerLineString = ''
+            if AnswerIndexRow < len(HeaderColumn):
+                answerLineString = HeaderColumn[AnswerIndexRow] + ' '
+            Column = self.GetVisibleLength(answerLineString)
+            RowColumns = []
+            AnswerIndexColumn = 0
+            for answer in answerLine:
+                AnswerFormatted = self.FormatCell2D(answer, Selection == [AnswerIndexRow, AnswerIndexColumn])
+                RowColumns.append(Column)
+                Column += self.GetVisibleLength(AnswerFormatted)
+                answerLineString += AnswerFormatted
+                AnswerIndexColumn += 1
+            CellColumns.append(RowColumns)
+            frameLines.append(answerLineString)
+            AnswerIndexRow += 1
+        # number of lines between the last answer row and the cursor position below the frame
+        LinesBelow = 1
+        if len(question) > 0:
+            frameLines.append("+%s+" % ('-' * (DisplayWidth-2)))
+            LinesBelow += 1
+        sys.stdout.write('\n'.join(frameLines) + '\n')
+        sys.stdout.flush()
 
+        while True:
             ans = getch()
+            OldSelection = list(Selection)
             if ans == '^':
                 if Selection[0] > 0:
                     Selection[0] -= 1
@@ -200,3 +197,16 @@ class BPixUi:
                     Selection[1] += 1
             elif ord(ans) == 13:
                 return Selection
+
+            if Selection != OldSelection:
+                updates = []
+                for Row, Column, Selected in [OldSelection + [False], Selection + [True]]:
+                    if Column < len(answers[Row]):
+                        LinesUp = len(answers) - 1 - Row + LinesBelow
+                        updates.append("\033[%dA\r" % LinesUp)
+                        if CellColumns[Row][Column] > 0:
+                            updates.append("\033[%dC" % CellColumns[Row][Column])
+                        updates.append(self.FormatCell2D(answers[Row][Column], Selected))
+                        updates.append("\033[%dB\r" % LinesUp)
+                sys.stdout.write(''.join(updates))
+                sys.stdout.flush()
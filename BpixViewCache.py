@@ -0,0 +1,34 @@
+class BpixViewCache:
+
+    def __init__(self):
+        # (LayerName, ViewKind, FillDirection, DisplayWidth) -> {'header': ..., 'rows': one entry per ladder}
+        # a row is None as long as it has to be (re)built
+        self.Models = {}
+
+    def Clear(self):
+        self.Models = {}
+
+    def GetModel(self, Key, HeaderBuilder, RowBuilder, Ladders):
+        Model = self.Models.get(Key)
+        if Model is None or len(Model['rows']) != Ladders:
+            Model = {'header': HeaderBuilder(), 'rows': [None]*Ladders}
+            self.Models[Key] = Model
+        Rows = Model['rows']
+        for LadderIndex in range(Ladders):
+            if Rows[LadderIndex] is None:
+                Rows[LadderIndex] = RowBuilder(LadderIndex)
+        return Model
+
+    def InvalidateSlots(self, LayerName, Slots):
+        # Slots: list of (LadderIndex, ZIndex) which have been changed, all views of the layer show whole ladders per row
+        LadderIndices = set([LadderIndex for LadderIndex, ZIndex in Slots])
+        for Key, Model in self.Models.items():
+            if Key[0] == LayerName:
+                for LadderIndex in LadderIndices:
+                    if 0 <= LadderIndex < len(Model['rows']):
+                        Model['rows'][LadderIndex] = None
+
+    def InvalidateLayer(self, LayerName):
+        for Key in self.Models.keys():
+            if Key[0] == LayerName:
+                del self.Models[Key]
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# checks and solves hub IDs of synthetic layers with random sectors of 1-3 ladders
+# usage: python benchmarks/BenchmarkHubIDs.py [Ladders] [ZPositions] [Layers]
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from BpixLayer import BpixLayer
+from BpixHubIDs import BpixHubIDs
+
+
+def CreateSyntheticLayer(LayerName, Ladders, ZPositions, Tbms):
+    random.seed(LayerName)
+    Layer = BpixLayer(LayerName, Ladders, ZPositions, Tbms)
+    for LadderIndex in range(Ladders):
+        for ZIndex in range(2*ZPositions):
+            HubID = random.randint(0, 15)*2 + 1
+            Layer.SetHubIDTuple(LadderIndex, ZIndex, [HubID, HubID - 1] if Tbms == 2 else [random.randint(0, 31)])
+    Sectors = {}
+    LadderIndex = 0
+    while LadderIndex < Ladders:
+        size = random.randint(1, 3)
+        Sectors[len(Sectors) + 1] = range(LadderIndex + 1, min(LadderIndex + size, Ladders) + 1)
+        LadderIndex += size
+    return Layer, Sectors
+
+
+def Main():
+    Ladders = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ZPositions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    LayerCount = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    HubIDs = BpixHubIDs()
+    Layers = [('LAYER%d'%(i+1),) + CreateSyntheticLayer('LAYER%d'%(i+1), Ladders, ZPositions, 2 if i < 2 else 1) for i in range(LayerCount)]
+    print "detector: %d layers x %d ladders x %d z-positions = %d slots"%(LayerCount, Ladders, 2*ZPositions, LayerCount*Ladders*2*ZPositions)
+
+    startTime = time.time()
+    Issues = sum([len(HubIDs.Validate(LayerName, Layer, Sectors)) for LayerName, Layer, Sectors in Layers])
+    validateTime = time.time() - startTime
+
+    startTime = time.time()
+    Changed = 0
+    Unsolvable = 0
+    for LayerName, Layer, Sectors in Layers:
+        layerChanged, layerIssues = HubIDs.Solve(LayerName, Layer, Sectors)
+        Changed += len(layerChanged)
+        Unsolvable += len(layerIssues)
+    solveTime = time.time() - startTime
+
+    startTime = time.time()
+    for LayerName, Layer, Sectors in Layers:
+        HubIDs.Solve(LayerName, Layer, Sectors, KeepValid=False)
+    solveAllTime = time.time() - startTime
+
+    Remaining = sum([len(HubIDs.Validate(LayerName, Layer, Sectors)) for LayerName, Layer, Sectors in Layers])
+
+    print "validate:            %8.3f s, %d issues"%(validateTime, Issues)
+    print "solve (keep valid):  %8.3f s, %d slots changed, %d unsolvable"%(solveTime, Changed, Unsolvable)
+    print "solve (reassign):    %8.3f s"%solveAllTime
+    print "issues after solve:  %d"%Remaining
+
+
+if __name__ == '__main__':
+    Main()
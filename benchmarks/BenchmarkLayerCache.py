@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# compares parsing layer text files with loading the binary layer cache on a synthetic detector
+# usage: python benchmarks/BenchmarkLayerCache.py [Ladders] [ZPositions] [Layers]
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from BpixLayer import BpixLayer
+from BpixLayerCache import BpixLayerCache
+
+
+def WriteSyntheticLayer(Directory, LayerName, Ladders, ZPositions):
+    random.seed(LayerName)
+    fileNames = []
+    for fileName in ['plan_%s.txt'%LayerName, 'mount_%s.txt'%LayerName]:
+        with open(Directory + fileName, 'w') as layerFile:
+            for i in range(Ladders):
+                layerFile.write(';'.join(['M%d'%random.randint(1000, 9999) if random.random() > 0.2 else '' for z in range(2*ZPositions)]) + '\n')
+        fileNames.append(Directory + fileName)
+    with open(Directory + 'hubids_%s.txt'%LayerName, 'w') as hubIDsFile:
+        for i in range(Ladders):
+            hubIDsFile.write(';'.join(['%d'%random.randint(0, 31) for z in range(2*ZPositions)]) + '\n')
+    fileNames.append(Directory + 'hubids_%s.txt'%LayerName)
+    return fileNames
+
+
+def ParseLayer(LayerName, Ladders, ZPositions, FileNames):
+    Layer = BpixLayer(LayerName, Ladders, ZPositions)
+    LayerMounted = BpixLayer(LayerName, Ladders, ZPositions)
+    Layer.LoadFromFile(FileNames[0])
+    LayerMounted.LoadFromFile(FileNames[1])
+    Layer.LoadHubIDsFromFile(FileNames[2])
+    LayerMounted.LoadHubIDsFromFile(FileNames[2])
+    return Layer, LayerMounted
+
+
+def Main():
+    Ladders = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    ZPositions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    LayerCount = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    Directory = tempfile.mkdtemp() + '/'
+    try:
+        LayerFiles = {}
+        for i in range(LayerCount):
+            LayerName = 'LAYER%d'%(i+1)
+            LayerFiles[LayerName] = WriteSyntheticLayer(Directory, LayerName, Ladders, ZPositions)
+        Cache = BpixLayerCache(Directory + '.cache/')
+
+        print "detector: %d layers x %d ladders x %d z-positions = %d slots"%(LayerCount, Ladders, 2*ZPositions, LayerCount*Ladders*2*ZPositions)
+
+        startTime = time.time()
+        for LayerName, FileNames in sorted(LayerFiles.items()):
+            Layer, LayerMounted = ParseLayer(LayerName, Ladders, ZPositions, FileNames)
+        parseTime = time.time() - startTime
+
+        startTime = time.time()
+        for LayerName, FileNames in sorted(LayerFiles.items()):
+            Layer, LayerMounted = ParseLayer(LayerName, Ladders, ZPositions, FileNames)
+            Cache.Save(LayerName, FileNames, {'plan': Layer.GetState(), 'mounted': LayerMounted.GetState(), 'sectors': None})
+        buildTime = time.time() - startTime
+
+        startTime = time.time()
+        for LayerName, FileNames in sorted(LayerFiles.items()):
+            Layer = BpixLayer(LayerName, Ladders, ZPositions)
+            LayerMounted = BpixLayer(LayerName, Ladders, ZPositions)
+            State = Cache.Load(LayerName, FileNames)
+            Layer.SetState(State['plan'])
+            LayerMounted.SetState(State['mounted'])
+        loadTime = time.time() - startTime
+
+        print "cold parse:       %8.3f s"%parseTime
+        print "parse + cache:    %8.3f s"%buildTime
+        print "cache load:       %8.3f s (x%.1f)"%(loadTime, parseTime/loadTime if loadTime > 0 else 0)
+    finally:
+        shutil.rmtree(Directory)
+
+
+if __name__ == '__main__':
+    Main()
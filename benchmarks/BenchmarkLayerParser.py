@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# throughput of the layer file parser on multi-MB synthetic plan and hub ID files, compared to the previous split/replace loader
+# usage: python benchmarks/BenchmarkLayerParser.py [Ladders] [ZPositions] [Errors]
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from BpixLayer import BpixLayer
+from BpixLayerFileParser import FormatDiagnostic
+
+
+def WriteSyntheticFiles(Directory, Ladders, ZPositions, Tbms, Errors = 0):
+    random.seed(Ladders)
+    planLines = [['M%d'%random.randint(1000, 9999) if random.random() > 0.2 else '' for z in range(2*ZPositions)] for i in range(Ladders)]
+    hubIDLines = [['/'.join(['%d'%random.randint(0, 31) for t in range(Tbms)]) for z in range(2*ZPositions)] for i in range(Ladders)]
+    # every error in a different line, so each of them has to be reported
+    for LadderIndex in random.sample(range(Ladders), Errors):
+        ZIndex = random.randint(0, 2*ZPositions - 1)
+        if LadderIndex % 3 == 0:
+            planLines[LadderIndex][ZIndex] = 'X%d'%LadderIndex
+        elif LadderIndex % 3 == 1:
+            hubIDLines[LadderIndex][ZIndex] = 'x'
+        else:
+            planLines[LadderIndex].append('')
+    fileNames = []
+    for fileName, lines in [('plan.txt', planLines), ('hubids.txt', hubIDLines)]:
+        with open(Directory + fileName, 'w') as layerFile:
+            layerFile.write(''.join([';'.join(x) + '\n' for x in lines]))
+        fileNames.append(Directory + fileName)
+    return fileNames
+
+
+def LoadPrevious(Layer, FileNames):
+    # loader before the parser was introduced, without the printing of bad lines
+    with open(FileNames[0], 'r') as layerPlanFile:
+        LadderIndex = 0
+        for line in layerPlanFile:
+            modules = [x.split(' ')[0].replace(' ','').replace('\n','').replace('\r','') for x in line.replace('\t',';').split(';')]
+            if len(modules) == Layer.ZPositions*2:
+                Layer.SetLadderModules(LadderIndex, modules)
+            LadderIndex += 1
+    with open(FileNames[1], 'r') as hubIDsFile:
+        LadderIndex = 0
+        for line in hubIDsFile:
+            hubIDs = [x.split(' ')[0].replace(' ','').replace('\n','').replace('\r','') for x in line.replace('\t',';').split(';')]
+            if len(hubIDs) == Layer.ZPositions*2:
+                Slot = Layer.GetSlot(LadderIndex, 0)
+                Layer.HubIDArray[Slot*Layer.Tbms:(Slot + Layer.ZPositions*2)*Layer.Tbms] = array('b', [hubID for x in hubIDs for hubID in ([int(y) for y in x.split('/')] + [-1]*Layer.Tbms)[:Layer.Tbms]])
+            LadderIndex += 1
+
+
+def LoadParser(Layer, FileNames):
+    Diagnostics = []
+    Layer.LoadFromFile(FileNames[0], Diagnostics)
+    Layer.LoadHubIDsFromFile(FileNames[1], Diagnostics)
+    return Diagnostics
+
+
+def Main():
+    Ladders = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ZPositions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    Errors = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+    Directory = tempfile.mkdtemp() + '/'
+    try:
+        for Tbms in [1, 2]:
+            FileNames = WriteSyntheticFiles(Directory, Ladders, ZPositions, Tbms)
+            MBytes = sum([os.path.getsize(x) for x in FileNames]) / 1e6
+            print "%d ladders x %d z-positions, %d TBMs: %.1f MB"%(Ladders, 2*ZPositions, Tbms, MBytes)
+
+            Layer = BpixLayer('LAYER', Ladders, ZPositions, Tbms)
+            startTime = time.time()
+            LoadPrevious(Layer, FileNames)
+            previousTime = time.time() - startTime
+
+            ParsedLayer = BpixLayer('LAYER', Ladders, ZPositions, Tbms)
+            startTime = time.time()
+            Diagnostics = LoadParser(ParsedLayer, FileNames)
+            parserTime = time.time() - startTime
+
+            print "  previous loader: %8.3f s, %6.1f MB/s"%(previousTime, MBytes / previousTime)
+            print "  parser:          %8.3f s, %6.1f MB/s, %d diagnostics"%(parserTime, MBytes / parserTime, len(Diagnostics))
+            print "  same result:     %s"%(Layer.ModuleCodes == ParsedLayer.ModuleCodes and Layer.HubIDArray == ParsedLayer.HubIDArray)
+
+        FileNames = WriteSyntheticFiles(Directory, Ladders, ZPositions, 1, Errors)
+        Layer = BpixLayer('LAYER', Ladders, ZPositions)
+        startTime = time.time()
+        Diagnostics = LoadParser(Layer, FileNames)
+        parserTime = time.time() - startTime
+        print "%d injected errors: %8.3f s, %d diagnostics"%(Errors, parserTime, len(Diagnostics))
+        for Diagnostic in Diagnostics[:3]:
+            print "  " + FormatDiagnostic(Diagnostic)
+    finally:
+        shutil.rmtree(Directory)
+
+
+if __name__ == '__main__':
+    Main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# plans synthetic layers from a graded module list, then re-plans them after random module failures
+# usage: python benchmarks/BenchmarkPlanner.py [Ladders] [ZPositions] [Containers] [Failures]
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from BpixLayer import BpixLayer
+from BpixStorage import BpixStorage
+from BpixPlanner import BpixPlanner
+
+
+def CreateModules(Count, Containers):
+    random.seed(Count)
+    Modules = []
+    for i in range(Count):
+        Location = "BOX-%d T%03d / %d"%(random.randint(1, Containers), random.randint(1, 20), random.randint(1, 6))
+        Modules.append(('M%d'%(10000 + i), random.choice('AAABBC'), Location))
+    return Modules
+
+
+def GetStatistics(Planner, Layer, Modules):
+    # (number of different containers per half ladder on average, True if no ring has a better grade than an inner one)
+    Info = dict((x[0], (Planner.GetGradeKey(x[1]), Planner.ParseLocation(x[2])[0])) for x in Modules)
+    Containers = []
+    RingGrades = [[] for Ring in range(Layer.ZPositions)]
+    for LadderIndex in range(Layer.Ladders):
+        for Side in [0, 1]:
+            HalfLadderModules = [Layer.GetModule(LadderIndex, ZIndex) for ZIndex in range(Side*Layer.ZPositions, (Side+1)*Layer.ZPositions)]
+            Containers.append(len(set([Info[x][1] for x in HalfLadderModules if x in Info])))
+            for ZIndex in range(Side*Layer.ZPositions, (Side+1)*Layer.ZPositions):
+                if Layer.GetModule(LadderIndex, ZIndex) in Info:
+                    RingGrades[Planner.GetRing(Layer, ZIndex)].append(Info[Layer.GetModule(LadderIndex, ZIndex)][0])
+    Ordered = all([max(RingGrades[Ring]) <= min(RingGrades[Ring + 1]) for Ring in range(Layer.ZPositions - 1) if len(RingGrades[Ring]) > 0 and len(RingGrades[Ring + 1]) > 0])
+    return sum(Containers) / float(len(Containers)), Ordered
+
+
+def Main():
+    Ladders = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    ZPositions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    ContainerCount = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    Failures = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+
+    Slots = Ladders*2*ZPositions
+    Modules = CreateModules(int(Slots*1.2), ContainerCount)
+    # only the location parsing of the storage is used, no database is opened
+    Planner = BpixPlanner(BpixStorage('', ''))
+    print "layer: %d ladders x %d z-positions = %d slots, %d graded modules in %d containers"%(Ladders, 2*ZPositions, Slots, len(Modules), ContainerCount)
+
+    Layer = BpixLayer('LAYER', Ladders, ZPositions)
+    startTime = time.time()
+    Assigned, Unfilled = Planner.Plan(Layer, Modules)
+    planTime = time.time() - startTime
+    Containers, Ordered = GetStatistics(Planner, Layer, Modules)
+    print "plan:    %8.3f s, %d assigned, %d empty, %.2f containers per half ladder, grades ordered by z: %s"%(planTime, len(Assigned), len(Unfilled), Containers, Ordered)
+
+    # failed modules are dropped from the list and their slots planned again, the rest of the plan is kept
+    Failed = set(random.sample([x[2] for x in Assigned], min(Failures, len(Assigned))))
+    for LadderIndex, ZIndex, ModuleID in Assigned:
+        if ModuleID in Failed:
+            Layer.SetModule(LadderIndex, ZIndex, '')
+    startTime = time.time()
+    Replaced, Unfilled = Planner.Plan(Layer, [x for x in Modules if x[0] not in Failed])
+    replanTime = time.time() - startTime
+    print "re-plan: %8.3f s, %d failed modules replaced, %d empty"%(replanTime, len(Replaced), len(Unfilled))
+
+
+if __name__ == '__main__':
+    Main()
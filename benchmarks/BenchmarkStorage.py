@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# compares parsing storage_locations.txt into a dict at every start with the storage database
+# usage: python benchmarks/BenchmarkStorage.py [Modules] [Lookups]
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from BpixStorage import BpixStorage
+
+
+def WriteSyntheticStorage(FileName, Modules):
+    random.seed(Modules)
+    Containers = ['BOX-%d'%i for i in range(1, 20)] + ['Cabinet', 'UTZ-Box', 'Storage Box']
+    with open(FileName, 'w') as storageFile:
+        for i in range(Modules):
+            storageFile.write("M%d;%s T%03d / %d\n"%(10000 + i, random.choice(Containers), random.randint(1, 200), random.randint(1, 6)))
+
+
+def ParseDict(FileName):
+    StorageLocations = {}
+    with open(FileName, 'r') as storageLocationFile:
+        for line in storageLocationFile:
+            lineParts = line.strip().replace(',',';').replace('\t',';').split(';')
+            if len(lineParts) > 1:
+                StorageLocations[lineParts[0]] = lineParts[1].strip()
+    return StorageLocations
+
+
+def Main():
+    Modules = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    Lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    Directory = tempfile.mkdtemp() + '/'
+    try:
+        FileName = Directory + 'storage_locations.txt'
+        WriteSyntheticStorage(FileName, Modules)
+        ModuleIDs = ['M%d'%(10000 + random.randint(0, Modules - 1)) for i in range(Lookups)]
+        print "storage list: %d modules, %d lookups per start"%(Modules, Lookups)
+
+        startTime = time.time()
+        StorageLocations = ParseDict(FileName)
+        for ModuleID in ModuleIDs:
+            StorageLocations.get(ModuleID)
+        dictTime = time.time() - startTime
+
+        startTime = time.time()
+        Storage = BpixStorage(FileName, Directory + '.cache/storage_locations.db')
+        Storage.Open()
+        Storage.Close()
+        importTime = time.time() - startTime
+
+        startTime = time.time()
+        Storage = BpixStorage(FileName, Directory + '.cache/storage_locations.db')
+        for ModuleID in ModuleIDs:
+            Storage.GetLocation(ModuleID)
+        Storage.Close()
+        startupTime = time.time() - startTime
+
+        startTime = time.time()
+        Storage = BpixStorage(FileName, Directory + '.cache/storage_locations.db')
+        for i in range(Lookups):
+            Storage.FindModules('BOX-3', 'T%03d'%random.randint(1, 200))
+        Storage.Close()
+        reverseTime = time.time() - startTime
+
+        print "dict parse + lookups:       %8.3f s"%dictTime
+        print "database import (once):     %8.3f s"%importTime
+        print "database start + lookups:   %8.3f s (x%.1f)"%(startupTime, dictTime/startupTime if startupTime > 0 else 0)
+        print "reverse queries (box/tray): %8.3f s"%reverseTime
+    finally:
+        shutil.rmtree(Directory)
+
+
+if __name__ == '__main__':
+    Main()
@@ -3,12 +3,32 @@
 import os
 import sys
 import ConfigParser
-import shutil
 import glob
-import datetime
 import traceback
+import atexit
+import datetime
+from array import array
 
 from BpixLayer import BpixLayer
+from BpixLayerFileParser import FormatDiagnostic
+from BpixModuleIndex import BpixModuleIndex
+from BpixJournal import BpixJournal
+from BpixRevisionStore import BpixRevisionStore
+from BpixLog import BpixLog
+from BpixLazyLayers import BpixLazyLayers
+from BpixRevisionData import BpixRevisionData
+from BpixRevisionDiff import BpixRevisionDiff
+from BpixConformance import BpixConformance
+from BpixViewCache import BpixViewCache
+from BpixFileLock import BpixFileLock
+from BpixLayerVersions import BpixLayerVersions
+from BpixStateClient import BpixStateClient, ParseAddress
+from BpixStorage import BpixStorage
+from BpixPickList import BpixPickList
+from BpixPlanner import BpixPlanner
+from BpixSpareModules import BpixSpareModules
+from BpixHubIDs import BpixHubIDs
+from BpixSectorIndex import BpixSectorIndex
 import BpixUI.BpixUI
 from BpixUI.BpixUI import *
 
@@ -19,10 +39,31 @@ class BpixMountTool():
         self.globalConfig = ConfigParser.ConfigParser()
         self.globalConfig.read('config.ini')
         self.dataDirectoryBase = 'data/'
+        self.RevisionStore = BpixRevisionStore(self.dataDirectoryBase)
+        # several stations can work on the same data directory, saves and new revisions are serialized
+        self.DataLock = BpixFileLock(self.dataDirectoryBase + '.lock')
+        # optional connection to a mount-state server (see BpixStateServer.py), mounts then go through the server
+        self.StateClient = None
+        self.ServerSnapshot = {}
         self.FillDirection = self.globalConfig.get('System', 'fill')
         self.revisionTag = ''
         self.Autosave = False
 
+        # with autosave, mount file snapshots are only rewritten every N journaled changes
+        try:
+            self.JournalCompactInterval = int(self.globalConfig.get('System', 'JournalCompact'))
+        except:
+            self.JournalCompactInterval = 100
+
+        # log files are rotated when they grow beyond this size in bytes
+        try:
+            self.LogMaxSize = int(self.globalConfig.get('System', 'LogMaxSize'))
+        except:
+            self.LogMaxSize = 10*1024*1024
+        self.LogWriter = None
+        atexit.register(self.CloseLog)
+        atexit.register(self.CloseJournal)
+
         useColors = False
         try:
             useColors = (int(self.globalConfig.get('System','colors')) > 0)
@@ -37,7 +78,10 @@ class BpixMountTool():
             self.DisplayWidth = 80
 
         self.UnsavedChanges = False
-        self.StorageLocations = {}
+        # set by JournalModuleChanges when the last change was written to the mount journal
+        self.ChangeJournaled = False
+        self.Storage = None
+        self.Journal = None
         self.InitializeStorageData()
         self.InitializeModuleData()
 
@@ -58,27 +102,191 @@ class BpixMountTool():
 
     def InitializeStorageData(self):
         dataDirectory = self.GetDataDirectory()
-        self.StorageLocations = {}
+        if self.Storage:
+            self.Storage.Close()
+        # the text file is only parsed into the database when it changed, see BpixStorage.py
         storageLocationFileName = dataDirectory + 'storage_locations.txt'
-        if os.path.isfile(storageLocationFileName):
-            with open(storageLocationFileName, 'r') as storageLocationFile:
-                for line in storageLocationFile:
-                    lineParts = line.strip().replace(',',';').replace('\t',';').split(';')
-                    if len(lineParts) > 1:
-                        self.StorageLocations[lineParts[0]] = lineParts[1].strip()
-        else:
+        self.Storage = BpixStorage(storageLocationFileName, dataDirectory + '.cache/storage_locations.db')
+        self.SpareModules = BpixSpareModules(self.Storage)
+        if not os.path.isfile(storageLocationFileName):
             self.ShowWarning("can't find storage location file in '$data/storage_locations.txt'")
 
 
     def GetStorageLocation(self, ModuleID):
-        location = 'unknown'
-        if ModuleID in self.StorageLocations:
-            location = self.StorageLocations[ModuleID]
-            if len(location) < 1:
-                location = 'empty'
+        location = self.Storage.GetLocation(ModuleID)
+        if location is None:
+            location = 'unknown'
+        elif len(location) < 1:
+            location = 'empty'
         return location
 
 
+    def FindStoredModules(self, Container = None, Tray = None, LayerName = None):
+        # [(ModuleID, Location)] of modules in a storage container/tray, with LayerName only those planned for this layer
+        StoredModules = self.Storage.FindModules(Container, Tray)
+        if LayerName:
+            plannedModules = set([ModuleID for LadderIndex, ZIndex, ModuleID in self.Layers[LayerName].IterateModules()])
+            StoredModules = [x for x in StoredModules if x[0] in plannedModules]
+        return StoredModules
+
+
+    def ReadModuleGrades(self):
+        # {ModuleID: Grade} from the optional $data/module_grades.csv, same format as for importplan
+        gradesFileName = self.GetDataDirectory() + 'module_grades.csv'
+        if not os.path.isfile(gradesFileName):
+            return {}
+        try:
+            return dict((ModuleID, Grade) for ModuleID, Grade, Location in BpixPlanner().ReadGrades(gradesFileName))
+        except IOError:
+            return {}
+
+
+    def RecommendSpares(self, LayerName, LadderIndex, ZIndex, Count = 5):
+        # [(ModuleID, Location, Grade, Proximity)] of unused modules near the planned/mounted module of the slot
+        # spares must not be planned or mounted in any layer, so all layers are loaded into the module index
+        for Name in self.LayerNames:
+            self.LayersMounted[Name]
+        self.SpareModules.Grades = self.ReadModuleGrades()
+        References = [self.Layers[LayerName].GetModule(LadderIndex, ZIndex), self.LayersMounted[LayerName].GetModule(LadderIndex, ZIndex)]
+        return self.SpareModules.Recommend(self.ModuleIndex.GetModuleIDs(), References, Count)
+
+
+    def PrintSpares(self, Spares):
+        for Number, (ModuleID, Location, Grade, Proximity) in enumerate(Spares, start=1):
+            print " [%d] %-8s %-24s %-6s %s"%(Number, ModuleID, Location if Location else '-', Grade, BpixSpareModules.ProximityNames[Proximity])
+        if len(Spares) < 1:
+            print " no spare modules in storage"
+
+
+    def GetPickListItems(self, LayerName, HalfLadderIndices = None):
+        # [(LayerName, LadderIndex, ZIndex, ModuleID)] of the planned and not yet mounted modules, whole layer if HalfLadderIndices is None
+        PlannedLayer = self.Layers[LayerName]
+        MountingLayer = self.LayersMounted[LayerName]
+        if HalfLadderIndices is None:
+            HalfLadderIndices = [[LadderIndex, Side] for LadderIndex in range(PlannedLayer.Ladders) for Side in [0, 1]]
+        Items = []
+        for LadderIndex, Side in HalfLadderIndices:
+            for ZIndex in range(Side*PlannedLayer.ZPositions, (Side+1)*PlannedLayer.ZPositions):
+                plannedModuleID = PlannedLayer.Modules[LadderIndex][ZIndex]
+                if len(plannedModuleID) > 0 and MountingLayer.Modules[LadderIndex][ZIndex] != plannedModuleID:
+                    Items.append((LayerName, LadderIndex, ZIndex, plannedModuleID))
+        return Items
+
+
+    def CreatePickList(self, LayerName, HalfLadderIndices = None, PickListFileName = None):
+        # returns (pick list text, file name or None if it could not be written)
+        PlannedLayer = self.Layers[LayerName]
+        PickList = BpixPickList(self.Storage)
+        Groups = PickList.Plan(self.GetPickListItems(LayerName, HalfLadderIndices))
+        if HalfLadderIndices is None:
+            Title = "pick list for %s"%LayerName
+        else:
+            Title = "pick list for %s %s"%(LayerName, ' '.join([PlannedLayer.GetHalfLadderName(x) for x in HalfLadderIndices]))
+        Text = PickList.Format(Groups, Title + ", REV %s, %s"%(self.globalConfig.get('System', 'DataRevision'), datetime.datetime.now().strftime("%Y-%m-%d %H:%M")),
+                               lambda Item: "L%d %s"%(Item[1]+1, PlannedLayer.GetZPositionNameRaw(Item[2])))
+
+        if PickListFileName is None:
+            PickListFileName = self.GetDataDirectory() + 'reports/picklist_%s_%s.txt'%(LayerName, datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+        try:
+            pickListDirectory = os.path.dirname(PickListFileName)
+            if len(pickListDirectory) > 0 and not os.path.isdir(pickListDirectory):
+                os.makedirs(pickListDirectory)
+            with open(PickListFileName, 'w') as pickListFile:
+                pickListFile.write(Text)
+        except:
+            self.ShowError("Can't write pick list to %s"%PickListFileName)
+            PickListFileName = None
+        self.Log("pick list: %s"%Title, 'PICKLIST')
+        return Text, PickListFileName
+
+
+    def EnterPickListMenu(self, HalfLadderIndices = None):
+        Text, PickListFileName = self.CreatePickList(self.ActiveLayer, HalfLadderIndices)
+        print Text
+        if PickListFileName:
+            print " written to %s"%PickListFileName
+        print "press any key to continue"
+        self.UI.ReadLine()
+
+
+    def ImportPlan(self, GradesFileName, LayerNames, KeepPlan = False):
+        # plans the layers from a module grade list (CSV: module ID, grade, storage location) and saves them as a new revision
+        # mounted modules stay in their slots, with KeepPlan also the planned modules which are still in the grade list
+        # returns {LayerName: (assigned [(LadderIndex, ZIndex, ModuleID)], unfilled slots)} or None if nothing was written
+        if self.StateClient:
+            self.ShowError("plans can't be imported while connected to a server")
+            return None
+        Planner = BpixPlanner(self.Storage)
+        Diagnostics = []
+        try:
+            Modules = Planner.ReadGrades(GradesFileName, Diagnostics)
+        except IOError as e:
+            self.ShowError("can't read module grades: %s"%e)
+            return None
+        self.ReportDiagnostics(GradesFileName, Diagnostics)
+        GradedModules = set([x[0] for x in Modules])
+
+        # modules mounted anywhere or planned in other layers are not available, so all layers are loaded
+        for LayerName in self.LayerNames:
+            self.LayersMounted[LayerName]
+        Excluded = self.ModuleIndex.GetModuleIDs('mounted') | self.ModuleIndex.GetModuleIDs('plan', [x for x in self.LayerNames if x not in LayerNames])
+
+        # mounted and kept modules of all imported layers are placed first, so no layer is planned with modules another one keeps
+        Plans = {}
+        Kept = set()
+        for LayerName in LayerNames:
+            PlannedLayer = self.Layers[LayerName]
+            NewPlan = BpixLayer(LayerName, PlannedLayer.Ladders, PlannedLayer.ZPositions, PlannedLayer.Tbms)
+            for LadderIndex, ZIndex, ModuleID in self.LayersMounted[LayerName].IterateModules():
+                NewPlan.SetModule(LadderIndex, ZIndex, ModuleID)
+            if KeepPlan:
+                for LadderIndex, ZIndex, ModuleID in PlannedLayer.IterateModules():
+                    if len(NewPlan.GetModule(LadderIndex, ZIndex)) < 1 and ModuleID in GradedModules and ModuleID not in Excluded and ModuleID not in Kept:
+                        NewPlan.SetModule(LadderIndex, ZIndex, ModuleID)
+                        Kept.add(ModuleID)
+            Plans[LayerName] = NewPlan
+        Excluded.update(Kept)
+
+        Results = {}
+        for LayerName in LayerNames:
+            Results[LayerName] = Planner.Plan(Plans[LayerName], Modules, Excluded)
+            Excluded.update([ModuleID for LadderIndex, ZIndex, ModuleID in Plans[LayerName].IterateModules()])
+
+        try:
+            self.DataLock.Acquire()
+        except IOError as e:
+            self.ShowError("can't import plan: %s"%e)
+            return None
+        try:
+            if not self.CreateNewRevisionLocked():
+                self.ShowError("can't create new revision for the imported plan")
+                return None
+            for LayerName in LayerNames:
+                PlannedLayer = self.Layers[LayerName]
+                Changed = []
+                Previous = []
+                for LadderIndex in range(PlannedLayer.Ladders):
+                    for ZIndex in range(2*PlannedLayer.ZPositions):
+                        ModuleID = Plans[LayerName].GetModule(LadderIndex, ZIndex)
+                        if PlannedLayer.GetModule(LadderIndex, ZIndex) != ModuleID:
+                            Previous.append(PlannedLayer.GetModule(LadderIndex, ZIndex))
+                            PlannedLayer.SetModule(LadderIndex, ZIndex, ModuleID)
+                            Changed.append((LadderIndex, ZIndex))
+                layerPlanFileName = self.GetDataDirectory() + self.LayerPlanFileName.format(Layer=LayerName)
+                if not PlannedLayer.SaveAs(layerPlanFileName):
+                    # the layer in memory is set back to the plan on disk, layers written before stay in the new revision
+                    for (LadderIndex, ZIndex), ModuleID in zip(Changed, Previous):
+                        PlannedLayer.SetModule(LadderIndex, ZIndex, ModuleID)
+                    self.ShowError("could not write plan %s"%layerPlanFileName)
+                    return None
+                self.InvalidateSlots(LayerName, Changed)
+                Assigned, Unfilled = Results[LayerName]
+                self.Log("PLAN: {Layer} planned from {FileName}: {Assigned} modules assigned, {Changed} slots changed, {Unfilled} slots left empty".format(Layer=LayerName, FileName=GradesFileName, Assigned=len(Assigned), Changed=len(Changed), Unfilled=len(Unfilled)), 'PLAN', Keys=self.GetLogKeys(LayerName))
+        finally:
+            self.DataLock.Release()
+        return Results
+
+
     def InitializeModuleData(self):
         self.dataDirectory = self.GetDataDirectory()
         if not os.path.isfile(self.dataDirectory + 'config.ini'):
@@ -103,69 +311,220 @@ class BpixMountTool():
         self.SectorsFileName = self.config.get('Layers', 'SectorsFileName')
         self.HubIDsFileName = self.config.get('Layers', 'HubIDsFileName')
 
-        # initialize layers
-        self.Layers = {}
-        self.LayersMounted = {}
+        # initialize layers, they are only loaded from disk when accessed for the first time
+        self.Layers = BpixLazyLayers(self.LayerNames, self.LoadLayer)
+        self.LayersMounted = BpixLazyLayers(self.LayerNames, self.LoadLayer)
         self.Sectors = {}
+        self.ModuleIndex = BpixModuleIndex()
+        self.ViewCache = BpixViewCache()
+        # LayerName -> BpixSectorIndex, built when first needed and updated with every mounted/cleared slot
+        self.SectorIndexes = {}
+        # mounted modules and version of each layer as last read from/written to disk, used to merge changes of other stations
+        self.LayerBases = {}
+        self.LayerVersions = {}
+        self.VersionStamps = BpixLayerVersions(self.GetDataDirectory())
+        self.RevisionData = BpixRevisionData(self.GetDataDirectory(), self.config)
+        self.HubIDs = BpixHubIDs(self.GetDataDirectory() + 'hub_ids.txt')
 
-        for LayerName in self.LayerNames:
-            layerLadders = int(self.config.get('Layer_%s'%LayerName, 'Ladders'))
-            layerZpositions = int(self.config.get('Layer_%s'%LayerName, 'ZPositions'))
-            layerTbms = int(self.config.get('Layer_%s'%LayerName, 'Tbms'))
-            self.Layers[LayerName] = BpixLayer(LayerName, Ladders=layerLadders, ZPositions=layerZpositions, Tbms=layerTbms)
-            self.LayersMounted[LayerName] = BpixLayer(LayerName+'(mounted)', Ladders=layerLadders, ZPositions=layerZpositions, Tbms=layerTbms)
-
-            # initialize planned module positions
-            layerPlanFileName =  self.GetDataDirectory() + self.LayerPlanFileName.format(Layer=LayerName)
-            if os.path.isfile(layerPlanFileName):
-                print "initialize ",LayerName
-                self.Layers[LayerName].LoadFromFile(layerPlanFileName)
-            else:
-                print "config file for",LayerName," does not exist!!"
-
-            # initialize already mounted module positions
-            layerMountFileName =  self.GetDataDirectory() + self.LayerMountFileName.format(Layer=LayerName)
-            if os.path.isfile(layerMountFileName):
-                print "initialize mounted modules for ", LayerName
-                self.LayersMounted[LayerName].LoadFromFile(layerMountFileName)
-            else:
-                print "mount file for", LayerName, " does not exist!!"
-
-            # initialize HUB IDs
-            hubIDsFileName =  self.GetDataDirectory() + self.HubIDsFileName.format(Layer=LayerName)
-            if os.path.isfile(hubIDsFileName):
-                print "initialize HUB IDs for ", LayerName
-                self.Layers[LayerName].LoadHubIDsFromFile(hubIDsFileName)
-                self.LayersMounted[LayerName].LoadHubIDsFromFile(hubIDsFileName)
-            else:
-                print "HUB IDs file for", LayerName, " does not exist!!"
-
-            # initialize sectors <-> ladders configuration
-            sectorsFileName =  self.GetDataDirectory() + self.SectorsFileName.format(Layer=LayerName)
-            if os.path.isfile(sectorsFileName):
-                self.Sectors[LayerName] = {}
-                with open(sectorsFileName, 'r') as sectorsFile:
-                    try:
-                        for sectorLine in sectorsFile:
-                            sectorID = int(sectorLine.split(':')[0].strip(' '))
-                            ladders = [int(x) for x in sectorLine.split(':')[1].strip(' ').split(',')]
-                            self.Sectors[LayerName][sectorID] = ladders
-                    except:
-                        print sectorsFileName,": bad formatted line:", sectorLine
         self.ActiveLayer = self.config.get('Layers', 'ActiveLayer')
-        print "SECTORS:", self.Sectors
+        # only the active layer is loaded right away
+        self.Layers.get(self.ActiveLayer)
 
         try:
             self.revisionTag = self.config.get('Revision', 'Tag')
         except:
             self.revisionTag = ""
 
+        # replay changes which were journaled but not yet compacted into the mount files, by this station before
+        # a crash or by other stations which have crashed
+        if self.Journal:
+            self.Journal.Close()
+        self.Journal = BpixJournal(self.GetDataDirectory())
+        with self.DataLock:
+            for FileName in self.Journal.Open():
+                print "taking over mount journal %s"%FileName
+            journalReplayed = self.Journal.Replay(self.LayersMounted)
+            if journalReplayed > 0:
+                print "replayed %d changes from mount journal"%journalReplayed
+                self.SaveConfiguration(False)
+
+
+    def LoadLayer(self, LayerName):
+        # called on first access of self.Layers[...]/self.LayersMounted[...], so a lock timeout must not end there:
+        # the files are replaced by renaming, they can be read without the lock, a save in progress might just not be seen
+        Locked = True
+        try:
+            self.DataLock.Acquire()
+        except IOError as e:
+            self.ShowWarning("reading %s without lock: %s"%(LayerName, e))
+            Locked = False
+        try:
+            Layer, LayerMounted, Sectors = self.RevisionData.LoadLayer(LayerName)
+            self.LayerVersions[LayerName] = self.VersionStamps.Read().get(LayerName, 0)
+        finally:
+            if Locked:
+                self.DataLock.Release()
+        self.LayerBases[LayerName] = array('i', LayerMounted.ModuleCodes)
+        self.Layers[LayerName] = Layer
+        self.LayersMounted[LayerName] = LayerMounted
+        self.Layers[LayerName].AttachIndex(self.ModuleIndex, LayerName, 'plan')
+        self.LayersMounted[LayerName].AttachIndex(self.ModuleIndex, LayerName, 'mounted')
+        self.ViewCache.InvalidateLayer(LayerName)
+        self.SectorIndexes.pop(LayerName, None)
+        if Sectors is not None:
+            self.Sectors[LayerName] = Sectors
+        self.ApplyServerSnapshot(LayerName)
+        Diagnostics = self.RevisionData.Diagnostics.get(LayerName, [])
+        if LayerName in self.RevisionData.Parsed:
+            self.ReportDiagnostics(LayerName, Diagnostics)
+        elif len(Diagnostics) > 0:
+            # reported and logged when the files were parsed
+            print "%d problems in the files of %s, see log"%(len(Diagnostics), LayerName)
+
+
+    def ReportDiagnostics(self, Name, Diagnostics, MaxPrinted = 10):
+        # all problems go to the log, only the first few are printed, Name is a layer or the name of another input file
+        if len(Diagnostics) < 1:
+            return
+        self.ShowWarning("%d problems in the files of %s"%(len(Diagnostics), Name))
+        for Diagnostic in Diagnostics[:MaxPrinted]:
+            print "  " + FormatDiagnostic(Diagnostic)
+        if len(Diagnostics) > MaxPrinted:
+            print "  ... %d more, see log"%(len(Diagnostics) - MaxPrinted)
+        for Diagnostic in Diagnostics:
+            if Name in self.LayerNames:
+                Keys = self.GetLogKeys(Name, Diagnostic['line'] - 1 if 0 < Diagnostic['line'] <= self.Layers[Name].Ladders else None)
+            else:
+                Keys = None
+            self.Log(FormatDiagnostic(Diagnostic), 'PARSE', Keys=Keys)
+
+
+    def ConnectToServer(self):
+        try:
+            Address = self.globalConfig.get('System', 'Server').strip()
+        except:
+            return False
+        if len(Address) < 1:
+            return False
+        try:
+            StateClient = BpixStateClient(ParseAddress(Address))
+            Response = StateClient.Request('hello')
+        except Exception as e:
+            self.ShowWarning("can't connect to server %s: %s, working on local files"%(Address, e))
+            return False
+        if str(Response.get('revision')) != self.globalConfig.get('System', 'DataRevision'):
+            self.ShowWarning("server %s is on REV %s, working on local files"%(Address, Response.get('revision')))
+            StateClient.Close()
+            return False
+
+        self.StateClient = StateClient
+        self.ServerSnapshot = Response['state']
+        for LayerName in self.LayersMounted.GetLoaded():
+            self.ApplyServerSnapshot(LayerName)
+        for Event in StateClient.Poll():
+            self.ApplyServerUpdate(Event)
+        self.Log("connected to server %s"%Address, Category='SERVER')
+        return True
+
+    def DisconnectFromServer(self, Reason):
+        self.ShowWarning("lost connection to server: %s, working on local files"%Reason)
+        self.Log("disconnected from server: %s"%Reason, Category='SERVER')
+        self.StateClient.Close()
+        self.StateClient = None
+        self.ServerSnapshot = {}
+
+    def ApplyServerSnapshot(self, LayerName):
+        if LayerName not in self.ServerSnapshot:
+            return
+        MountingLayer = dict.__getitem__(self.LayersMounted, LayerName)
+        Modules = self.ServerSnapshot[LayerName]['modules']
+        SlotsPerLadder = 2 * MountingLayer.ZPositions
+        Changed = []
+        for LadderIndex in range(MountingLayer.Ladders):
+            for ZIndex in range(SlotsPerLadder):
+                ModuleID = Modules[LadderIndex * SlotsPerLadder + ZIndex]
+                if MountingLayer.Modules[LadderIndex][ZIndex] != ModuleID:
+                    MountingLayer.SetModule(LadderIndex, ZIndex, ModuleID)
+                    Changed.append((LadderIndex, ZIndex))
+        self.InvalidateSlots(LayerName, Changed)
+
+    def ApplyServerUpdate(self, Event):
+        if Event.get('event') != 'slots':
+            return
+        LayerName = Event['layer']
+        if LayerName in self.ServerSnapshot:
+            SlotsPerLadder = 2 * self.ServerSnapshot[LayerName]['zpositions']
+            for LadderIndex, ZIndex, ModuleID in Event['slots']:
+                self.ServerSnapshot[LayerName]['modules'][LadderIndex * SlotsPerLadder + ZIndex] = ModuleID
+        # layers which are not loaded yet get the new state from the snapshot when they are loaded
+        if self.LayersMounted.IsLoaded(LayerName):
+            MountingLayer = self.LayersMounted[LayerName]
+            for LadderIndex, ZIndex, ModuleID in Event['slots']:
+                MountingLayer.SetModule(LadderIndex, ZIndex, ModuleID)
+            self.InvalidateSlots(LayerName, [(LadderIndex, ZIndex) for LadderIndex, ZIndex, ModuleID in Event['slots']])
+
+    def PollServer(self):
+        # applies slot updates pushed by the server since the last call
+        if self.StateClient:
+            try:
+                Events = self.StateClient.Poll()
+            except Exception as e:
+                self.DisconnectFromServer(e)
+                return
+            for Event in Events:
+                self.ApplyServerUpdate(Event)
+
+    def RequestServer(self, Operation, **Arguments):
+        try:
+            Response = self.StateClient.Request(Operation, **Arguments)
+        except Exception as e:
+            self.DisconnectFromServer(e)
+            return False
+        # the changes of this request are also pushed back as events, the local layers are updated from them
+        self.PollServer()
+        for Warning in Response.get('warnings', []):
+            self.ShowWarning(Warning)
+        for Error in Response.get('errors', []):
+            self.ShowError(Error)
+        return Response.get('ok', False)
+
+
+    def InvalidateSlots(self, LayerName, Slots):
+        # has to be called for every changed slot: rebuilds the affected view rows and updates the sector counts
+        self.ViewCache.InvalidateSlots(LayerName, Slots)
+        if LayerName in self.SectorIndexes:
+            self.SectorIndexes[LayerName].UpdateSlots(Slots)
+
+
+    def GetSectorIndex(self, LayerName):
+        if LayerName not in self.SectorIndexes:
+            Layer = self.Layers[LayerName]
+            SectorIndex = BpixSectorIndex(Layer, self.LayersMounted[LayerName], self.Sectors.get(LayerName))
+            SectorIndex.SetHubIDIssues(self.HubIDs.Validate(LayerName, Layer, self.Sectors.get(LayerName)))
+            self.SectorIndexes[LayerName] = SectorIndex
+        return self.SectorIndexes[LayerName]
+
 
     def FlagUnsaved(self):
         self.UnsavedChanges = True
 
         if self.Autosave:
-            self.SaveConfiguration(False)
+            # a journaled change is already on disk, it is compacted into the mount files from time to time
+            if not self.ChangeJournaled or self.Journal.Entries >= self.JournalCompactInterval:
+                self.SaveConfiguration(False)
+            else:
+                self.UnsavedChanges = False
+        self.ChangeJournaled = False
+
+
+    def JournalModuleChanges(self, Records):
+        self.ChangeJournaled = False
+        if self.Autosave:
+            if not self.Journal.Append(Records):
+                self.ShowError("could not write to mount journal %s"%self.Journal.FileName)
+                return False
+            self.ChangeJournaled = True
+        return True
 
 
     def ShowError(self, Message):
@@ -173,6 +532,7 @@ class BpixMountTool():
         self.PrintBox("ERROR: " + Message)
         sys.stdout.write('\x1b[0m')
         self.Log(Message=Message, Category='ERROR')
+        self.FlushLog()
 
 
     def ShowWarning(self, Message):
@@ -182,11 +542,53 @@ class BpixMountTool():
         self.Log(Message=Message, Category='WARNING')
 
 
-    def Log(self, Message, Category = 'LOG'):
-        logString = "{Date} [{Category}] {Message}\n".format(Date=datetime.datetime.now().strftime("%Y-%m-%d %H:%M"), Category=Category, Message=Message)
-        logFileName =  self.GetDataDirectory() + 'bpixm.log'
-        with open(logFileName, "a") as logFile:
-            logFile.write(logString)
+    def Log(self, Message, Category = 'LOG', Keys = None):
+        if not self.LogWriter or self.LogWriter.Directory != self.GetDataDirectory():
+            self.CloseLog()
+            self.LogWriter = BpixLog(self.GetDataDirectory(), MaxSize=self.LogMaxSize, Lock=self.DataLock)
+        self.LogWriter.Write(Message, Category, Keys)
+
+
+    def GetLogKeys(self, LayerName, LadderIndex = None):
+        # keys for the inverted log index: layer and ladder, ladder numbers starting from 1
+        if LadderIndex is None:
+            return [LayerName]
+        return [LayerName, '%s/%d'%(LayerName, LadderIndex+1)]
+
+
+    def GetHistory(self, Key):
+        # timeline for a module ID, layer or layer/ladder key over all revisions, as (Revision, Date, Category, Message)
+        self.FlushLog()
+        History = []
+        dataDirectories = [x.replace('\\','/').strip('/').split('/')[-1] for x in glob.glob(self.dataDirectoryBase + '*/')]
+        for dataDirectory in sorted([int(x) for x in dataDirectories if x.isdigit()]):
+            try:
+                RevisionLog = BpixLog(self.dataDirectoryBase + '%d/'%dataDirectory, Lock=self.DataLock)
+                # revisions created by copying the whole directory start with the log of their parent revision,
+                # these lines come before the line announcing the new revision and are already listed for the parent
+                Created = RevisionLog.FindFirst('CONFIG', "CREATED REV %d out of REVISION"%dataDirectory)
+                Postings = RevisionLog.GetPostings(Key)
+                for (Part, Offset, Length), (Date, Category, Message) in zip(Postings, RevisionLog.ReadLines(Postings)):
+                    if not Created or (Part, Offset) >= Created:
+                        History.append((dataDirectory, Date, Category, Message))
+            except (IOError, OSError, ValueError):
+                self.ShowWarning("can't read log index of REV %d"%dataDirectory)
+        return History
+
+
+    def FlushLog(self):
+        if self.LogWriter:
+            self.LogWriter.Flush()
+
+
+    def CloseLog(self):
+        if self.LogWriter:
+            self.LogWriter.Close()
+
+
+    def CloseJournal(self):
+        if self.Journal:
+            self.Journal.Close()
 
 
     def WriteGlobalConfig(self):
@@ -202,36 +604,113 @@ class BpixMountTool():
 
 
     def SaveLocalConfiguration(self):
-        with open( self.GetDataDirectory() + 'config.ini', 'wb') as configfile:
+        # written to a new file and renamed, so the file shared with other revisions is not modified
+        # and the revision is never left without config.ini
+        configFileName = self.GetDataDirectory() + 'config.ini'
+        with open(configFileName + '.tmp', 'wb') as configfile:
             self.config.write(configfile)
+            configfile.flush()
+            os.fsync(configfile.fileno())
+        if os.name == 'nt' and os.path.isfile(configFileName):
+            os.remove(configFileName)
+        os.rename(configFileName + '.tmp', configFileName)
 
-        self.config.read(self.GetDataDirectory() + 'config.ini')
+        self.config.read(configFileName)
 
 
     def SaveConfiguration(self, PrintOutput = True):
-        Success = True
-        for LayerName in self.LayerNames:
-            layerMountFileName =  self.GetDataDirectory() + self.LayerMountFileName.format(Layer=LayerName)
-            if self.LayersMounted[LayerName].SaveAs(layerMountFileName):
-                if PrintOutput:
-                    print "saved configuration for ", LayerName
-                    self.Log("saved configuration for %s"%LayerName, "CONFIG")
-            else:
-                self.ShowError("could not save configuration for %s"%LayerName)
-                Success = False
+        if self.StateClient:
+            if not self.RequestServer('save'):
+                return False
+            if PrintOutput:
+                print "saved configuration on server"
+            self.UnsavedChanges = False
+            return True
 
         try:
-            self.config.set('Layers', 'ActiveLayer', self.ActiveLayer)
-            self.SaveLocalConfiguration()
-        except:
-            Success = False
+            self.DataLock.Acquire()
+        except IOError as e:
+            self.ShowError("can't save configuration: %s"%e)
+            return False
 
-        if Success:
-            self.UnsavedChanges = False
-        return Success
+        try:
+            Success = True
+            Versions = self.VersionStamps.Read()
+            VersionsChanged = False
+            # layers which were never loaded or not changed since the last save are not written
+            for LayerName, MountingLayer in self.LayersMounted.GetLoaded().items():
+                layerMountFileName =  self.GetDataDirectory() + self.LayerMountFileName.format(Layer=LayerName)
+                if not MountingLayer.IsDirty() and os.path.isfile(layerMountFileName):
+                    continue
+                if Versions.get(LayerName, 0) != self.LayerVersions[LayerName]:
+                    # another station saved this layer in the meantime, its changes are taken over instead of overwritten
+                    self.MergeLayerFromFile(LayerName, layerMountFileName)
+                    self.LayerVersions[LayerName] = Versions.get(LayerName, 0)
+                layerChanged = MountingLayer.ModuleCodes != self.LayerBases[LayerName]
+
+                if MountingLayer.SaveAs(layerMountFileName):
+                    if layerChanged:
+                        self.LayerVersions[LayerName] += 1
+                        Versions[LayerName] = self.LayerVersions[LayerName]
+                        VersionsChanged = True
+                        self.LayerBases[LayerName] = array('i', MountingLayer.ModuleCodes)
+                    if PrintOutput:
+                        print "saved configuration for ", LayerName
+                        self.Log("saved configuration for %s"%LayerName, "CONFIG")
+                else:
+                    self.ShowError("could not save configuration for %s"%LayerName)
+                    Success = False
+
+            try:
+                if VersionsChanged:
+                    self.VersionStamps.Write(Versions)
+                self.config.set('Layers', 'ActiveLayer', self.ActiveLayer)
+                self.SaveLocalConfiguration()
+            except:
+                Success = False
+
+            if Success:
+                # all journaled changes are contained in the mount files now
+                self.Journal.Truncate()
+                self.UnsavedChanges = False
+            return Success
+        finally:
+            self.DataLock.Release()
+
+    def MergeLayerFromFile(self, LayerName, FileName):
+        MountingLayer = self.LayersMounted[LayerName]
+        savedLayer = BpixLayer(LayerName+'(saved)', Ladders=MountingLayer.Ladders, ZPositions=MountingLayer.ZPositions, Tbms=MountingLayer.Tbms)
+        self.ReportDiagnostics(LayerName, savedLayer.LoadFromFile(FileName))
+        Merged, Conflicts = MountingLayer.MergeChanges(self.LayerBases[LayerName], savedLayer)
+
+        for LadderIndex, ZIndex in Merged:
+            ModuleID = MountingLayer.Modules[LadderIndex][ZIndex]
+            self.Log("MERGE: change of other station taken over: {Layer} ladder {Ladder} {Z} -> {ModuleID}".format(Layer=LayerName, Ladder=LadderIndex+1, Z=MountingLayer.GetZPositionNameRaw(ZIndex), ModuleID=MountingLayer.FormatModuleName(ModuleID)), 'MERGE', Keys=self.GetLogKeys(LayerName, LadderIndex))
+            if len(ModuleID) > 0 and len(self.ModuleIndex.Find(ModuleID, Kind='mounted')) > 1:
+                self.ShowWarning("module {ModuleID} is mounted in more than one position after merging changes of another station!".format(ModuleID=ModuleID))
+        for LadderIndex, ZIndex in Conflicts:
+            self.ShowWarning("{Layer} ladder {Ladder} {Z} was changed by another station to {Theirs}, keeping {Ours}".format(Layer=LayerName, Ladder=LadderIndex+1, Z=MountingLayer.GetZPositionNameRaw(ZIndex), Theirs=savedLayer.FormatModuleName(savedLayer.Modules[LadderIndex][ZIndex]), Ours=MountingLayer.FormatModuleName(MountingLayer.Modules[LadderIndex][ZIndex])))
+        if len(Merged) > 0 or len(Conflicts) > 0:
+            print "%s: merged %d changes of another station, %d conflicts"%(LayerName, len(Merged), len(Conflicts))
+
+        self.InvalidateSlots(LayerName, Merged)
+        self.LayerBases[LayerName] = array('i', savedLayer.ModuleCodes)
+        return Merged, Conflicts
 
 
     def CreateNewRevision(self):
+        try:
+            self.DataLock.Acquire()
+        except IOError as e:
+            self.ShowError("can't create new revision: %s"%e)
+            return False
+        try:
+            return self.CreateNewRevisionLocked()
+        finally:
+            self.DataLock.Release()
+
+    def CreateNewRevisionLocked(self):
+        # the next revision number is only unique while the data lock is held
         self.SaveConfiguration()
         Success = True
         oldRevision = self.globalConfig.get('System', 'DataRevision')
@@ -246,7 +725,8 @@ class BpixMountTool():
 
         if Success:
             try:
-                shutil.copytree( self.GetDataDirectory(), dataDirectoryNew)
+                # unchanged files are shared with the old revision through the revision store
+                self.RevisionStore.CreateRevision(self.GetDataDirectory(), dataDirectoryNew)
             except:
                 print "can't copy to new location:", dataDirectoryNew
                 Success = False
@@ -256,10 +736,54 @@ class BpixMountTool():
             self.globalConfig.set('System', 'DataRevision', nextRevision)
             self.WriteGlobalConfig()
 
+            # loaded layers stay in memory, everything else has to follow the new directory
+            self.Journal.Close()
+            self.Journal = BpixJournal(self.GetDataDirectory())
+            self.Journal.Open()
+            self.RevisionData = BpixRevisionData(self.GetDataDirectory(), self.config)
+            self.VersionStamps = BpixLayerVersions(self.GetDataDirectory())
+
             self.Log("CREATED REV {newRev} out of REVISION {oldRev}".format(newRev = nextRevision, oldRev=oldRevision), Category="CONFIG")
 
         return Success
 
+    def FindModule(self, ModuleID, Kind):
+        # loaded layers are looked up in the module index, the files of the other layers are scanned without loading them
+        Positions = []
+        LoadedLayers = self.Layers.GetLoaded() if Kind == 'plan' else self.LayersMounted.GetLoaded()
+        FileNameFormat = self.LayerPlanFileName if Kind == 'plan' else self.LayerMountFileName
+        for LayerName in self.LayerNames:
+            if LayerName in LoadedLayers:
+                Positions += self.ModuleIndex.Find(ModuleID, Kind=Kind, LayerName=LayerName)
+            else:
+                layerFileName = self.GetDataDirectory() + FileNameFormat.format(Layer=LayerName)
+                for LadderIndex, ZIndex in self.ScanLayerFileForModule(layerFileName, ModuleID):
+                    Positions.append((LayerName, LadderIndex, ZIndex, Kind))
+        return Positions
+
+    def ScanLayerFileForModule(self, FileName, ModuleID):
+        Positions = []
+        ModuleID = ModuleID.strip()
+        if len(ModuleID) > 0 and os.path.isfile(FileName):
+            with open(FileName, 'r') as layerFile:
+                for LadderIndex, line in enumerate(layerFile):
+                    if ModuleID in line:
+                        for ZIndex, x in enumerate(line.replace('\t',';').split(';')):
+                            if x.split(' ')[0].strip() == ModuleID:
+                                Positions.append((LadderIndex, ZIndex))
+        return Positions
+
+    def GetSectorInfo(self, LayerName, LadderIndex):
+        # only the sectors file is needed, layers which are not loaded yet are not loaded for it
+        if LayerName in self.SectorIndexes:
+            SectorID = self.SectorIndexes[LayerName].GetSector(LadderIndex)
+        else:
+            Sectors = self.Sectors.get(LayerName) if self.Layers.IsLoaded(LayerName) else self.RevisionData.ReadSectors(LayerName)
+            # the lowest sector ID wins for ladders listed in several sectors, as in BpixSectorIndex
+            SectorIDs = [x for x in sorted((Sectors or {}).keys()) if LadderIndex + 1 in Sectors[x]]
+            SectorID = SectorIDs[0] if len(SectorIDs) > 0 else None
+        return " SECTOR %d"%SectorID if SectorID is not None else ''
+
     def EnterSearchMenu(self):
         print "############################################################"
         print " ENTER/SCAN MODULE ID"
@@ -277,30 +801,162 @@ class BpixMountTool():
                 'Storage location for module {ModuleID} is unknown, this module ID might not exist, please check!'.format(
                     ModuleID=moduleID))
 
-        plannedPositions = []
-        if len(moduleID) > 0:
-            for layerName, layer in self.Layers.items():
-                for ladderNumber, ladder in enumerate(layer.Modules, start=1):
-                    for planModuleID in ladder:
-                        if planModuleID == moduleID:
-                            plannedPositions.append("{Layer} LADDER {Ladder}".format(Layer=layerName, Ladder=ladderNumber))
+        plannedPositions = ["{Layer} LADDER {Ladder}{Sector}".format(Layer=layerName, Ladder=ladderIndex+1, Sector=self.GetSectorInfo(layerName, ladderIndex)) for layerName, ladderIndex, zIndex, kind in self.FindModule(moduleID, Kind='plan')] if len(moduleID) > 0 else []
         print " PLAN POSITION: %s" % (', '.join(plannedPositions) if len(plannedPositions) > 0 else '-')
 
-        mountedPositions = []
-        if len(moduleID) > 0:
-            for layerName, layer in self.LayersMounted.items():
-                for ladderNumber, ladder in enumerate(layer.Modules, start=1):
-                    for planModuleID in ladder:
-                        if planModuleID == moduleID:
-                            mountedPositions.append("{Layer} LADDER {Ladder}".format(Layer=layerName, Ladder=ladderNumber))
+        mountedPositions = ["{Layer} LADDER {Ladder}{Sector}".format(Layer=layerName, Ladder=ladderIndex+1, Sector=self.GetSectorInfo(layerName, ladderIndex)) for layerName, ladderIndex, zIndex, kind in self.FindModule(moduleID, Kind='mounted')] if len(moduleID) > 0 else []
         print " MOUNTED AT:    %s" % (', '.join(mountedPositions) if len(mountedPositions) > 0 else '-')
         print "############################################################"
         print "press any key to continue to main menu"
-        raw_input()
+        self.UI.ReadLine()
+        return True
+
+    def EnterHistoryMenu(self):
+        self.PrintBox("scan module ID or enter layer (e.g. %s) or layer/ladder (e.g. %s/3)"%(self.ActiveLayer, self.ActiveLayer))
+        Key = self.ReadModuleBarcode().strip()
+        if len(Key) < 1:
+            return False
+
+        History = self.GetHistory(Key)
+        print "############################################################"
+        print " HISTORY OF %s"%Key
+        print "############################################################"
+        for Revision, Date, Category, Message in History:
+            print " REV {Rev} {Date} [{Category}] {Message}".format(Rev=Revision, Date=Date, Category=Category, Message=Message)
+        if len(History) < 1:
+            print " no log entries found"
+        print "############################################################"
+        print "press any key to continue to main menu"
+        self.UI.ReadLine()
+        return True
+
+    def CreateConformanceReport(self, ReportFileName = None, SectorFilter = None):
+        # compares plan and mounted modules of all layers, not only the active one, or of one sector if SectorFilter = (LayerName, SectorID)
+        # returns (issues, summary, report file name without extension or None if it could not be written)
+        Conformance = BpixConformance(self.Layers, self.LayersMounted)
+        Issues, Summary = Conformance.Compute()
+
+        if SectorFilter:
+            LayerName, SectorID = SectorFilter
+            SectorIndex = self.GetSectorIndex(LayerName)
+            Issues = [x for x in Issues if x['layer'] == LayerName and SectorIndex.GetSector(x['ladder'] - 1) == SectorID]
+            Counts = SectorIndex.GetCounts(SectorID)
+            Summary = {self.GetSectorName(LayerName, SectorID): dict([(x, Counts[x]) for x in ['slots', 'planned', 'mounted', 'conform', 'MISMATCH', 'EMPTY', 'UNPLANNED']] + [
+                ('DUPLICATE', len([x for x in Issues if x['type'] == 'DUPLICATE'])),
+            ])}
+
+        if ReportFileName is None:
+            ReportFileName = self.GetDataDirectory() + 'reports/conformance_%s'%datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        reportDirectory = os.path.dirname(ReportFileName)
+        try:
+            if len(reportDirectory) > 0 and not os.path.isdir(reportDirectory):
+                os.makedirs(reportDirectory)
+            Conformance.WriteCSV(ReportFileName + '.csv', Issues)
+            Conformance.WriteJSON(ReportFileName + '.json', Issues, Summary)
+        except:
+            self.ShowError("Can't write conformance report to %s"%ReportFileName)
+            ReportFileName = None
+        return Issues, Summary, ReportFileName
+
+    def GetSectorName(self, LayerName, SectorID):
+        return "%s/S%s"%(LayerName, SectorID) if SectorID is not None else "%s/-"%LayerName
+
+    def PrintSectorSummary(self, LayerName):
+        SectorIndex = self.GetSectorIndex(LayerName)
+        Columns = ['slots', 'planned', 'mounted', 'conform', 'MISMATCH', 'EMPTY', 'UNPLANNED', 'HUB-ID']
+        print " " + "sector".ljust(8) + "ladders".ljust(12) + "".join([x.rjust(10) for x in Columns])
+        for SectorID in SectorIndex.GetSectorIDs():
+            Counts = SectorIndex.GetCounts(SectorID)
+            Ladders = ','.join(["%d"%(x+1) for x in SectorIndex.GetSectorLadders(SectorID)])
+            print " " + ("S%s"%SectorID if SectorID is not None else '-').ljust(8) + (Ladders if len(Ladders) < 12 else Ladders[:9] + '...').ljust(12) + "".join([("%d"%Counts[x]).rjust(10) for x in Columns])
+
+    def PrintSectorSlots(self, LayerName, SectorID):
+        PlannedLayer = self.Layers[LayerName]
+        MountingLayer = self.LayersMounted[LayerName]
+        print " %-6s %-5s %-8s %-8s %-7s %s"%('ladder', 'Z', 'plan', 'mounted', 'hub ID', 'storage')
+        for LadderIndex, ZIndex in self.GetSectorIndex(LayerName).GetSectorSlots(SectorID):
+            plannedModuleID = PlannedLayer.Modules[LadderIndex][ZIndex]
+            mountedModuleID = MountingLayer.Modules[LadderIndex][ZIndex]
+            print " L%-5d %-5s %-8s %-8s %-7s %s"%(LadderIndex+1, PlannedLayer.GetZPositionNameRaw(ZIndex), PlannedLayer.FormatModuleName(plannedModuleID), MountingLayer.FormatModuleName(mountedModuleID),
+                                                  PlannedLayer.FormatHubIDTuple(PlannedLayer.GetHubIDTuple(LadderIndex, ZIndex)), self.GetStorageLocation(plannedModuleID) if len(plannedModuleID) > 0 and plannedModuleID != mountedModuleID else '')
+
+    def EnterViewSectorsMenu(self):
+        while True:
+            self.UI.Clear()
+            self.PrintBox("sectors of %s"%self.ActiveLayer)
+            self.PrintSectorSummary(self.ActiveLayer)
+            print ""
+
+            SectorIndex = self.GetSectorIndex(self.ActiveLayer)
+            SectorChoices = [['%s'%SectorID, 'Sector %s (ladders %s)'%(SectorID if SectorID is not None else '-', ', '.join(["%d"%(x+1) for x in SectorIndex.GetSectorLadders(SectorID)]))] for SectorID in SectorIndex.GetSectorIDs()]
+            ret = self.UI.AskUser("show slots of sector", SectorChoices + [['back', 'Go _back']], DisplayWidth=self.DisplayWidth)
+            if ret == 'back' or not ret:
+                return True
+
+            SectorID = SectorIndex.GetSectorIDs()[[x[0] for x in SectorChoices].index(ret)]
+            self.UI.Clear()
+            self.PrintBox("sector %s"%self.GetSectorName(self.ActiveLayer, SectorID))
+            self.PrintSectorSlots(self.ActiveLayer, SectorID)
+            print "press any key to continue"
+            self.UI.ReadLine()
+
+    def PrintConformanceSummary(self, Summary):
+        Columns = ['planned', 'mounted', 'conform'] + BpixConformance({}, {}).IssueTypes
+        print " " + "layer".ljust(10) + "".join([x.rjust(10) for x in Columns])
+        for LayerName in sorted(Summary.keys()):
+            print " " + LayerName.ljust(10) + "".join([("%d"%Summary[LayerName][x]).rjust(10) for x in Columns])
+        print " " + "total".ljust(10) + "".join([("%d"%sum([Summary[LayerName][x] for LayerName in Summary])).rjust(10) for x in Columns])
+
+    def CheckHubIDs(self, LayerNames = None):
+        # hub ID issues of the planned layers, all layers if LayerNames is None
+        Issues = []
+        for LayerName in (LayerNames if LayerNames is not None else self.LayerNames):
+            Layer = self.Layers[LayerName]
+            Issues += self.HubIDs.Validate(LayerName, Layer, self.Sectors.get(LayerName))
+        return Issues
+
+    def SolveHubIDs(self, LayerName, KeepValid = True):
+        # assigns conflict-free hub IDs to the layer and writes its hub ID file, returns (changed slots, issues)
+        Layer = self.Layers[LayerName]
+        Changed, Issues = self.HubIDs.Solve(LayerName, Layer, self.Sectors.get(LayerName), KeepValid)
+        if len(Changed) > 0:
+            for LadderIndex, ZIndex in Changed:
+                self.LayersMounted[LayerName].SetHubIDTuple(LadderIndex, ZIndex, Layer.GetHubIDTuple(LadderIndex, ZIndex))
+                self.Log("HUB-IDS: {Layer} ladder {Ladder} {Z} -> {HubIDs}".format(Layer=LayerName, Ladder=LadderIndex+1, Z=Layer.GetZPositionNameRaw(ZIndex), HubIDs=Layer.FormatHubIDTuple(Layer.GetHubIDTuple(LadderIndex, ZIndex))), 'HUB-IDS', Keys=self.GetLogKeys(LayerName, LadderIndex))
+            hubIDsFileName = self.GetDataDirectory() + self.HubIDsFileName.format(Layer=LayerName)
+            try:
+                with self.DataLock:
+                    self.HubIDs.Write(Layer, hubIDsFileName)
+            except:
+                self.ShowError("could not write hub IDs to %s"%hubIDsFileName)
+            self.ViewCache.InvalidateLayer(LayerName)
+            if LayerName in self.SectorIndexes:
+                self.SectorIndexes[LayerName].SetHubIDIssues(self.HubIDs.Validate(LayerName, Layer, self.Sectors.get(LayerName)))
+        return Changed, Issues
+
+    def PrintHubIDIssues(self, Issues, MaxLines = None):
+        for Issue in Issues[:MaxLines]:
+            print " %-10s %-8s L%-3d %-4s %-6s %s"%(Issue['type'], Issue['layer'], Issue['ladder'], Issue['z'], Issue['hubids'], Issue['detail'])
+        if MaxLines is not None and len(Issues) > MaxLines:
+            print " ... %d more"%(len(Issues) - MaxLines)
+
+    def EnterConformanceReportMenu(self):
+        Issues, Summary, reportFileName = self.CreateConformanceReport()
+
+        self.UI.Clear()
+        self.PrintBox("conformance report plan vs. mounted, %d issues"%len(Issues))
+        self.PrintConformanceSummary(Summary)
+        if reportFileName:
+            print ""
+            print " written to %s.csv and %s.json"%(reportFileName, reportFileName)
+        print "press any key to continue to main menu"
+        self.UI.ReadLine()
         return True
 
     def EnterMainMenu(self):
         while True:
+            self.FlushLog()
+            self.PollServer()
 
             revisionInfo = ''
             try:
@@ -335,13 +991,18 @@ class BpixMountTool():
                             ['view','View _detector status'],
                             ['plan','View mounting _plan'],
                             ['hubids', 'View _hub IDs'],
+                            ['sectors', 'View s_ectors'],
                             ['search', 'Search module ID'],
+                            ['history', 'Module/ladder his_tory'],
+                            ['report', '_Conformance report (all layers)'],
+                            ['picklist', 'Pic_k list for active layer (storage order)'],
                             ['log','Add _log entry'],
                             ['mlog', 'Add log entry to specific module'],
                             ['save', 'Sa_ve configuration'],
                             ['step','Save configuration as new revision'],
                             ['revs','Sho_w revisions'],
                             ['selectrevs','Select revision'],
+                            ['diffrevs','Compare revisions'],
                             ['tagrevs','Set tag for this revision'],
                             ['select', '_Select Layer (active: %s)' % self.ActiveLayer],
                             ['settings', 'Sett_ings'],
@@ -351,12 +1012,20 @@ class BpixMountTool():
                 self.EnterViewPlanMenu()
             elif ret == 'hubids':
                 self.EnterViewHubIDsMenu()
+            elif ret == 'sectors':
+                self.EnterViewSectorsMenu()
             elif ret == 'view':
                 self.EnterViewStatusMenu()
             elif ret == 'select':
                 self.EnterSelectLayerMenu()
             elif ret == 'search':
                 self.EnterSearchMenu()
+            elif ret == 'history':
+                self.EnterHistoryMenu()
+            elif ret == 'report':
+                self.EnterConformanceReportMenu()
+            elif ret == 'picklist':
+                self.EnterPickListMenu()
             elif ret == 'mount':
                 self.EnterMountMenu()
             elif ret == 'replace':
@@ -369,6 +1038,8 @@ class BpixMountTool():
                 self.EnterRevsMenu()
             elif ret == 'selectrevs':
                 self.EnterSelectRevsMenu()
+            elif ret == 'diffrevs':
+                self.EnterDiffRevsMenu()
             elif ret == 'tagrevs':
                 self.EnterTagRevsMenu()
             elif ret == 'save':
@@ -400,7 +1071,7 @@ class BpixMountTool():
     def EnterSetOperatorMenu(self):
         oldOperator = self.Operator
         self.PrintBox('Set new operator (currently: %s)'%oldOperator)
-        self.Operator = raw_input()
+        self.Operator = self.UI.ReadLine()
         self.globalConfig.set('System', 'Operator', self.Operator)
         self.Log('change operator %s -> %s'%(oldOperator, self.Operator))
         self.WriteGlobalConfig()
@@ -408,10 +1079,10 @@ class BpixMountTool():
 
     def EnterLogMenu(self):
         self.PrintBox("enter lines to write to log file, empty line to go back")
-        logString = raw_input()
+        logString = self.UI.ReadLine()
         while len(logString.strip()) > 0:
             self.Log(logString, Category='USER')
-            logString = raw_input()
+            logString = self.UI.ReadLine()
 
 
     def SelectSingleModule(self, selectTitle='select a module'):
@@ -420,30 +1091,8 @@ class BpixMountTool():
         # header
         self.PrintBox(selectTitle)
 
-        ModuleChoices = []
         MountingLayer = self.GetActiveMountingLayer()
-        for Ladder in MountingLayer.Modules:
-            LadderModules = []
-            for ModuleId in Ladder:
-                LadderModules.append(self.GetActiveMountingLayer().FormatModuleName(ModuleId))
-            ModuleChoices.append(LadderModules)
-
-        # Z positions
-        ZPositionsString = ' '*9
-        for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions):
-            ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition).ljust(9)
-        for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions, 2*self.Layers[self.ActiveLayer].ZPositions):
-            ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition).ljust(9)
-        print ZPositionsString
-
-        # half ladders
-        HalfLadderChoices = []
-        HeaderColumn = []
-
-        LadderIndex = 1
-        for Ladder in MountingLayer.Modules:
-            HeaderColumn.append(("L%d"%LadderIndex).ljust(5))
-            LadderIndex += 1
+        ModuleChoices, HeaderColumn = self.GetModuleSelectionGrid()
 
         # ask user to pick a half ladder
         selectedModuleIndex = self.UI.AskUser2D('', ModuleChoices, HeaderColumn=HeaderColumn)
@@ -468,19 +1117,23 @@ class BpixMountTool():
         print " MODULE:   %s"%commentModule
         self.PrintBox("enter lines to write to log file, empty line to stop")
         logComments = []
-        logString = raw_input()
+        logString = self.UI.ReadLine()
         while len(logString.strip()) > 0:
             logComments.append(logString)
-            logString = raw_input()
+            logString = self.UI.ReadLine()
 
         logComment = ', '.join(logComments)
         logLine = '{Layer}/{Ladder}/{ZPosition}/{ModuleID}: {Comment}'.format(Layer=commentLayer, Ladder=commentLadder, ZPosition=commentZPosition, ModuleID=commentModule, Comment=logComment)
-        self.Log(logLine, 'MODULE-COMMENT')
+        self.Log(logLine, 'MODULE-COMMENT', Keys=self.GetLogKeys(commentLayer, modulePosition[0]))
 
-    def getLastLine(self, fname, maxLineLength=80):
-        fp = file(fname, "rb")
-        fp.seek(-maxLineLength - 1, 2)  # 2 means "from the end of the file"
-        return fp.readlines()[-1]
+    def GetRevisionDate(self, Revision):
+        self.FlushLog()
+        DateString = '?'
+        try:
+            DateString = BpixLog(self.dataDirectoryBase + '%s/'%Revision, Lock=self.DataLock).GetLastDate()
+        except:
+            pass
+        return DateString
 
 
     def EnterRevsMenu(self):
@@ -494,19 +1147,13 @@ class BpixMountTool():
         dataDirectories.sort(key=lambda x: int(x), reverse=True)
         dataDirectories = dataDirectories[0:10]
         for dataDirectory in dataDirectories:
-            DateString = '?'
-            try:
-                LL = self.getLastLine(self.dataDirectoryBase + dataDirectory + '/bpixm.log',200)
-                DateString = LL.split('[')[0]
-            except:
-                pass
-
+            DateString = self.GetRevisionDate(dataDirectory)
             print " REV {Rev}: {Date} {Status}".format(Rev=dataDirectory,Status='(HEAD)' if int(dataDirectory)==headRevision else '',Date=DateString)
 
 
     def EnterTagRevsMenu(self):
         self.PrintBox("input new revision tag (current: %s)"%self.revisionTag)
-        self.revisionTag = raw_input()
+        self.revisionTag = self.UI.ReadLine()
         self.config.set('Revision', 'Tag', self.revisionTag)
         self.SaveLocalConfiguration()
 
@@ -525,6 +1172,43 @@ class BpixMountTool():
             return False
 
 
+    def GetRevisionData(self, Revision):
+        # the active revision is taken from memory (incl. unsaved changes), other revisions are loaded from disk
+        if int(Revision) == int(self.globalConfig.get('System', 'DataRevision')):
+            RevisionData = BpixRevisionData(self.GetDataDirectory(), self.config)
+            RevisionData.Layers = dict(self.Layers.items())
+            RevisionData.LayersMounted = dict(self.LayersMounted.items())
+            return RevisionData
+        return BpixRevisionData(self.dataDirectoryBase + '%d/'%int(Revision)).LoadAll()
+
+
+    def EnterDiffRevsMenu(self):
+        dataDirectories = [x.replace('\\','/').strip('/').split('/')[-1] for x in glob.glob(self.dataDirectoryBase + '*/')]
+        headRevision = max([int(x) for x in dataDirectories if x.isdigit()])
+        currentRevision = int(self.globalConfig.get('System', 'DataRevision'))
+
+        self.PrintBox('Input baseline revision number (empty: current REV %d)'%currentRevision)
+        revisionA = self.UI.ReadLine().strip()
+        self.PrintBox('Input revision number to compare with (empty: HEAD REV %d)'%headRevision)
+        revisionB = self.UI.ReadLine().strip()
+        try:
+            revisionA = int(revisionA) if len(revisionA) > 0 else currentRevision
+            revisionB = int(revisionB) if len(revisionB) > 0 else headRevision
+            Diff = BpixRevisionDiff(self.GetRevisionData(revisionA), self.GetRevisionData(revisionB))
+            Report = Diff.Compute()
+        except:
+            self.ShowError("Can't compare REV %r with REV %r"%(revisionA, revisionB))
+            return False
+
+        self.Log("compared REV %d with REV %d"%(revisionA, revisionB), Category='REV')
+        self.PrintBox("REV %d -> REV %d: %d added, %d removed, %d moved modules, %d hub ID changes"%(revisionA, revisionB, len(Report['added']), len(Report['removed']), len(Report['moved']), len(Report['hubids'])))
+        for Line in Diff.FormatReport(Report):
+            print " " + Line
+        print "press any key to continue to main menu"
+        self.UI.ReadLine()
+        return True
+
+
     def EnterSelectRevsMenu(self):
         self.PrintBox("configuration/data revisions")
 
@@ -537,19 +1221,13 @@ class BpixMountTool():
         dataDirectories = dataDirectories[0:10]
         revs = [['input', 'input number...']]
         for dataDirectory in dataDirectories:
-            DateString = '?'
-            try:
-                LL = self.getLastLine(self.dataDirectoryBase + dataDirectory + '/bpixm.log',200)
-                DateString = LL.split('[')[0]
-            except:
-                DateString = '?'
-
+            DateString = self.GetRevisionDate(dataDirectory)
             revs.append([dataDirectory, " REV {Rev}: {Date} {Status}".format(Rev=dataDirectory,Status='(HEAD)' if int(dataDirectory)==headRevision else '',Date=DateString)])
 
         ret = self.UI.AskUser("Select revision to return to", revs, DisplayWidth=self.DisplayWidth)
         if ret == 'input':
             self.PrintBox('Input revision number')
-            newRevNr = raw_input()
+            newRevNr = self.UI.ReadLine()
         elif ret.isdigit():
             newRevNr = int(ret)
         else:
@@ -623,30 +1301,34 @@ class BpixMountTool():
         PlannedLayer = self.Layers[self.ActiveLayer]
         self.PrintBox("mounting plan for %s"%self.ActiveLayer)
 
-        ZPositionsString = '               '
+        def BuildHeader():
+            ZPositionsString = '               '
 
-        for ZPosition in range(PlannedLayer.ZPositions):
-            ZPositionsString += ("Z%d-"%(PlannedLayer.ZPositions - ZPosition)).ljust(7)
-        ZPositionsString += '  '
-        for ZPosition in range(PlannedLayer.ZPositions):
-            ZPositionsString += ("Z%d+"%(ZPosition+1)).ljust(7)
+            for ZPosition in range(PlannedLayer.ZPositions):
+                ZPositionsString += ("Z%d-"%(PlannedLayer.ZPositions - ZPosition)).ljust(7)
+            ZPositionsString += '  '
+            for ZPosition in range(PlannedLayer.ZPositions):
+                ZPositionsString += ("Z%d+"%(ZPosition+1)).ljust(7)
 
-        print "|%s|"%(ZPositionsString.ljust((self.DisplayWidth-2)))
-
-        for LadderIndex in range(len(PlannedLayer.Modules)):
+            return "|%s|"%(ZPositionsString.ljust((self.DisplayWidth-2)))
 
+        def BuildRow(LadderIndex):
             LadderName = "L%d" %(LadderIndex+1)
             LadderName = "\x1b[32m%s\x1b[0m" % (LadderName.ljust(10))
 
+            LadderModules = PlannedLayer.GetLadderModules(LadderIndex)
             LadderString = '   ' + LadderName
             for i in range(0, 2 * PlannedLayer.ZPositions):
                 if i == PlannedLayer.ZPositions:
                     LadderString += '   '
 
-                LadderString += (PlannedLayer.FormatModuleName(PlannedLayer.Modules[LadderIndex][i])).ljust(7)
+                LadderString += (PlannedLayer.FormatModuleName(LadderModules[i])).ljust(7)
+
+            return "|%s|"%(LadderString.ljust((self.DisplayWidth+7)))
 
-            print "|%s|"%(LadderString.ljust((self.DisplayWidth+7)))
-            LadderIndex += 1
+        ViewModel = self.GetViewModel('plan', BuildHeader, BuildRow)
+        print ViewModel['header']
+        print '\n'.join(ViewModel['rows'])
 
         print "+%s+" % ('-' * (self.DisplayWidth-2))
         print ""
@@ -660,34 +1342,39 @@ class BpixMountTool():
 
         self.PrintBox("status of %s"%self.ActiveLayer)
 
-        ZPositionsString = ' '*15
+        def BuildHeader():
+            ZPositionsString = ' '*15
 
-        for ZPosition in range(MountingLayer.ZPositions):
-            ZPositionsString += ("Z%d-"%(MountingLayer.ZPositions - ZPosition)).ljust(7)
-        ZPositionsString += '  '
-        for ZPosition in range(MountingLayer.ZPositions):
-            ZPositionsString += ("Z%d+"%(ZPosition+1)).ljust(7)
+            for ZPosition in range(MountingLayer.ZPositions):
+                ZPositionsString += ("Z%d-"%(MountingLayer.ZPositions - ZPosition)).ljust(7)
+            ZPositionsString += '  '
+            for ZPosition in range(MountingLayer.ZPositions):
+                ZPositionsString += ("Z%d+"%(ZPosition+1)).ljust(7)
 
-        print "|%s|"%(ZPositionsString.ljust((self.DisplayWidth-2)))
-
-        for LadderIndex in range(len(MountingLayer.Modules)):
+            return "|%s|"%(ZPositionsString.ljust((self.DisplayWidth-2)))
 
+        def BuildRow(LadderIndex):
             LadderName = "L%d" %(LadderIndex+1)
             LadderName = "\x1b[32m%s\x1b[0m" % (LadderName.ljust(10))
 
             # compare all mounted modules in the ladder with mounting plan
+            MountedModules = MountingLayer.GetLadderModules(LadderIndex)
+            PlannedModules = PlannedLayer.GetLadderModules(LadderIndex)
             LadderString = '   ' + LadderName
             for i in range(0, 2*MountingLayer.ZPositions):
                 if i == MountingLayer.ZPositions:
                     LadderString += '   '
 
-                if (MountingLayer.Modules[LadderIndex][i] == PlannedLayer.Modules[LadderIndex][i]) or len(MountingLayer.Modules[LadderIndex][i]) < 1:
-                    LadderString += (MountingLayer.FormatModuleName(MountingLayer.Modules[LadderIndex][i])).ljust(7)
+                if (MountedModules[i] == PlannedModules[i]) or len(MountedModules[i]) < 1:
+                    LadderString += (MountingLayer.FormatModuleName(MountedModules[i])).ljust(7)
                 else:
-                    LadderString += (MountingLayer.FormatModuleName(MountingLayer.Modules[LadderIndex][i]) + '!').ljust(7)
+                    LadderString += (MountingLayer.FormatModuleName(MountedModules[i]) + '!').ljust(7)
+
+            return "|%s|"%(LadderString.ljust((self.DisplayWidth+7)))
 
-            print "|%s|"%(LadderString.ljust((self.DisplayWidth+7)))
-            LadderIndex += 1
+        ViewModel = self.GetViewModel('status', BuildHeader, BuildRow)
+        print ViewModel['header']
+        print '\n'.join(ViewModel['rows'])
 
         print "+%s+\n" % ('-' * (self.DisplayWidth-2))
 
@@ -700,18 +1387,18 @@ class BpixMountTool():
 
         self.PrintBox("status of %s"%self.ActiveLayer)
 
-        ZPositionsString = ' '*15
-
-        for ZPosition in range(MountingLayer.ZPositions):
-            ZPositionsString += ("Z%d-"%(MountingLayer.ZPositions - ZPosition )).ljust(7)
-        ZPositionsString += '     '
-        for ZPosition in range(MountingLayer.ZPositions):
-            ZPositionsString += ("Z%d+"%(ZPosition+1)).ljust(7)
+        def BuildHeader():
+            ZPositionsString = ' '*15
 
-        print "|%s|"%(ZPositionsString.ljust((self.DisplayWidth-2)))
+            for ZPosition in range(MountingLayer.ZPositions):
+                ZPositionsString += ("Z%d-"%(MountingLayer.ZPositions - ZPosition )).ljust(7)
+            ZPositionsString += '     '
+            for ZPosition in range(MountingLayer.ZPositions):
+                ZPositionsString += ("Z%d+"%(ZPosition+1)).ljust(7)
 
-        for LadderIndex in range(len(MountingLayer.Modules)):
+            return "|%s|"%(ZPositionsString.ljust((self.DisplayWidth-2)))
 
+        def BuildRow(LadderIndex):
             LadderName = "L%d" %(LadderIndex+1)
             LadderName = "\x1b[32m%s\x1b[0m   " % (LadderName.ljust(10))
 
@@ -721,19 +1408,56 @@ class BpixMountTool():
                 if i == MountingLayer.ZPositions:
                     LadderString += '   '
 
-                hubIDmounted = MountingLayer.FormatHubIDTuple(MountingLayer.HubIDs[LadderIndex][i])
-                hubIDplanned = PlannedLayer.FormatHubIDTuple(PlannedLayer.HubIDs[LadderIndex][i])
+                hubIDmounted = MountingLayer.FormatHubIDTuple(MountingLayer.GetHubIDTuple(LadderIndex, i))
+                hubIDplanned = PlannedLayer.FormatHubIDTuple(PlannedLayer.GetHubIDTuple(LadderIndex, i))
 
                 if (hubIDmounted == hubIDplanned) or len(hubIDmounted) < 1:
                     LadderString += hubIDplanned.ljust(7)
                 else:
                     LadderString += hubIDmounted.ljust(7)
 
-            print "|%s|"%(LadderString.ljust((self.DisplayWidth+7)))
-            LadderIndex += 1
+            return "|%s|"%(LadderString.ljust((self.DisplayWidth+7)))
+
+        ViewModel = self.GetViewModel('hubids', BuildHeader, BuildRow)
+        print ViewModel['header']
+        print '\n'.join(ViewModel['rows'])
 
         print "+%s+\n" % ('-' * (self.DisplayWidth-2))
 
+        Issues = self.CheckHubIDs([self.ActiveLayer])
+        if len(Issues) > 0:
+            self.ShowWarning("%d hub ID problems in %s, 'solvehubids %s' assigns conflict-free IDs"%(len(Issues), self.ActiveLayer, self.ActiveLayer))
+            self.PrintHubIDIssues(Issues, 10)
+        else:
+            print "hub IDs checked: unique within all readout groups"
+
+
+    def GetViewModel(self, ViewKind, HeaderBuilder, RowBuilder):
+        # rows are only rebuilt for ladders which changed since the view was shown the last time
+        self.PollServer()
+        Key = (self.ActiveLayer, ViewKind, self.FillDirection, self.DisplayWidth)
+        return self.ViewCache.GetModel(Key, HeaderBuilder, RowBuilder, self.Layers[self.ActiveLayer].Ladders)
+
+
+    def GetModuleSelectionGrid(self):
+        # prints the Z position header and returns the module names and ladder names of the active layer
+        MountingLayer = self.GetActiveMountingLayer()
+
+        def BuildHeader():
+            ZPositionsString = ' '*9
+            for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions):
+                ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition).ljust(9)
+            for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions, 2*self.Layers[self.ActiveLayer].ZPositions):
+                ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition).ljust(9)
+            return ZPositionsString
+
+        def BuildRow(LadderIndex):
+            return [MountingLayer.FormatModuleName(ModuleId) for ModuleId in MountingLayer.GetLadderModules(LadderIndex)], ("L%d"%(LadderIndex+1)).ljust(5)
+
+        ViewModel = self.GetViewModel('select', BuildHeader, BuildRow)
+        print ViewModel['header']
+        return [Row[0] for Row in ViewModel['rows']], [Row[1] for Row in ViewModel['rows']]
+
 
     def GetFormattedHalfLadder(self, HalfLadderModules, LadderZIndex = 0):
 
@@ -759,6 +1483,12 @@ class BpixMountTool():
         return ret
 
 
+    def GetLayerNameOf(self, Layer):
+        for LayerName in self.LayerNames:
+            if self.LayersMounted.GetLoaded().get(LayerName) is Layer or self.Layers.GetLoaded().get(LayerName) is Layer:
+                return LayerName
+        return Layer.Name
+
     def GetActiveMountingLayer(self):
         return self.LayersMounted[self.ActiveLayer]
 
@@ -773,26 +1503,27 @@ class BpixMountTool():
             self.PrintBox("mounting plan for %s: select half ladder" % self.ActiveLayer)
 
             # Z positions
-            ZPositionsString = ' '*12
-            for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions):
-                ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition)
-            ZPositionsString += ' '*7
-            for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions, 2*self.Layers[self.ActiveLayer].ZPositions):
-                ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition)
-            print ZPositionsString
+            def BuildHeader():
+                ZPositionsString = ' '*12
+                for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions):
+                    ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition)
+                ZPositionsString += ' '*7
+                for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions, 2*self.Layers[self.ActiveLayer].ZPositions):
+                    ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition)
+                return ZPositionsString
 
             # half ladders
-            HalfLadderChoices = []
-            HeaderColumn = []
-
-            LadderIndex = 1
-            for Ladder in self.LayersMounted[self.ActiveLayer].Modules:
-                HalfLadderChoices.append([
+            def BuildRow(LadderIndex):
+                Ladder = self.LayersMounted[self.ActiveLayer].GetLadderModules(LadderIndex)
+                return [
                     self.GetFormattedHalfLadder(Ladder[:self.Layers[self.ActiveLayer].ZPositions], 0),
                     self.GetFormattedHalfLadder(Ladder[self.Layers[self.ActiveLayer].ZPositions:], 1)
-                ])
-                HeaderColumn.append(("L%d"%LadderIndex).ljust(5))
-                LadderIndex += 1
+                ], ("L%d"%(LadderIndex+1)).ljust(5)
+
+            ViewModel = self.GetViewModel('mount', BuildHeader, BuildRow)
+            print ViewModel['header']
+            HalfLadderChoices = [list(Row[0]) for Row in ViewModel['rows']]
+            HeaderColumn = [Row[1] for Row in ViewModel['rows']]
 
             HalfLadderChoices.append(["Go back to main menu",""])
 
@@ -821,6 +1552,8 @@ class BpixMountTool():
                            ],
                           [
                               ['scan', '_Scan modules...'],
+                              ['batch', 'Scan _all modules at once (batch)...'],
+                              ['picklist', '_Pick list (tray order)'],
                               ['clear', '_Clear'],
                               ['mountmenu', 'Go _back'],
                               ['back', 'Main menu (_q)'],
@@ -828,12 +1561,18 @@ class BpixMountTool():
 
             if ret == 'scan':
                 self.Log("Layer: " + self.ActiveLayer + ", Ladder: " + self.Layers[self.ActiveLayer].GetHalfLadderName(selectedHalfLadderIndex), 'MOUNT')
-                self.Log("Currently installed modules: " + selectedHalfLadderString, 'MOUNT')
+                self.Log("Currently installed modules: " + selectedHalfLadderString, 'MOUNT', Keys=self.GetLogKeys(self.ActiveLayer, selectedHalfLadderIndex[0]))
                 self.EnterScanHalfLadderMenu(selectedHalfLadderIndex)
+            elif ret == 'batch':
+                self.Log("Layer: " + self.ActiveLayer + ", Ladder: " + self.Layers[self.ActiveLayer].GetHalfLadderName(selectedHalfLadderIndex), 'MOUNT')
+                self.Log("Currently installed modules: " + selectedHalfLadderString, 'MOUNT', Keys=self.GetLogKeys(self.ActiveLayer, selectedHalfLadderIndex[0]))
+                self.EnterBatchScanHalfLadderMenu(selectedHalfLadderIndex)
+            elif ret == 'picklist':
+                self.EnterPickListMenu([selectedHalfLadderIndex])
             elif ret == 'clear':
                 self.Log("Layer: " + self.ActiveLayer + ", Ladder: " + self.Layers[self.ActiveLayer].GetHalfLadderName(
                     selectedHalfLadderIndex), 'MOUNT-CLEAR')
-                self.Log("Currently installed modules: " + selectedHalfLadderString, 'MOUNT-CLEAR')
+                self.Log("Currently installed modules: " + selectedHalfLadderString, 'MOUNT-CLEAR', Keys=self.GetLogKeys(self.ActiveLayer, selectedHalfLadderIndex[0]))
                 self.ClearHalfLadder(selectedHalfLadderIndex)
 
             elif ret == 'back':
@@ -846,36 +1585,14 @@ class BpixMountTool():
         # header
         self.PrintBox("mounting plan for %s: select half ladder" % self.ActiveLayer)
 
-        ModuleChoices = []
         MountingLayer = self.GetActiveMountingLayer()
-        for Ladder in MountingLayer.Modules:
-            LadderModules = []
-            for ModuleId in Ladder:
-                LadderModules.append(self.GetActiveMountingLayer().FormatModuleName(ModuleId))
-            ModuleChoices.append(LadderModules)
-
-        # Z positions
-        ZPositionsString = ' '*9
-        for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions):
-            ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition).ljust(9)
-        for ZPosition in range(self.Layers[self.ActiveLayer].ZPositions, 2*self.Layers[self.ActiveLayer].ZPositions):
-            ZPositionsString += self.Layers[self.ActiveLayer].GetZPositionName(ZPosition).ljust(9)
-        print ZPositionsString
-
-        # half ladders
-        HalfLadderChoices = []
-        HeaderColumn = []
-
-        LadderIndex = 1
-        for Ladder in MountingLayer.Modules:
-            HeaderColumn.append(("L%d"%LadderIndex).ljust(5))
-            LadderIndex += 1
+        ModuleChoices, HeaderColumn = self.GetModuleSelectionGrid()
 
         # ask user to pick a half ladder
         selectedModuleIndex = self.UI.AskUser2D('', ModuleChoices, HeaderColumn=HeaderColumn)
-        self.Log("Layer: " + self.ActiveLayer + ", Ladder: %d"%selectedModuleIndex[0] + " Z: %d"%selectedModuleIndex[1], 'MOUNT-REPLACE')
+        self.Log("Layer: " + self.ActiveLayer + ", Ladder: %d"%selectedModuleIndex[0] + " Z: %d"%selectedModuleIndex[1], 'MOUNT-REPLACE', Keys=self.GetLogKeys(self.ActiveLayer, selectedModuleIndex[0]))
 
-        return self.EnterMountSingleModuleMenu(MountingLayer, selectedModuleIndex[0], selectedModuleIndex[1], PlannedLayer=self.GetActivePlanLayer())
+        return self.EnterMountSingleModuleMenu(MountingLayer, selectedModuleIndex[0], selectedModuleIndex[1], PlannedLayer=self.GetActivePlanLayer(), ShowSpares=True)
 
 
     def VerifyModuleID(self, ModuleID, CheckLadderIndex, CheckZIndex):
@@ -885,13 +1602,11 @@ class BpixMountTool():
             return True
 
         alreadyMountedPositions = []
-        for LadderIndex, Ladder in enumerate(self.GetActiveMountingLayer().Modules):
-            for ZIndex, MountedModuleID in enumerate(Ladder):
-                if MountedModuleID == ModuleID:
-                    if CheckLadderIndex==LadderIndex and CheckZIndex==ZIndex:
-                        print "Module {Module} already mounted here! => continue!".format(Module=ModuleID)
-                    else:
-                        alreadyMountedPositions.append("Ladder {Ladder}, Z {ZIndex}".format(Ladder=LadderIndex, ZIndex=ZIndex))
+        for LayerName, LadderIndex, ZIndex, Kind in self.ModuleIndex.Find(ModuleID, Kind='mounted', LayerName=self.ActiveLayer):
+            if CheckLadderIndex==LadderIndex and CheckZIndex==ZIndex:
+                print "Module {Module} already mounted here! => continue!".format(Module=ModuleID)
+            else:
+                alreadyMountedPositions.append("Ladder {Ladder}, Z {ZIndex}".format(Ladder=LadderIndex, ZIndex=ZIndex))
 
         if len(alreadyMountedPositions)>0:
             self.ShowWarning(
@@ -908,46 +1623,68 @@ class BpixMountTool():
 
 
     def MountModule(self, MountingLayer, LadderIndex, ZPosition, newModuleID, PlannedLayer = None):
+        return self.MountModules(MountingLayer, [(LadderIndex, ZPosition, newModuleID)], PlannedLayer)
 
-        success = False
-        try:
-            if ZPosition < MountingLayer.ZPositions:
-                ZPositionFormatted = "-%d"%(MountingLayer.ZPositions - ZPosition)
-            else:
-                ZPositionFormatted = "+%d"%(ZPosition - MountingLayer.ZPositions)
+    def GetMountLogString(self, MountingLayer, LadderIndex, ZPosition, newModuleID, PlannedLayer = None):
+        if ZPosition < MountingLayer.ZPositions:
+            ZPositionFormatted = "-%d"%(MountingLayer.ZPositions - ZPosition)
+        else:
+            ZPositionFormatted = "+%d"%(ZPosition - MountingLayer.ZPositions)
 
-            if len(MountingLayer.Modules[LadderIndex][ZPosition]) < 1:
-                logString = "DONE: mount module  -> " + newModuleID
-            else:
-                logString = "DONE: replace module " + MountingLayer.Modules[LadderIndex][ZPosition] + ' -> ' + newModuleID
+        if len(MountingLayer.Modules[LadderIndex][ZPosition]) < 1:
+            logString = "DONE: mount module  -> " + newModuleID
+        else:
+            logString = "DONE: replace module " + MountingLayer.Modules[LadderIndex][ZPosition] + ' -> ' + newModuleID
 
-            logString = logString + " at ladder %d"%(LadderIndex+1) + " Z =" + ZPositionFormatted
+        logString = logString + " at ladder %d"%(LadderIndex+1) + " Z =" + ZPositionFormatted
 
-            if PlannedLayer:
-                plannedModule = PlannedLayer.Modules[LadderIndex][ZPosition]
-                logString += ' plan: ' + plannedModule
+        if PlannedLayer:
+            plannedModule = PlannedLayer.Modules[LadderIndex][ZPosition]
+            logString += ' plan: ' + plannedModule
+
+        return logString + " operator: " + self.Operator
 
-            logString = logString + " operator: " + self.Operator
+    def MountModules(self, MountingLayer, Mounts, PlannedLayer = None):
+        # Mounts: list of (LadderIndex, ZPosition, newModuleID), journaled together and applied as one change
+        LayerName = self.GetLayerNameOf(MountingLayer)
+        if self.StateClient:
+            # validated, applied and logged by the server
+            return self.RequestServer('mount', layer=LayerName, mounts=[list(x) for x in Mounts])
+
+        success = False
+        logStrings = []
+        try:
+            Records = []
+            for LadderIndex, ZPosition, newModuleID in Mounts:
+                logStrings.append((LadderIndex, self.GetMountLogString(MountingLayer, LadderIndex, ZPosition, newModuleID, PlannedLayer)))
+                oldModuleID = MountingLayer.Modules[LadderIndex][ZPosition]
+                Records.append(('mount' if len(oldModuleID) < 1 else 'replace', LayerName, LadderIndex, ZPosition, oldModuleID, newModuleID))
             try:
-                MountingLayer.Modules[LadderIndex][ZPosition] = newModuleID
+                # nothing is changed if the journal can't be written
+                if not self.JournalModuleChanges(Records):
+                    raise IOError("could not write to mount journal")
+                for LadderIndex, ZPosition, newModuleID in Mounts:
+                    MountingLayer.SetModule(LadderIndex, ZPosition, newModuleID)
+                self.InvalidateSlots(LayerName, [(LadderIndex, ZPosition) for LadderIndex, ZPosition, newModuleID in Mounts])
                 success = True
             except:
-                logString = "FAILED: mount module  -> " + newModuleID
+                logStrings = [(LadderIndex, "FAILED: mount module  -> " + newModuleID) for LadderIndex, ZPosition, newModuleID in Mounts]
         except:
-            logString = "ERROR IN CREATING LOG"
+            logStrings = [(LadderIndex, "ERROR IN CREATING LOG") for LadderIndex, ZPosition, newModuleID in Mounts]
 
-        self.Log(logString, 'MOUNT-MODULE')
+        for LadderIndex, logString in logStrings:
+            self.Log(logString, 'MOUNT-MODULE', Keys=self.GetLogKeys(LayerName, LadderIndex))
         return success
 
     def ReadModuleBarcode(self):
-        moduleID = raw_input()
+        moduleID = self.UI.ReadLine()
         # correct barcodes
         if moduleID.startswith('D'):
             moduleID = 'M' + moduleID[1:]
 
         return moduleID
 
-    def EnterMountSingleModuleMenu(self, MountingLayer, LadderIndex, ZPosition, PlannedLayer = None):
+    def EnterMountSingleModuleMenu(self, MountingLayer, LadderIndex, ZPosition, PlannedLayer = None, ShowSpares = False):
         oldModuleID = MountingLayer.FormatModuleName(MountingLayer.Modules[LadderIndex][ZPosition])
 
         plannedModuleIDraw = PlannedLayer.Modules[LadderIndex][ZPosition].strip()
@@ -958,7 +1695,8 @@ class BpixMountTool():
             plannedModuleID = 'M????'
 
         ModuleMountComplete = False
-        hubIDs = MountingLayer.HubIDs[LadderIndex][ZPosition]
+        hubIDs = MountingLayer.GetHubIDTuple(LadderIndex, ZPosition)
+        Spares = self.RecommendSpares(self.GetLayerNameOf(MountingLayer), LadderIndex, ZPosition) if ShowSpares else []
         while not ModuleMountComplete:
 
             selectedLadderID = 1+LadderIndex
@@ -972,16 +1710,28 @@ class BpixMountTool():
             print " LADDER:           %d"%(1+LadderIndex)
             print " PLANNED MODULE:   %s"%plannedModuleID
             print " STORAGE LOCATION: %s"%ModuleStorageLocation
+            if ShowSpares:
+                print " SPARE MODULES:"
+                self.PrintSpares(Spares)
+            if len(Spares) > 0:
+                quitHint = "(\x1b[31m1\x1b[0m-\x1b[31m%d\x1b[0m for a spare, \x1b[31mq\x1b[0m to quit)"%len(Spares)
+            else:
+                quitHint = "(\x1b[31mq\x1b[0m to quit)"
             if oldModuleID.startswith('-'):
                 if plannedModuleFound:
-                    question = "Scan module ID to mount here, plan: {plan} (\x1b[31mq\x1b[0m to quit): ".format(plan=plannedModuleID)
+                    question = "Scan module ID to mount here, plan: {plan} {quit}: ".format(plan=plannedModuleID, quit=quitHint)
                 else:
-                    question = "Scan module ID to mount here (\x1b[31mq\x1b[0m to quit): "
+                    question = "Scan module ID to mount here {quit}: ".format(quit=quitHint)
             else:
-                question = "Scan module ID to replace '{old}', plan: {plan} (\x1b[31mq\x1b[0m to quit): ".format(old=oldModuleID, plan=plannedModuleID)
+                question = "Scan module ID to replace '{old}', plan: {plan} {quit}: ".format(old=oldModuleID, plan=plannedModuleID, quit=quitHint)
             print question
 
             newModuleID = self.ReadModuleBarcode()
+            spareChosen = newModuleID.isdigit() and 0 < int(newModuleID) <= len(Spares)
+            if spareChosen:
+                newModuleID, spareLocation, spareGrade, spareProximity = Spares[int(newModuleID) - 1]
+                print " SPARE MODULE:     %s"%newModuleID
+                self.Log("SPARE: {ModuleID} chosen from recommendations ({Proximity})".format(ModuleID=newModuleID, Proximity=BpixSpareModules.ProximityNames[spareProximity]), Category="MOUNT-MODULE", Keys=self.GetLogKeys(self.GetLayerNameOf(MountingLayer), LadderIndex))
 
             if newModuleID == 'q':
                 logMessage = "CANCEL: no module scanned, action was cancelled by user!"
@@ -989,14 +1739,14 @@ class BpixMountTool():
                 print logMessage
                 return False
 
-            self.Log("L: {Ladder}, Z: {Z}, Plan: {Plan} (in {Box}), Scanned: {Scanned}".format(Ladder=LadderIndex+1, Z=ZPosition, Plan=plannedModuleID, Scanned=newModuleID, Box=ModuleStorageLocation), Category="MOUNT-MODULE")
+            self.Log("L: {Ladder}, Z: {Z}, Plan: {Plan} (in {Box}), Scanned: {Scanned}".format(Ladder=LadderIndex+1, Z=ZPosition, Plan=plannedModuleID, Scanned=newModuleID, Box=ModuleStorageLocation), Category="MOUNT-MODULE", Keys=self.GetLogKeys(self.GetLayerNameOf(MountingLayer), LadderIndex))
             # check if module is mountable _here_
             isMountable = self.VerifyModuleID(newModuleID, LadderIndex, ZPosition)
 
             if isMountable:
                 self.Log("OK: The module {ModuleID} can be mounted here.".format(ModuleID=newModuleID), Category="MOUNT-MODULE")
                 # check if it was _planned_ to mount the module here
-                if plannedModuleFound and newModuleID != plannedModuleID:
+                if plannedModuleFound and newModuleID != plannedModuleID and not spareChosen:
                     warningMessage = "planning to mount module '%s' instead of '%s' at position z=%s" % (
                         newModuleID, plannedModuleID, MountingLayer.GetZPositionName(ZPosition))
                     self.ShowWarning(warningMessage)
@@ -1090,18 +1840,24 @@ class BpixMountTool():
                               ['operator', 'Set _operator (currently: %s)' % self.Operator],
                               ['fill', 'Set _fill direction (currently: %s)' % self.FillDirection],
                               ['autosave', 'Toggle _autosave (currently: %s)' % ('on' if self.Autosave else 'off')],
+                              ['index', 'Check module _index'],
                               ['q', 'Back to main menu (_q)']
                           ], DisplayWidth=self.DisplayWidth)
 
             if ret == 'autosave':
                 self.Autosave = not self.Autosave
                 self.WriteGlobalConfig()
+                if self.Autosave:
+                    # journal starts from a saved snapshot
+                    self.SaveConfiguration(False)
             elif ret == 'operator':
                 self.EnterSetOperatorMenu()
             elif ret == 'select':
                 self.EnterSelectLayerMenu()
             elif ret == 'fill':
                 self.EnterFillDirectionMenu()
+            elif ret == 'index':
+                self.CheckModuleIndex()
             elif ret == 'q':
                 return True
 
@@ -1111,6 +1867,16 @@ class BpixMountTool():
         MountingLayer = self.GetActiveMountingLayer()
         PlannedLayer = self.GetActivePlanLayer()
 
+        ModuleZPositions = self.GetHalfLadderFillOrder(HalfLadderIndex)
+
+        # mount individual modules
+        for ZPosition in ModuleZPositions:
+            self.EnterMountSingleModuleMenu(MountingLayer, HalfLadderIndex[0], ZPosition, PlannedLayer=PlannedLayer)
+
+
+    def GetHalfLadderFillOrder(self, HalfLadderIndex):
+        # Z indices of the half ladder in the order in which modules are mounted
+        MountingLayer = self.GetActiveMountingLayer()
         ModuleZPositions = []
 
         if self.FillDirection == 'lefttoright':
@@ -1142,10 +1908,109 @@ class BpixMountTool():
                 ModuleZPositions = range((HalfLadderIndex[1] + 1) * MountingLayer.ZPositions - 1,
                                        HalfLadderIndex[1] * MountingLayer.ZPositions - 1, -1)
 
-        # mount individual modules
-        for ZPosition in ModuleZPositions:
-            self.EnterMountSingleModuleMenu(MountingLayer, HalfLadderIndex[0], ZPosition, PlannedLayer=PlannedLayer)
+        return ModuleZPositions
+
+
+    def EnterBatchScanHalfLadderMenu(self, HalfLadderIndex):
+        MountingLayer = self.GetActiveMountingLayer()
+        PlannedLayer = self.GetActivePlanLayer()
+        LadderIndex = HalfLadderIndex[0]
+        ModuleZPositions = self.GetHalfLadderFillOrder(HalfLadderIndex)
+
+        while True:
+            self.PrintBox("batch scan %s %s: scan %d modules in this order, empty line keeps a position unchanged, q to quit"%(self.ActiveLayer, PlannedLayer.GetHalfLadderName(HalfLadderIndex), len(ModuleZPositions)))
+            for ZPosition in ModuleZPositions:
+                plannedModuleID = PlannedLayer.Modules[LadderIndex][ZPosition].strip()
+                print " %s  plan: %s  storage: %s"%(MountingLayer.GetZPositionName(ZPosition), PlannedLayer.FormatModuleName(plannedModuleID), self.GetStorageLocation(plannedModuleID) if len(plannedModuleID) > 0 else '')
+
+            # read all barcodes first, the scanner can send them in one burst
+            scannedModuleIDs = []
+            for ZPosition in ModuleZPositions:
+                sys.stdout.write(" %s > "%MountingLayer.GetZPositionName(ZPosition))
+                sys.stdout.flush()
+                newModuleID = self.ReadModuleBarcode().strip()
+                if newModuleID == 'q':
+                    self.Log("CANCEL: batch scan was cancelled by user!", Category="MOUNT-MODULE")
+                    return False
+                scannedModuleIDs.append(newModuleID)
+
+            Mounts = [(LadderIndex, ZPosition, newModuleID) for ZPosition, newModuleID in zip(ModuleZPositions, scannedModuleIDs) if len(newModuleID) > 0]
+            if len(Mounts) < 1:
+                print "no modules scanned"
+                return False
+
+            Errors, Warnings = self.ValidateMounts(MountingLayer, Mounts, PlannedLayer)
+
+            # one confirmation screen for the whole half ladder
+            print "+%s+"%('-'*(self.DisplayWidth-2))
+            print " %-6s %-8s %-8s %-8s %-8s %s"%('Z', 'MOUNTED', 'PLAN', 'SCANNED', 'HUB-IDS', 'STORAGE')
+            for LadderIndex, ZPosition, newModuleID in Mounts:
+                print " %-6s %-8s %-8s %-8s %-8s %s"%(MountingLayer.GetZPositionNameRaw(ZPosition), MountingLayer.FormatModuleName(MountingLayer.Modules[LadderIndex][ZPosition]), PlannedLayer.FormatModuleName(PlannedLayer.Modules[LadderIndex][ZPosition]), newModuleID, MountingLayer.FormatHubIDTuple(MountingLayer.GetHubIDTuple(LadderIndex, ZPosition)), self.GetStorageLocation(newModuleID))
+            print "+%s+"%('-'*(self.DisplayWidth-2))
+            for Warning in Warnings:
+                print " WARNING: " + Warning
+            for Error in Errors:
+                print " \x1b[31mERROR: %s\x1b[0m"%Error
+
+            if len(Errors) > 0:
+                self.Log("batch scan rejected: " + '; '.join(Errors), Category="MOUNT-MODULE", Keys=self.GetLogKeys(self.ActiveLayer, LadderIndex))
+                ret = self.UI.AskUser("modules can't be mounted",
+                              [
+                                  ['rescan', '_Rescan half ladder'],
+                                  ['no', '_quit']
+                              ], DisplayWidth=self.DisplayWidth)
+            else:
+                ret = self.UI.AskUser("mount %d modules%s?"%(len(Mounts), " (%d warnings)"%len(Warnings) if len(Warnings) > 0 else ''),
+                              [
+                                  ['yes', '_Yes'],
+                                  ['rescan', '_Rescan half ladder'],
+                                  ['no', '_no']
+                              ], DisplayWidth=self.DisplayWidth)
+
+            if ret == 'yes':
+                for Warning in Warnings:
+                    self.Log("confirmed: " + Warning, Category="MOUNT-MODULE", Keys=self.GetLogKeys(self.ActiveLayer, LadderIndex))
+                if self.MountModules(MountingLayer, Mounts, PlannedLayer):
+                    print "->mounted %d modules"%len(Mounts)
+                    self.FlagUnsaved()
+                    self.FlushLog()
+                    return True
+                self.ShowError("Could not mount the modules!")
+                return False
+            elif ret != 'rescan':
+                self.Log("CANCEL: batch scan was cancelled by user!", Category="MOUNT-MODULE")
+                return False
 
+    def ValidateMounts(self, MountingLayer, Mounts, PlannedLayer = None, PendingMounts = None):
+        # checks a set of mounts against each other and the current state, returns (errors, warnings)
+        # PendingMounts: mounts of the same change which were validated before, modules in the slots they replace are free
+        LayerName = self.GetLayerNameOf(MountingLayer)
+        Errors = []
+        Warnings = []
+        replacedSlots = set([(LayerName, LadderIndex, ZPosition) for LadderIndex, ZPosition, newModuleID in Mounts + (PendingMounts or [])])
+        scannedPositions = {}
+        for LadderIndex, ZPosition, newModuleID in Mounts:
+            position = "ladder %d %s"%(LadderIndex+1, MountingLayer.GetZPositionNameRaw(ZPosition))
+            scannedPositions.setdefault(newModuleID, []).append(position)
+            if len(newModuleID) > 6:
+                Errors.append("%s: module ID %s is too long, max. length of 6 allowed"%(position, newModuleID))
+            # layers which are not loaded are not in the module index, their mount files are scanned
+            for otherLayerName, otherLadderIndex, otherZIndex, Kind in self.FindModule(newModuleID, 'mounted'):
+                if (otherLayerName, otherLadderIndex, otherZIndex) not in replacedSlots:
+                    Errors.append("%s: module %s is already mounted on %s ladder %d %s"%(position, newModuleID, otherLayerName, otherLadderIndex+1, self.LayersMounted[otherLayerName].GetZPositionNameRaw(otherZIndex)))
+            if PlannedLayer:
+                plannedModuleID = PlannedLayer.Modules[LadderIndex][ZPosition].strip()
+                if len(plannedModuleID) > 0 and plannedModuleID != newModuleID:
+                    Warnings.append("%s: mounting %s instead of planned %s"%(position, newModuleID, plannedModuleID))
+            if self.GetStorageLocation(newModuleID) in ['unknown', 'empty']:
+                Warnings.append("%s: storage location of %s is unknown, this module ID might not exist"%(position, newModuleID))
+            oldModuleID = MountingLayer.Modules[LadderIndex][ZPosition].strip()
+            if len(oldModuleID) > 0 and oldModuleID != newModuleID:
+                Warnings.append("%s: replaces mounted module %s"%(position, oldModuleID))
+        for newModuleID, positions in sorted(scannedPositions.items()):
+            if len(positions) > 1:
+                Errors.append("module %s scanned %d times (%s)"%(newModuleID, len(positions), ', '.join(positions)))
+        return Errors, Warnings
 
     def ClearHalfLadder(self, HalfLadderIndex):
 
@@ -1156,16 +2021,50 @@ class BpixMountTool():
                       ], DisplayWidth=self.DisplayWidth)
 
         if ret == 'yes':
-            for ZPosition in range(HalfLadderIndex[1]*self.LayersMounted[self.ActiveLayer].ZPositions, (HalfLadderIndex[1]+1)*self.LayersMounted[self.ActiveLayer].ZPositions):
-                print "%s ----> %s"%(self.LayersMounted[self.ActiveLayer].FormatModuleName(self.LayersMounted[self.ActiveLayer].Modules[HalfLadderIndex[0]][ZPosition]), self.LayersMounted[self.ActiveLayer].FormatModuleName(''))
-                self.LayersMounted[self.ActiveLayer].Modules[HalfLadderIndex[0]][ZPosition] = ''
-            print "cleared!"
-            self.Log("DONE: half-ladder cleared!", 'MOUNT-CLEAR')
-
-            self.FlagUnsaved()
+            self.ClearHalfLadderModules(self.ActiveLayer, HalfLadderIndex)
         else:
             self.Log("CANCEL: clear cancelled.", 'MOUNT-CLEAR')
 
+    def ClearHalfLadderModules(self, LayerName, HalfLadderIndex):
+        if self.StateClient:
+            if self.RequestServer('clear', layer=LayerName, ladder=HalfLadderIndex[0], side=HalfLadderIndex[1]):
+                print "cleared!"
+                return True
+            return False
+
+        MountingLayer = self.LayersMounted[LayerName]
+        ZPositions = range(HalfLadderIndex[1]*MountingLayer.ZPositions, (HalfLadderIndex[1]+1)*MountingLayer.ZPositions)
+        if not self.JournalModuleChanges([('clear', LayerName, HalfLadderIndex[0], ZPosition, MountingLayer.Modules[HalfLadderIndex[0]][ZPosition], '') for ZPosition in ZPositions]):
+            self.Log("FAILED: half-ladder not cleared, could not write to mount journal", 'MOUNT-CLEAR', Keys=self.GetLogKeys(LayerName, HalfLadderIndex[0]))
+            return False
+        for ZPosition in ZPositions:
+            print "%s ----> %s"%(MountingLayer.FormatModuleName(MountingLayer.Modules[HalfLadderIndex[0]][ZPosition]), MountingLayer.FormatModuleName(''))
+            MountingLayer.SetModule(HalfLadderIndex[0], ZPosition, '')
+        self.InvalidateSlots(LayerName, [(HalfLadderIndex[0], ZPosition) for ZPosition in ZPositions])
+        print "cleared!"
+        self.Log("DONE: half-ladder cleared!", 'MOUNT-CLEAR', Keys=self.GetLogKeys(LayerName, HalfLadderIndex[0]))
+
+        self.FlagUnsaved()
+        return True
+
+
+    def CheckModuleIndex(self):
+        Problems = self.ModuleIndex.CheckConsistency(self.Layers.GetLoaded(), 'plan') + self.ModuleIndex.CheckConsistency(self.LayersMounted.GetLoaded(), 'mounted')
+        if len(Problems) > 0:
+            for Problem in Problems:
+                self.ShowWarning("module index inconsistent: %s"%Problem)
+
+            # rebuild index from the raw module lists
+            self.ModuleIndex.Clear()
+            for LayerName, Layer in self.Layers.GetLoaded().items():
+                Layer.AttachIndex(self.ModuleIndex, LayerName, 'plan')
+            for LayerName, Layer in self.LayersMounted.GetLoaded().items():
+                Layer.AttachIndex(self.ModuleIndex, LayerName, 'mounted')
+            self.Log("module index rebuilt", 'INDEX')
+        else:
+            print "module index is consistent!"
+        return len(Problems) < 1
+
 
     def EnterSelectLayerMenu(self):
         layerMenu = []
@@ -1189,18 +2088,25 @@ class BpixMountTool():
 
 
 
-try:
-    bmt = BpixMountTool()
-    bmt.EnterMainMenu()
-except Exception as e:
-    exc_type, exc_obj, exc_tb = sys.exc_info()
-    # Start red color
-    sys.stdout.write("\x1b[31m")
-    sys.stdout.flush()
-    # Print error message
-    print 'An exception occurred!'
-    # Print traceback
-    traceback.print_exception(exc_type, exc_obj, exc_tb)
-    # Stop red color
-    sys.stdout.write("\x1b[0m")
-    sys.stdout.flush()
+if __name__ == '__main__':
+    # with arguments, commands are executed without menus, see BpixCommands.py
+    if len(sys.argv) > 1:
+        from BpixCommands import BpixCommands
+        sys.exit(BpixCommands(BpixMountTool()).Main(sys.argv[1:]))
+
+    try:
+        bmt = BpixMountTool()
+        bmt.ConnectToServer()
+        bmt.EnterMainMenu()
+    except Exception as e:
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        # Start red color
+        sys.stdout.write("\x1b[31m")
+        sys.stdout.flush()
+        # Print error message
+        print 'An exception occurred!'
+        # Print traceback
+        traceback.print_exception(exc_type, exc_obj, exc_tb)
+        # Stop red color
+        sys.stdout.write("\x1b[0m")
+        sys.stdout.flush()